@@ -1,9 +1,8 @@
 """Main Application"""
 import os
 
-import pytest
+import click
 from flask.cli import FlaskGroup
-from flask_migrate import Migrate
 
 from apps import create_app, db
 from apps.api import blueprint
@@ -11,15 +10,290 @@ from apps.api import blueprint
 app = create_app(os.getenv("FLASK_ENV", "default"))
 app.register_blueprint(blueprint)
 
-migrate = Migrate(app, db)
+# Flask-Migrate imports alembic, only the CLI needs the db command
+if click.get_current_context(silent=True) is not None:
+    from flask_migrate import Migrate
+
+    migrate = Migrate(app, db)
+
 cli = FlaskGroup(app)
 
 
 @cli.command("test")
-def test():
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    help="Worker processes, each one with its own test database.",
+)
+def test(workers):
     """Runs the unit tests."""
+    if workers > 1:
+        from tests.utils.parallel import run_parallel
+
+        raise SystemExit(run_parallel(workers, echo=click.echo))
+
+    import pytest
+
     pytest.main(args=["-v", "tests"])
 
 
+@cli.command("calibrate-bcrypt")
+@click.option(
+    "--target-ms",
+    default=250.0,
+    show_default=True,
+    help="Target password hashing latency in milliseconds.",
+)
+def calibrate_bcrypt(target_ms):
+    """Finds the BCRYPT_LOG_ROUNDS matching a target latency on this host."""
+    from apps.extensions.hashing import calibrate_log_rounds
+
+    rounds, timings = calibrate_log_rounds(target_ms)
+    for cost, elapsed in timings.items():
+        click.echo(f"rounds={cost:<3} {elapsed:10.1f} ms")
+    click.echo(f"BCRYPT_LOG_ROUNDS={rounds}")
+    if rounds != app.config["BCRYPT_LOG_ROUNDS"]:
+        click.echo(
+            "Set it in the environment, stored passwords are rehashed at next login."
+        )
+
+
+@cli.command("compact-ledger")
+@click.option(
+    "--min-age",
+    default=None,
+    type=float,
+    help="Seconds an entry must be old, DEPOSIT_LEDGER_COMPACT_AGE by default.",
+)
+def compact_ledger(min_age):
+    """Folds the deposit ledger entries into the user deposits."""
+    from apps.api.services import compact_ledger as compact
+
+    click.echo(f"Compacted {compact(min_age)} users")
+
+
+@cli.command("purge-idempotency-keys")
+def purge_idempotency_keys():
+    """Deletes the expired idempotency keys."""
+    from apps.api.services import purge_idempotency_keys as purge
+
+    click.echo(f"Deleted {purge()} keys")
+
+
+@cli.command("export-spec")
+@click.option(
+    "--output",
+    type=click.Path(),
+    default="swagger.json",
+    show_default=True,
+    help="File to write, served when DOCS_SPEC_FILE points to it.",
+)
+def export_spec(output):
+    """Renders the Swagger specification to a file."""
+    from apps.api import api
+    from apps.api.docs import render_spec
+
+    with app.test_request_context():
+        body = render_spec(api)
+    with open(output, "wb") as handle:
+        handle.write(body)
+    click.echo(f"Specification written to {output}")
+
+
+@cli.command("startup-profile")
+@click.option(
+    "--top", default=20, show_default=True, help="Packages and modules shown."
+)
+@click.option(
+    "--statement",
+    default="import app",
+    show_default=True,
+    help="Python statement starting the application.",
+)
+def startup_profile(top, statement):
+    """Reports the cold start time and its import time breakdown."""
+    from benchmarks.startup import profile_startup
+
+    profile = profile_startup(statement, top)
+    click.echo(
+        f"{profile['statement']}: {profile['wall_ms']} ms wall, "
+        f"{profile['import_ms']} ms importing {profile['modules']} modules"
+    )
+    click.echo("\nSelf import time by package:")
+    for package in profile["packages"]:
+        click.echo(f"{package['self_ms']:10.1f} ms  {package['package']}")
+    click.echo("\nSlowest modules:")
+    for module in profile["slowest"]:
+        click.echo(
+            f"{module['self_ms']:10.1f} ms  {module['module']} "
+            f"({module['cumulative_ms']:.1f} ms with its imports)"
+        )
+
+
+@cli.command("benchmark")
+@click.option("--products", default=1000, show_default=True, help="Products to seed.")
+@click.option("--users", default=10, show_default=True, help="Extra users to seed.")
+@click.option(
+    "--iterations", default=200, show_default=True, help="Measured calls per benchmark."
+)
+@click.option("--warmup", default=10, show_default=True, help="Unmeasured calls first.")
+@click.option(
+    "--database-uri",
+    default=None,
+    help="Database to seed and use, a temporary SQLite file by default.",
+)
+@click.option(
+    "--allow-drop",
+    is_flag=True,
+    help="Drop every table of --database-uri, required to use it.",
+)
+@click.option("--only", multiple=True, help="Benchmark to run, can be repeated.")
+@click.option("--output", type=click.Path(), help="Write the JSON results to a file.")
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True),
+    help="Previous JSON results to compare with.",
+)
+def benchmark(
+    products,
+    users,
+    iterations,
+    warmup,
+    database_uri,
+    allow_drop,
+    only,
+    output,
+    baseline,
+):
+    """Benchmarks the service functions and endpoints."""
+    import json
+
+    from benchmarks import compare, dumps, run_benchmarks
+
+    if database_uri and not allow_drop:
+        raise click.UsageError("--database-uri tables are dropped, pass --allow-drop")
+    run = run_benchmarks(
+        database_uri=database_uri,
+        allow_drop=allow_drop,
+        products=products,
+        users=users,
+        iterations=iterations,
+        warmup=warmup,
+        only=only,
+    )
+    if baseline:
+        with open(baseline) as handle:
+            run["comparison"] = compare(run, json.load(handle))
+
+    if output:
+        with open(output, "w") as handle:
+            handle.write(dumps(run))
+        click.echo(f"Results written to {output}")
+    else:
+        click.echo(dumps(run))
+
+
+@cli.command("serve-benchmark")
+@click.option(
+    "--concurrency", default=100, show_default=True, help="Concurrent connections."
+)
+@click.option(
+    "--requests",
+    "requests_per_scenario",
+    default=2000,
+    show_default=True,
+    help="Requests per scenario and serving mode.",
+)
+@click.option("--products", default=100, show_default=True, help="Products to seed.")
+@click.option(
+    "--database-uri",
+    default=None,
+    help="Database to seed and use, a temporary SQLite file by default.",
+)
+@click.option(
+    "--allow-drop",
+    is_flag=True,
+    help="Drop every table of --database-uri, required to use it.",
+)
+@click.option("--output", type=click.Path(), help="Write the JSON results to a file.")
+def serve_benchmark(
+    concurrency, requests_per_scenario, products, database_uri, allow_drop, output
+):
+    """Compares the WSGI and ASGI serving modes under concurrent connections."""
+    from benchmarks import compare_serving, dumps
+
+    if database_uri and not allow_drop:
+        raise click.UsageError("--database-uri tables are dropped, pass --allow-drop")
+    run = compare_serving(
+        database_uri=database_uri,
+        allow_drop=allow_drop,
+        concurrency=concurrency,
+        requests_per_scenario=requests_per_scenario,
+        products=products,
+    )
+    if output:
+        with open(output, "w") as handle:
+            handle.write(dumps(run))
+        click.echo(f"Results written to {output}")
+    else:
+        click.echo(dumps(run))
+
+
+@cli.command("serialize-benchmark")
+@click.option("--products", default=1000, show_default=True, help="Products listed.")
+@click.option(
+    "--iterations", default=200, show_default=True, help="Measured calls per case."
+)
+@click.option("--warmup", default=10, show_default=True, help="Unmeasured calls first.")
+def serialize_benchmark(products, iterations, warmup):
+    """Compares the restx and compiled marshalling and the JSON backends."""
+    from benchmarks import compare_serialization, dumps
+
+    click.echo(dumps(compare_serialization(products, iterations, warmup)))
+
+
+@cli.command("loadgen")
+@click.option(
+    "--collection",
+    type=click.Path(exists=True),
+    default=None,
+    help="Postman collection, the one of the repository by default.",
+)
+@click.option(
+    "--mix",
+    multiple=True,
+    help="Scenario weight as FOLDER/NAME=WEIGHT, can be repeated.",
+)
+@click.option("--users", default=10, show_default=True, help="Virtual users.")
+@click.option("--duration", default=10.0, show_default=True, help="Seconds to run.")
+@click.option("--url", default=None, help="Server to load, a local one by default.")
+@click.option("--products", default=20, show_default=True, help="Products created.")
+@click.option("--think-time", default=0.0, help="Seconds between two requests.")
+@click.option("--seed", default=0, help="Random seed of the scenario choices.")
+@click.option("--output", type=click.Path(), help="Write the JSON report to a file.")
+def loadgen(collection, mix, users, duration, url, products, think_time, seed, output):
+    """Replays the Postman collection with concurrent virtual users."""
+    from benchmarks import dumps, parse_mix, run_load
+    from benchmarks.loadgen import COLLECTION
+
+    report = run_load(
+        collection=collection or COLLECTION,
+        mix=parse_mix(mix) if mix else None,
+        users=users,
+        duration=duration,
+        url=url,
+        products=products,
+        think_time=think_time,
+        seed=seed,
+    )
+    if output:
+        with open(output, "w") as handle:
+            handle.write(dumps(report))
+        click.echo(f"Report written to {output}")
+    else:
+        click.echo(dumps(report))
+
+
 if __name__ == "__main__":
     cli()
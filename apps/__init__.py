@@ -13,23 +13,36 @@ from flask import Flask
 from config import config_by_name
 
 # Import extensions
-from .extensions import bcrypt, db, login_manager
+from .extensions import (bcrypt, catalog_cache, compression, db, hasher,
+                         idempotency, login_manager, metrics, pool_manager,
+                         query_profiler)
 
 
-def create_app(config_name):
+def create_app(config_name, config=None):
     """
     Flask app create method
 
     Args:
         config_name
+        config: values overriding the configuration class
 
     Returns:
         app
     """
     app = Flask(__name__)
     app.config.from_object(config_by_name[config_name])
+    if config:
+        app.config.update(config)
     bcrypt.init_app(app)
+    hasher.init_app(app)
     login_manager.init_app(app)
+    pool_manager.init_app(app)
     db.init_app(app)
+    catalog_cache.init_app(app)
+    idempotency.init_app(app)
+    query_profiler.init_app(app)
+    metrics.init_app(app)
+    compression.init_app(app)
+    pool_manager.warmup_on_first_request(app, db)
 
     return app
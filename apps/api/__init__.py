@@ -3,7 +3,8 @@
 from flask import Blueprint
 from flask_restx import Api
 
-from apps.api.controllers import action_ns, product_ns, user_ns
+from apps.api.controllers import action_ns, internal_ns, product_ns, user_ns
+from apps.api.docs import ApiDocs
 
 blueprint = Blueprint("api", __name__, url_prefix="/api")
 
@@ -23,3 +24,7 @@ api = Api(
 api.add_namespace(product_ns)
 api.add_namespace(user_ns)
 api.add_namespace(action_ns)
+api.add_namespace(internal_ns)
+
+docs = ApiDocs(api)
+blueprint.record(lambda state: docs.init_app(state.app))
@@ -1,5 +1,6 @@
 """Controller related imports"""
 
 from .actions_controller import api as action_ns
+from .internal_controller import api as internal_ns
 from .product_controller import api as product_ns
 from .user_controller import api as user_ns
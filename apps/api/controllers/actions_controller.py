@@ -1,17 +1,33 @@
 """Action related endpoints"""
 
 from flask import request
-from flask_login import current_user, login_required
+from flask_login import login_required
 from flask_restx import Resource
 
 from apps.api.dto import ActionsDto, ProductDto
-from apps.api.models import User
-from apps.api.services import (buy_product, check_user_role, deposit_amount,
-                               reset_deposit)
-from apps.api.utils import response_with
+from apps.api.services import (buy_product, buy_products, change_as_list,
+                               check_user_role, deposit_amount,
+                               get_current_user, reset_deposit)
+from apps.api.utils import (idempotent, model_serializer, read_fields,
+                            response_with)
 from apps.api.utils import responses as resp
 
 api = ActionsDto.api
+_product = ProductDto.product
+
+UNKNOWN_FIELDS = f"fields accepts {', '.join(_product)}"
+
+
+def _change_report(change):
+    """
+    Change in the requested format
+    {coin: count} by default, one entry per coin with ?change_format=list
+
+    :param dict change: Coin counts by value
+    """
+    if request.args.get("change_format") == "list":
+        return change_as_list(change)
+    return change
 
 
 @api.route("/buy")
@@ -28,13 +44,20 @@ class BuyCollection(Resource):
 
     @api.doc(
         "Buy action",
-        responses={200: "Success", 400: "Invalid payload", 403: "Unauthorized"},
+        responses={
+            200: "Success",
+            400: "Invalid payload",
+            403: "Unauthorized",
+            422: "Invalid fields",
+        },
+        params=ProductDto.fields_param,
     )
     @login_required
+    @idempotent
     def post(self):
         """Buys a product."""
         # Get the current user ROLE
-        user = User.query.filter_by(username=current_user.username).first()
+        user = get_current_user()
         user_role = check_user_role(user)
 
         # check if the user is a BUYER
@@ -44,15 +67,21 @@ class BuyCollection(Resource):
                 value={"response": "You are not authorized to perform this action"},
             )
 
+        fields = read_fields(_product)
+        if fields is None:
+            return response_with(
+                resp.INVALID_FIELD_NAME_SENT_422, value={"response": UNKNOWN_FIELDS}
+            )
+
         # validate the payload
         payload = request.get_json()
         change, spending, product = buy_product(payload, user)
 
         if product:
             # return report
-            product_marsh = api.marshal(product, ProductDto.product)
+            product_marsh = model_serializer(_product, fields)(product)
             report = {
-                "change": change,
+                "change": _change_report(change),
                 "spending": spending,
                 "product": product_marsh,
             }
@@ -63,6 +92,74 @@ class BuyCollection(Resource):
         )
 
 
+@api.route("/buy/batch")
+class BuyBatchCollection(Resource):
+    """
+    Collection for /buy/batch - endpoint
+
+    Args:
+        Resource (Object)
+
+    Returns:
+        json: data
+    """
+
+    @api.doc(
+        "Buy a basket",
+        responses={
+            200: "Success",
+            400: "Invalid payload",
+            403: "Unauthorized",
+            422: "Invalid fields",
+        },
+        params=ProductDto.fields_param,
+    )
+    @api.expect(ActionsDto.basket)
+    @login_required
+    @idempotent
+    def post(self):
+        """Buys several products at once, all or nothing."""
+        user = get_current_user()
+        user_role = check_user_role(user)
+
+        if user_role != "BUYER":
+            return response_with(
+                resp.UNAUTHORIZED_403,
+                value={"response": "You are not authorized to perform this action"},
+            )
+
+        fields = read_fields(_product)
+        if fields is None:
+            return response_with(
+                resp.INVALID_FIELD_NAME_SENT_422, value={"response": UNKNOWN_FIELDS}
+            )
+
+        payload = request.get_json()
+        items = payload.get("items") if isinstance(payload, dict) else None
+        change, spending, lines = buy_products(items, user)
+
+        if lines is None:
+            return response_with(
+                resp.BAD_REQUEST_400, value={"response": "Invalid basket"}
+            )
+        if change is False:
+            return response_with(
+                resp.BAD_REQUEST_400,
+                value={"response": "Basket could not be bought"},
+                error=[line for line in lines if "error" in line],
+            )
+
+        marshal_product = model_serializer(_product, fields)
+        for line in lines:
+            line["product"] = marshal_product(line["product"])
+        report = {
+            "change": _change_report(change),
+            "spending": spending,
+            "lines": lines,
+        }
+        return response_with(resp.SUCCESS_200, value={"response": report})
+
+
 @api.route("/deposit")
 class DepositCollection(Resource):
     """
@@ -85,9 +182,10 @@ class DepositCollection(Resource):
         },
     )
     @login_required
+    @idempotent
     def post(self):
         """Deposit coin amount."""
-        user = User.query.filter_by(username=current_user.username).first()
+        user = get_current_user()
         user_role = check_user_role(user)
         if user_role != "BUYER":
             return response_with(
@@ -128,10 +226,11 @@ class ResetCollection(Resource):
         },
     )
     @login_required
+    @idempotent
     def post(self):
         """Reset deposit amount to 0."""
         # Get the current user ROLE
-        user = User.query.filter_by(username=current_user.username).first()
+        user = get_current_user()
         user_role = check_user_role(user)
         if user_role != "BUYER":
             return response_with(
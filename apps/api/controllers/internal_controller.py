@@ -0,0 +1,103 @@
+"""
+Internal runtime statistics endpoints
+
+Turned off unless INTERNAL_ENDPOINTS_ENABLED is set, and only served to
+logged in users.
+"""
+
+from flask import current_app
+from flask_login import login_required
+from flask_restx import Resource
+
+from apps.api.dto import InternalDto
+from apps.api.utils import response_with
+from apps.api.utils import responses as resp
+from apps.extensions import catalog_cache, db, pool_stats, query_profiler
+
+api = InternalDto.api
+
+
+def _disabled():
+    """Check if internal endpoints are turned off"""
+    return not current_app.config.get("INTERNAL_ENDPOINTS_ENABLED", False)
+
+
+@api.route("/cache")
+class CacheStatsCollection(Resource):
+    """
+    Collection for /cache - endpoint
+
+    Args:
+        Resource (Object)
+
+    Returns:
+        json: data
+    """
+
+    @api.doc(
+        "Catalog cache statistics",
+        responses={200: "Success", 401: "Unauthorized", 404: "Not found"},
+        security="basicAuth",
+    )
+    @login_required
+    def get(self):
+        """Returns catalog cache counters."""
+        if _disabled():
+            return response_with(resp.SERVER_ERROR_404)
+        return response_with(
+            resp.SUCCESS_200, value={"response": catalog_cache.stats()}
+        )
+
+
+@api.route("/pool")
+class PoolStatsCollection(Resource):
+    """
+    Collection for /pool - endpoint
+
+    Args:
+        Resource (Object)
+
+    Returns:
+        json: data
+    """
+
+    @api.doc(
+        "Database connection pool statistics",
+        responses={200: "Success", 401: "Unauthorized", 404: "Not found"},
+        security="basicAuth",
+    )
+    @login_required
+    def get(self):
+        """Returns connection pool counters."""
+        if _disabled():
+            return response_with(resp.SERVER_ERROR_404)
+        return response_with(
+            resp.SUCCESS_200, value={"response": pool_stats(db.engine)}
+        )
+
+
+@api.route("/queries")
+class QueryStatsCollection(Resource):
+    """
+    Collection for /queries - endpoint
+
+    Args:
+        Resource (Object)
+
+    Returns:
+        json: data
+    """
+
+    @api.doc(
+        "SQL statements per endpoint",
+        responses={200: "Success", 401: "Unauthorized", 404: "Not found"},
+        security="basicAuth",
+    )
+    @login_required
+    def get(self):
+        """Returns query count and timing aggregates per endpoint."""
+        if _disabled():
+            return response_with(resp.SERVER_ERROR_404)
+        return response_with(
+            resp.SUCCESS_200, value={"response": query_profiler.stats()}
+        )
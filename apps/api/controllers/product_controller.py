@@ -1,18 +1,25 @@
 """Product related endpoints"""
 
 from flask import request
-from flask_login import current_user, login_required
+from flask_login import login_required
 from flask_restx import Resource
 
 from apps.api.dto import ProductDto
-from apps.api.models import User
-from apps.api.services import (check_user_role, create_product, delete_product,
-                               list_products, update_product)
-from apps.api.utils import response_with
+from apps.api.services import (bulk_create_products, bulk_delete_products,
+                               bulk_update_products, catalog_version,
+                               check_user_role, create_product, delete_product,
+                               get_current_user, get_product, iter_products,
+                               paginate_products, update_product)
+from apps.api.utils import (etag_matches, make_etag, model_serializer,
+                            read_fields, read_items, response_with)
 from apps.api.utils import responses as resp
+from apps.api.utils import stream_response_with
 
 api = ProductDto.api
 _product = ProductDto.product
+_list_parser = ProductDto.list_parser
+
+UNKNOWN_FIELDS = f"fields accepts {', '.join(_product)}"
 
 
 @api.route("/")
@@ -31,19 +38,64 @@ class ProductCollection(Resource):
         "Product details",
         responses={
             200: ("product", _product),
+            304: "Not modified",
             401: "Unauthorized",
             404: "Not found",
+            422: "Invalid fields",
         },
         security="basicAuth",
     )
+    @api.expect(_list_parser)
     @login_required
     def get(self):
         """Returns products."""
-        products = list_products()
+        args = _list_parser.parse_args()
+        filters = {
+            key: args[key] for key in ("sellerId", "minCost", "maxCost", "inStock")
+        }
+        fields = read_fields(_product)
+        if fields is None:
+            return response_with(
+                resp.INVALID_FIELD_NAME_SENT_422, value={"response": UNKNOWN_FIELDS}
+            )
+        marshal_product = model_serializer(_product, fields)
+
+        if args["stream"]:
+            products = iter_products(filters=filters, columns=fields)
+            return stream_response_with(
+                resp.SUCCESS_200,
+                (marshal_product(product) for product in products),
+            )
+
+        # the page is only loaded when the client copy is outdated,
+        # without a version row nothing tells when it changes, so no ETag
+        etag = None
+        version = catalog_version()
+        if version is not None:
+            etag = make_etag(version, sorted(args.items()))
+            if etag_matches(etag):
+                return response_with(resp.NOT_MODIFIED_304, etag=etag)
+
+        products, pagination = paginate_products(
+            cursor=args["cursor"],
+            limit=args["limit"],
+            sort=args["sort"],
+            filters=filters,
+            columns=fields,
+        )
 
+        if products is None:
+            return response_with(
+                resp.BAD_REQUEST_400, value={"response": "Invalid cursor"}
+            )
         if products:
-            response = api.marshal(products, _product)
-            return response_with(resp.SUCCESS_200, value={"response": response})
+            response = marshal_product(products)
+            return response_with(
+                resp.SUCCESS_200,
+                value={"response": response},
+                pagination=pagination,
+                etag=etag,
+            )
         return response_with(
             resp.BAD_REQUEST_400, value={"response": "No products found"}
         )
@@ -54,12 +106,14 @@ class ProductCollection(Resource):
             201: ("product", _product),
             400: "Invalid payload",
             403: "Unauthorized",
+            422: "Invalid fields",
         },
+        params=ProductDto.fields_param,
     )
     @login_required
     def post(self):
         """Creates a new product."""
-        user = User.query.filter_by(username=current_user.username).first()
+        user = get_current_user()
 
         user_role = check_user_role(user)
         if user_role != "SELLER":
@@ -68,11 +122,17 @@ class ProductCollection(Resource):
                 value={"message": "You are not authorized to perform this action"},
             )
 
+        fields = read_fields(_product)
+        if fields is None:
+            return response_with(
+                resp.INVALID_FIELD_NAME_SENT_422, value={"response": UNKNOWN_FIELDS}
+            )
+
         payload = request.get_json()
         if user:
             product = create_product(payload, user)
             if product:
-                response = api.marshal(product, _product)
+                response = model_serializer(_product, fields)(product)
                 return response_with(resp.SUCCESS_201, value={"response": response})
         return response_with(resp.BAD_REQUEST_400, value={"response": "No user found"})
 
@@ -84,11 +144,12 @@ class ProductCollection(Resource):
             400: "Bad Request",
             403: "Unauthorized",
         },
+        params=ProductDto.fields_param,
     )
     @login_required
     def put(self):
         """Update a product."""
-        user = User.query.filter_by(username=current_user.username).first()
+        user = get_current_user()
         user_role = check_user_role(user)
         if user_role != "SELLER":
             return response_with(
@@ -96,10 +157,16 @@ class ProductCollection(Resource):
                 value={"message": "You are not authorized to perform this action"},
             )
 
+        fields = read_fields(_product)
+        if fields is None:
+            return response_with(
+                resp.INVALID_FIELD_NAME_SENT_422, value={"response": UNKNOWN_FIELDS}
+            )
+
         payload = request.get_json()
         product = update_product(payload, user)
         if product:
-            response = api.marshal(product, _product)
+            response = model_serializer(_product, fields)(product)
             return response_with(resp.SUCCESS_201, value={"response": response})
         return response_with(
             resp.INVALID_INPUT_422,
@@ -120,8 +187,8 @@ class ProductCollection(Resource):
     @login_required
     def delete(self):
         """Returns product details"""
-        user = User.query.filter_by(username=current_user.username).first()
-        user_role = check_user_role(current_user)
+        user = get_current_user()
+        user_role = check_user_role(user)
 
         if user_role != "SELLER":
             return response_with(
@@ -142,3 +209,158 @@ class ProductCollection(Resource):
                 "response": "Product not found or you are not the owner of this product"
             },
         )
+
+
+def _bulk_response(report, count_key, success):
+    """
+    Make the response of a bulk operation
+
+    :param dict report: Bulk operation report
+    :param str count_key: Report key holding the number of changed products
+    :param dict success: Response type when some product changed
+    """
+    errors = report["errors"] or None
+    if not report[count_key] and errors:
+        return response_with(
+            resp.INVALID_INPUT_422, value={"response": {count_key: 0}}, error=errors
+        )
+    return response_with(
+        success, value={"response": {count_key: report[count_key]}}, error=errors
+    )
+
+
+@api.route("/bulk")
+class ProductBulkCollection(Resource):
+    """
+    Collection for /bulk - endpoint
+    Accepts a JSON array or a newline delimited JSON body
+    (Content-Type: application/x-ndjson) for large uploads.
+
+    Args:
+        Resource (Object)
+
+    Returns:
+        json: data
+    """
+
+    @staticmethod
+    def _bulk(operation, count_key, success):
+        """
+        Run a bulk operation for the current SELLER
+
+        :param callable operation: Bulk service function
+        :param str count_key: Report key holding the number of changed products
+        :param dict success: Response type when some product changed
+        """
+        user = get_current_user()
+        if check_user_role(user) != "SELLER":
+            return response_with(
+                resp.UNAUTHORIZED_403,
+                value={"message": "You are not authorized to perform this action"},
+            )
+
+        items = read_items()
+        if items is None:
+            return response_with(
+                resp.BAD_REQUEST_400,
+                value={"response": "Expected a JSON array or NDJSON body"},
+            )
+
+        report = operation(items, user)
+        return _bulk_response(report, count_key, success)
+
+    @api.doc(
+        "Create products in bulk",
+        responses={
+            201: "Products created",
+            400: "Invalid payload",
+            403: "Unauthorized",
+            422: "Invalid input",
+        },
+    )
+    @login_required
+    def post(self):
+        """Creates many products."""
+        return self._bulk(bulk_create_products, "created", resp.SUCCESS_201)
+
+    @api.doc(
+        "Update products in bulk",
+        responses={
+            200: "Products updated",
+            400: "Invalid payload",
+            403: "Unauthorized",
+            422: "Invalid input",
+        },
+    )
+    @login_required
+    def put(self):
+        """Updates many products."""
+        return self._bulk(bulk_update_products, "updated", resp.SUCCESS_200)
+
+    @api.doc(
+        "Delete products in bulk",
+        responses={
+            200: "Products deleted",
+            400: "Invalid payload",
+            403: "Unauthorized",
+            422: "Invalid input",
+        },
+    )
+    @login_required
+    def delete(self):
+        """Deletes many products."""
+        return self._bulk(bulk_delete_products, "deleted", resp.SUCCESS_200)
+
+
+@api.route("/<int:product_id>")
+class ProductItem(Resource):
+    """
+    Item for /<product_id> - endpoint
+
+    Args:
+        Resource (Object)
+
+    Returns:
+        json: data
+    """
+
+    @api.doc(
+        "Single product details",
+        responses={
+            200: ("product", _product),
+            304: "Not modified",
+            401: "Unauthorized",
+            404: "Not found",
+            422: "Invalid fields",
+        },
+        params=ProductDto.fields_param,
+        security="basicAuth",
+    )
+    @login_required
+    def get(self, product_id):
+        """Returns a product."""
+        fields = read_fields(_product)
+        if fields is None:
+            return response_with(
+                resp.INVALID_FIELD_NAME_SENT_422, value={"response": UNKNOWN_FIELDS}
+            )
+
+        # the cached snapshot has every field, only the output is restricted
+        product = get_product(product_id)
+
+        if product:
+            etag = (
+                make_etag(product)
+                if fields == tuple(_product)
+                else make_etag(product, fields)
+            )
+            if etag_matches(etag):
+                return response_with(resp.NOT_MODIFIED_304, etag=etag)
+
+            response = model_serializer(_product, fields)(product)
+            return response_with(
+                resp.SUCCESS_200, value={"response": response}, etag=etag
+            )
+        return response_with(
+            resp.SERVER_ERROR_404, value={"response": "Product not found"}
+        )
@@ -1,20 +1,28 @@
 """User controller"""
-from email_validator import validate_email
 from flask import request
 from flask_login import current_user, login_required, login_user, logout_user
 from flask_restx import Resource
 
 from apps.api.dto import UserDto
-from apps.api.models import User
-from apps.api.services import register_user
+from apps.api.services import (authenticate_user, get_current_user,
+                               register_user, resolve_identity)
 from apps.api.utils import response_with
 from apps.api.utils import responses as resp
-from apps.extensions import bcrypt, db, login_manager
+from apps.extensions import HasherSaturated, db, login_manager
 
 api = UserDto.api
 _user = UserDto.user
 
 
+def _busy_response():
+    """Response for requests rejected because password hashing is saturated"""
+    return response_with(
+        resp.SERVICE_UNAVAILABLE_503,
+        value={"response": "Too many login attempts in progress, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
+
 @api.route("/register")
 class UserRegisterCollection(Resource):
     """
@@ -32,13 +40,17 @@ class UserRegisterCollection(Resource):
         responses={
             201: "User registered successfully",
             400: "Bad request",
+            503: "Service unavailable",
         },
     )
     @api.expect(_user)
     def post(self):
         """Register User"""
         payload = request.get_json()
-        register = register_user(payload)
+        try:
+            register = register_user(payload)
+        except HasherSaturated:
+            return _busy_response()
         if register:
             return response_with(
                 resp.SUCCESS_201, value={"response": "User created successfully"}
@@ -65,7 +77,7 @@ class UserLoginCollection(Resource):
     @login_manager.user_loader
     def load_user(user_id):
         """Check if user is logged in on every page load."""
-        return User.query.get(int(user_id))
+        return resolve_identity(user_id)
 
     @api.doc(
         "Login user",
@@ -73,6 +85,7 @@ class UserLoginCollection(Resource):
             200: "User logged in successfully",
             400: "Bad request",
             403: "Unauthorized",
+            503: "Service unavailable",
         },
     )
     @api.expect(_user)
@@ -86,6 +99,9 @@ class UserLoginCollection(Resource):
                 },
             )
         payload = request.get_json()
+        # imported on the first login instead of at start up
+        from email_validator import validate_email
+
         try:
             validate_email(payload["username"])
         except Exception:
@@ -93,13 +109,14 @@ class UserLoginCollection(Resource):
                 resp.BAD_REQUEST_400,
                 value={"response": "Invalid username or password"},
             )
-        user = User.query.filter_by(username=payload["username"]).first()
+        try:
+            user = authenticate_user(payload["username"], payload["password"])
+        except HasherSaturated:
+            return _busy_response()
+
         if user:
-            if bcrypt.check_password_hash(user.password, payload["password"]):
-                login_user(user)
-                return response_with(
-                    resp.SUCCESS_200, value={"response": "User logged in"}
-                )
+            login_user(user)
+            return response_with(resp.SUCCESS_200, value={"response": "User logged in"})
         return response_with(
             resp.BAD_REQUEST_400,
             value={"response": "Invalid username or password"},
@@ -178,7 +195,7 @@ class UserDeleteCollection(Resource):
     @login_required
     def delete(self):
         """Remove current user from the system"""
-        user = User.query.filter_by(username=current_user.username).first()
+        user = get_current_user()
 
         if user:
             db.session.delete(user)
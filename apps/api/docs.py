@@ -0,0 +1,122 @@
+"""
+API documentation serving
+
+The Swagger specification is rendered once per application, on first
+use, or read at start up from a file exported at build time. It is served
+as pre-encoded bytes, plain or gzip, with a strong ETag. The
+documentation page is rendered once per host. DOCS_ENABLED=0 turns both
+off.
+"""
+
+import gzip
+import hashlib
+import json
+
+from flask import Response, current_app, request
+from flask_restx import apidoc
+
+from apps.api.utils import response_with
+from apps.api.utils import responses as resp
+
+# documentation pages cached, one per host name
+MAX_DOC_PAGES = 16
+
+
+class StaticDocument:
+    """
+    Pre-encoded response body with a gzip variant
+
+    :param bytes body: Response body
+    :param str mimetype: Response media type
+    """
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+    def response(self):
+        """Response to the current request, 304 when the client copy is current"""
+        use_gzip = request.accept_encodings["gzip"] > 0
+        etag = f"{self.etag}-gzip" if use_gzip else self.etag
+        headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzipped, mimetype=self.mimetype, headers=headers)
+        return Response(self.body, mimetype=self.mimetype, headers=headers)
+
+
+def render_spec(api):
+    """
+    Encode the Swagger specification
+    Needs a request context for the API base path.
+
+    :param Api api: Documented API
+    """
+    schema = api.__schema__
+    if "error" in schema:
+        raise RuntimeError(schema["error"])
+    return json.dumps(schema, separators=(",", ":")).encode() + b"\n"
+
+
+class ApiDocs:
+    """
+    Serves the documentation of an API ahead of the flask-restx views
+
+    :param Api api: Documented API
+    """
+
+    def __init__(self, api):
+        self.api = api
+        name = api.blueprint.name
+        self.views = {f"{name}.specs": self.spec_view, f"{name}.doc": self.doc_view}
+        api.blueprint.before_request(self.before_request)
+
+    def init_app(self, app):
+        """
+        Set the configuration defaults and load an exported specification
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("DOCS_ENABLED", True)
+        app.config.setdefault("DOCS_SPEC_FILE", None)
+
+        spec = None
+        if app.config["DOCS_ENABLED"] and app.config["DOCS_SPEC_FILE"]:
+            with open(app.config["DOCS_SPEC_FILE"], "rb") as handle:
+                spec = StaticDocument(handle.read(), "application/json")
+        app.extensions["api_docs"] = {"spec": spec, "pages": {}}
+
+    def before_request(self):
+        """Answer the documentation endpoints before their views run"""
+        view = self.views.get(request.endpoint)
+        if view is None:
+            return None
+        if not current_app.config["DOCS_ENABLED"]:
+            return response_with(resp.SERVER_ERROR_404)
+        return view()
+
+    def spec_view(self):
+        """Serve the specification, rendered on first use"""
+        state = current_app.extensions["api_docs"]
+        if state["spec"] is None:
+            state["spec"] = StaticDocument(render_spec(self.api), "application/json")
+        return state["spec"].response()
+
+    def doc_view(self):
+        """Serve the documentation page, rendered once per host"""
+        pages = current_app.extensions["api_docs"]["pages"]
+        page = pages.get(request.host_url)
+        if page is None:
+            page = StaticDocument(apidoc.ui_for(self.api).encode(), "text/html")
+            if len(pages) < MAX_DOC_PAGES:
+                pages[request.host_url] = page
+        return page.response()
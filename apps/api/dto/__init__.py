@@ -1,5 +1,6 @@
 """Data Transfer Objects - DTO related imports"""
 
 from .actions_dto import ActionsDto
+from .internal_dto import InternalDto
 from .product_dto import ProductDto
 from .user_dto import UserDto
@@ -1,9 +1,28 @@
 """Actions related data transfer object"""
 
-from flask_restx import Namespace
+from flask_restx import Namespace, fields
 
 
 class ActionsDto:
     """Actions data transfer object definitions"""
 
     api = Namespace("action", description="Vending Machine related operations")
+
+    buy_item = api.model(
+        "BuyItem",
+        {
+            "product_id": fields.Integer(
+                description="Product identifier", required=True
+            ),
+            "quantity": fields.Integer(description="Items to buy", required=True),
+        },
+    )
+
+    basket = api.model(
+        "Basket",
+        {
+            "items": fields.List(
+                fields.Nested(buy_item), description="Basket lines", required=True
+            ),
+        },
+    )
@@ -0,0 +1,9 @@
+"""Internal operations related data transfer object"""
+
+from flask_restx import Namespace
+
+
+class InternalDto:
+    """Internal data transfer object definitions"""
+
+    api = Namespace("internal", description="Internal runtime statistics")
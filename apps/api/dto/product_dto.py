@@ -1,6 +1,6 @@
 """Product related data transfer object"""
 
-from flask_restx import Namespace, fields
+from flask_restx import Namespace, fields, inputs
 
 
 class ProductDto:
@@ -28,3 +28,50 @@ class ProductDto:
             ),
         },
     )
+
+    fields_param = {
+        "fields": "Comma separated product fields to return, all by default"
+    }
+
+    list_parser = api.parser()
+    list_parser.add_argument(
+        "cursor", type=str, location="args", help="Cursor of the previous page"
+    )
+    list_parser.add_argument("limit", type=int, location="args", help="Page size")
+    list_parser.add_argument(
+        "sort",
+        type=str,
+        location="args",
+        choices=(
+            "id",
+            "-id",
+            "cost",
+            "-cost",
+            "productName",
+            "-productName",
+            "amountAvailable",
+            "-amountAvailable",
+        ),
+        help="Sort key, prefix with - for descending order",
+    )
+    list_parser.add_argument(
+        "sellerId", type=int, location="args", help="Only products of this seller"
+    )
+    list_parser.add_argument(
+        "minCost", type=int, location="args", help="Minimum product cost"
+    )
+    list_parser.add_argument(
+        "maxCost", type=int, location="args", help="Maximum product cost"
+    )
+    list_parser.add_argument(
+        "inStock", type=inputs.boolean, location="args", help="Only available products"
+    )
+    list_parser.add_argument(
+        "stream",
+        type=inputs.boolean,
+        location="args",
+        help="Stream every product instead of one page",
+    )
+    list_parser.add_argument(
+        "fields", type=str, location="args", help=fields_param["fields"]
+    )
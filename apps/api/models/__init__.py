@@ -1,4 +1,8 @@
 """Model related imports"""
 
+from .catalog import CATALOG_VERSION_ID, CatalogVersion
+from .coin import CoinInventory
+from .idempotency import IdempotencyRecord
+from .ledger import LedgerEntry, LedgerKind
 from .product import Product
 from .user import User
@@ -0,0 +1,31 @@
+"""Catalog version related model"""
+from sqlalchemy import DDL, event
+
+from apps.extensions import db
+
+CATALOG_VERSION_ID = 1
+
+
+class CatalogVersion(db.Model):
+    """
+    Catalog version database model.
+    Single row counter bumped in the transaction of every product write,
+    the product listing ETags are built on it.
+    """
+
+    __tablename__ = "catalog_version"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Catalog version representation"""
+        return f"{self.version}"
+
+
+# the row exists as soon as the table does, writers only ever update it
+event.listen(
+    CatalogVersion.__table__,
+    "after_create",
+    DDL(f"INSERT INTO catalog_version (id, version) VALUES ({CATALOG_VERSION_ID}, 0)"),
+)
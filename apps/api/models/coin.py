@@ -0,0 +1,20 @@
+"""Coin inventory related model"""
+from apps.extensions import db
+
+from .audit import BaseModel
+
+
+class CoinInventory(BaseModel):
+    """
+    Coin inventory database model.
+    Number of coins of each value held by the machine.
+    """
+
+    __tablename__ = "coin_inventory"
+
+    coin = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Coin inventory representation"""
+        return f"{self.coin} : {self.count}"
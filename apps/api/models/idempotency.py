@@ -0,0 +1,26 @@
+"""Idempotency key related model"""
+from apps.extensions import db
+
+from .audit import BaseModel
+
+
+class IdempotencyRecord(BaseModel):
+    """
+    Idempotency key database model.
+    Response of a request sent with an Idempotency-Key header, status is
+    empty while the request is processed. applied is set in the
+    transaction of the request, a claim whose request committed is never
+    taken over.
+    """
+
+    __tablename__ = "idempotency_key"
+
+    key = db.Column(db.String(64), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.LargeBinary, nullable=True)
+    applied = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        """Idempotency key representation"""
+        return f"{self.key} : {self.status}"
@@ -0,0 +1,36 @@
+"""Deposit ledger related model"""
+
+import enum
+
+from apps.extensions import db
+
+from .audit import BaseModel
+
+
+class LedgerKind(enum.Enum):
+    """Deposit movement kinds enum definition"""
+
+    DEPOSIT = "DEPOSIT"
+    PURCHASE = "PURCHASE"
+    RESET = "RESET"
+
+
+class LedgerEntry(BaseModel):
+    """
+    Deposit ledger database model.
+    Append-only movements of the user deposits, credits are positive and
+    debits negative. Entries up to User.ledgerEntryId are already part of
+    User.deposit.
+    """
+
+    __tablename__ = "deposit_ledger"
+    __table_args__ = (db.Index("ix_deposit_ledger_user_entry", "userId", "id"),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    userId = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.Enum(LedgerKind), nullable=False)
+
+    def __repr__(self):
+        """Ledger entry representation"""
+        return f"{self.userId} : {self.kind} {self.amount}"
@@ -13,10 +13,12 @@ class Product(BaseModel):
     __tablename__ = "product"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    amountAvailable = db.Column(db.Integer, nullable=False)
-    cost = db.Column(db.Integer, nullable=False, default=0)
-    productName = db.Column(db.String(255), nullable=False)
-    sellerId = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    amountAvailable = db.Column(db.Integer, nullable=False, index=True)
+    cost = db.Column(db.Integer, nullable=False, default=0, index=True)
+    productName = db.Column(db.String(255), nullable=False, index=True)
+    sellerId = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
 
     def __repr__(self):
         """Product representation"""
@@ -25,6 +25,8 @@ class User(BaseModel, UserMixin):
     username = db.Column(db.String(25), unique=True, nullable=False)
     password = db.Column(db.String(255), nullable=False)
     deposit = db.Column(db.Integer, nullable=False, default=0)
+    # last deposit ledger entry included in deposit
+    ledgerEntryId = db.Column(db.Integer, nullable=False, default=0)
     role = db.Column(db.Enum(UserRole), default="BUYER")
 
     def __repr__(self):
@@ -1,6 +1,15 @@
 """Services imports"""
 
-from .action_service import buy_product, deposit_amount, reset_deposit
-from .product_service import (create_product, delete_product, list_products,
+from .action_service import (buy_product, buy_products, deposit_amount,
+                             reset_deposit)
+from .change_service import (add_coin, change_as_list, coin_denominations,
+                             coin_limits, make_change, take_coins)
+from .idempotency_service import purge_idempotency_keys
+from .ledger_service import compact_ledger, user_balance
+from .product_service import (bulk_create_products, bulk_delete_products,
+                              bulk_update_products, catalog_version,
+                              create_product, delete_product, get_product,
+                              iter_products, list_products, paginate_products,
                               update_product)
-from .user_service import check_user_role, register_user
+from .user_service import (authenticate_user, check_user_role,
+                           get_current_user, register_user, resolve_identity)
@@ -1,7 +1,119 @@
 """Action related functions - services"""
 
-from apps.api.models import Product
-from apps.extensions import db
+from flask import current_app
+
+from apps.api.models import LedgerKind, Product, User
+from apps.extensions import catalog_cache, db, metrics
+
+from .change_service import (add_coin, coin_denominations, coin_limits,
+                             inventory_enabled, make_change, take_coins)
+from .ledger_service import credit, debit, ledger_enabled, user_balance
+from .product_service import bump_catalog_version, product_rows
+
+
+def _decrement_stock(product, quantity):
+    """
+    Decrement product stock in a single conditional statement
+    Nothing is changed when the stock is too low or the price changed
+    since the product was read
+
+    :param Product product: Found product
+    :param int quantity: Amount of items to take
+    """
+    updated = Product.query.filter(
+        Product.id == product.id,
+        Product.cost == product.cost,
+        Product.amountAvailable >= quantity,
+    ).update(
+        {Product.amountAvailable: Product.amountAvailable - quantity},
+        synchronize_session=False,
+    )
+    return updated == 1
+
+
+def _stock_error(product, quantity):
+    """
+    Reason a conditional stock decrement changed nothing
+
+    :param Product product: Product as read before the decrement
+    :param int quantity: Amount of items to take
+    """
+    cost = db.session.query(Product.cost).filter(Product.id == product.id).scalar()
+    if cost is None:
+        return "Product not found"
+    if cost != product.cost:
+        return "Price changed"
+    return "Not enough items available"
+
+
+def _debit_deposit(user, amount):
+    """
+    Debit user deposit in a single conditional statement
+    Nothing is changed when the deposit is not enough
+
+    :param User user: Found user
+    :param int amount: Amount to debit
+    """
+    if ledger_enabled():
+        return debit(user, amount)
+
+    updated = User.query.filter(User.id == user.id, User.deposit >= amount).update(
+        {User.deposit: User.deposit - amount}, synchronize_session=False
+    )
+    return updated == 1
+
+
+def _current_deposit(user):
+    """
+    Read the user deposit inside the running transaction
+
+    :param User user: Found user
+    """
+    if ledger_enabled():
+        return user_balance(user)
+    return db.session.query(User.deposit).filter(User.id == user.id).scalar()
+
+
+def _search_change(user, spending, limits):
+    """
+    Search the change of a purchase before any row is locked
+    Returns the deposit expected after the purchase and its change, None
+    when the deposit is too low or cannot be split
+
+    :param User user: Found user
+    :param int spending: Amount to debit
+    :param dict limits: Coins available by value, unlimited when None
+    """
+    expected = _current_deposit(user) - spending
+    if expected < 0:
+        return expected, None
+    return expected, make_change(expected, limits)
+
+
+def _final_change(user, expected, change, limits):
+    """
+    Change of the deposit left by the debit, in the running transaction
+    The change is only searched again when the deposit moved since it
+    was searched, while the rows are locked.
+
+    :param User user: Found user
+    :param int expected: Deposit the change was searched for
+    :param dict change: Change searched before the locks
+    :param dict limits: Coins available by value, unlimited when None
+    """
+    remaining = _current_deposit(user)
+    if remaining == expected:
+        return change
+    return make_change(remaining, limits)
+
+
+def _valid_quantity(quantity):
+    """
+    Check a quantity is a positive integer
+
+    :param quantity: Requested quantity
+    """
+    return isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
 
 
 def buy_product(payload=None, user=None):
@@ -9,49 +121,172 @@ def buy_product(payload=None, user=None):
     Buy product using payload data
     User has to have the role of a BUYER
 
+    Stock and deposit are updated with conditional statements in one
+    transaction, so concurrent buyers can neither oversell a product
+    nor overdraw a deposit. Nothing is bought when the remaining deposit
+    cannot be returned with the machine coins.
+
     :param dict payload: Request data payload
     :param User user: Found user
     """
     if payload is None or not isinstance(payload, dict):
         return False, False, False
 
+    quantity = payload.get("quantity")
+    if not _valid_quantity(quantity):
+        return False, False, False
+
     # retrieve the product
     product = Product.query.filter_by(id=payload["product_id"]).first()
 
     if product:
-        spending = product.cost * payload["quantity"]
+        spending = product.cost * quantity
+        limits = coin_limits()
+        expected, change = _search_change(user, spending, limits)
+
+        try:
+            # update the product amount and the user deposit
+            if not _decrement_stock(product, quantity) or not _debit_deposit(
+                user, spending
+            ):
+                db.session.rollback()
+                return False, False, False
+
+            change = _final_change(user, expected, change, limits)
+            if change is None:
+                db.session.rollback()
+                return False, False, False
+            bump_catalog_version()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
 
-        # check if the amount is enough
-        if product.amountAvailable < payload["quantity"]:
-            return False, False, False
+        catalog_cache.invalidate_product(payload["product_id"])
+        metrics.record_purchase("single", quantity, spending, change)
+        return change, spending, product
 
-        # check if the user has enough money
-        if user.deposit < spending:
-            return False, False, False
 
-        # update the product amount
-        if product.amountAvailable == payload["quantity"]:
-            product.amountAvailable = 0
-        else:
-            product.amountAvailable -= payload["quantity"]
+def _basket_lines(items):
+    """
+    Validate basket line items
+    Returns the lines, or None when the basket is malformed
 
-        # update the user deposit
-        user.deposit -= spending
-        change = user.deposit
-        change_list = []
+    :param list items: Line items with product_id and quantity
+    """
+    if not isinstance(items, list) or not items:
+        return None
+    if len(items) > current_app.config["BATCH_BUY_MAX_ITEMS"]:
+        return None
 
-        for i in [100, 50, 20, 10, 5]:
-            while change >=i:
-                change_list.append(i)
-                change -= i
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        product_id = item.get("product_id")
+        if not isinstance(product_id, int) or isinstance(product_id, bool):
+            return None
+        if not _valid_quantity(item.get("quantity")):
+            return None
+        lines.append({"product_id": product_id, "quantity": item["quantity"]})
+    return lines
 
-        try:
-            db.session.commit()
-        except Exception:
+
+def buy_products(items=None, user=None):
+    """
+    Buy a basket of products in one transaction
+    User has to have the role of a BUYER
+
+    Every product is decremented and the deposit debited with conditional
+    statements, either all lines are bought or nothing changes.
+    Returns (change, spending, lines) on success, change being
+    {coin: count}, and
+    (False, False, lines) when some line cannot be bought, failed lines
+    carry an "error". lines is None for a malformed basket.
+
+    :param list items: Line items with product_id and quantity
+    :param User user: Found user
+    """
+    lines = _basket_lines(items)
+    if lines is None or user is None:
+        return False, False, None
+
+    # the same product may appear on several lines
+    quantities = {}
+    for line in lines:
+        quantities[line["product_id"]] = (
+            quantities.get(line["product_id"], 0) + line["quantity"]
+        )
+
+    # rows are always locked in the same order to avoid deadlocks
+    products = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(quantities))
+        .order_by(Product.id)
+        .all()
+    }
+
+    limits = coin_limits()
+    expected, change = _search_change(
+        user,
+        sum(
+            products[product_id].cost * quantity
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        ),
+        limits,
+    )
+
+    try:
+        failed = {}
+        for product_id in sorted(quantities):
+            product = products.get(product_id)
+            if product is None:
+                failed[product_id] = "Product not found"
+            elif not _decrement_stock(product, quantities[product_id]):
+                failed[product_id] = _stock_error(product, quantities[product_id])
+
+        spending = 0
+        for line in lines:
+            if line["product_id"] in failed:
+                line["error"] = failed[line["product_id"]]
+            else:
+                line["spending"] = products[line["product_id"]].cost * line["quantity"]
+                spending += line["spending"]
+
+        if failed:
             db.session.rollback()
-            raise
+            return False, False, lines
+
+        if not _debit_deposit(user, spending):
+            db.session.rollback()
+            for line in lines:
+                line["error"] = "Not enough money"
+            return False, False, lines
+
+        # read the updated products before the commit expires them
+        rows = {
+            row.id: row
+            for row in product_rows(Product.query.filter(Product.id.in_(quantities)))
+        }
+        change = _final_change(user, expected, change, limits)
+        if change is None:
+            db.session.rollback()
+            for line in lines:
+                line["error"] = "No exact change available"
+            return False, False, lines
+        bump_catalog_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
-        return change_list, spending, product
+    for line in lines:
+        line["product"] = rows[line["product_id"]]
+    catalog_cache.invalidate_products(quantities)
+    metrics.record_purchase("batch", sum(quantities.values()), spending, change)
+
+    return change, spending, lines
 
 
 def deposit_amount(payload=None, user=None):
@@ -71,18 +306,26 @@ def deposit_amount(payload=None, user=None):
     if not isinstance(payload.get("amount"), int):
         return False
 
-    if payload.get("amount") not in [5, 10, 20, 50, 100]:
+    if payload.get("amount") not in coin_denominations():
         return False
 
     if user:
-        user.deposit += payload["amount"]
-
         try:
+            if ledger_enabled():
+                credit(user, payload["amount"])
+            else:
+                User.query.filter(User.id == user.id).update(
+                    {User.deposit: User.deposit + payload["amount"]},
+                    synchronize_session=False,
+                )
+            if inventory_enabled():
+                add_coin(payload["amount"])
             db.session.commit()
         except Exception:
             db.session.rollback()
             raise
 
+        metrics.record_deposit(payload["amount"])
         return True
     return False
 
@@ -92,12 +335,35 @@ def reset_deposit(user=None):
     Reset user deposit
     User has to have the role of a BUYER
 
+    With the coin inventory enabled the deposit is paid out from the
+    machine coins, nothing changes when it cannot be paid exactly. With
+    the deposit ledger enabled a RESET entry debits the whole balance.
+
     :param User user: Found user
     """
     if user:
-        user.deposit = 0
-
         try:
+            balance = None
+            if inventory_enabled() or ledger_enabled():
+                balance = _current_deposit(user)
+            if inventory_enabled():
+                change = make_change(balance, coin_limits())
+                if change is None or not take_coins(change):
+                    db.session.rollback()
+                    return False
+            if ledger_enabled():
+                # a concurrent movement leaves the deposit untouched
+                if balance and not debit(user, balance, LedgerKind.RESET, exact=True):
+                    db.session.rollback()
+                    return False
+            else:
+                query = User.query.filter(User.id == user.id)
+                if balance is not None:
+                    # the coins paid out must be the deposit zeroed
+                    query = query.filter(User.deposit == balance)
+                if query.update({User.deposit: 0}, synchronize_session=False) != 1:
+                    db.session.rollback()
+                    return False
             db.session.commit()
         except Exception:
             db.session.rollback()
@@ -0,0 +1,169 @@
+"""Change related functions - services"""
+
+from functools import reduce
+from math import gcd
+
+from flask import current_app
+
+from apps.api.models import CoinInventory
+from apps.extensions import db
+
+# Largest amount, in units of the smallest common coin, solved exactly
+MAX_CHANGE_UNITS = 100000
+
+
+def coin_denominations():
+    """Accepted coins, highest first"""
+    return tuple(sorted(current_app.config["COIN_DENOMINATIONS"], reverse=True))
+
+
+def greedy_change(amount, denominations, limits=None):
+    """
+    Split an amount taking as many of the highest coins as possible
+    Runs in O(denominations). Returns None when the greedy choice
+    leaves a remainder.
+
+    :param int amount: Amount to split
+    :param tuple denominations: Coins, highest first
+    :param dict limits: Coins available by value, unlimited when None
+    """
+    change = {}
+    for coin in denominations:
+        count = amount // coin
+        if limits is not None:
+            count = min(count, limits.get(coin, 0))
+        if count:
+            change[coin] = count
+            amount -= coin * count
+    return change if amount == 0 else None
+
+
+def bounded_change(amount, denominations, limits=None):
+    """
+    Split an amount into the fewest coins with at most limits[coin] of
+    each coin. Returns None when no exact split exists.
+
+    Bounded coin change: each coin count is split in powers of two and
+    solved as a 0/1 knapsack over the amount, in units of the greatest
+    common divisor of the coins.
+
+    :param int amount: Amount to split
+    :param tuple denominations: Coins, highest first
+    :param dict limits: Coins available by value, unlimited when None
+    """
+    if amount == 0:
+        return {}
+
+    unit = reduce(gcd, denominations)
+    if amount % unit or amount // unit > MAX_CHANGE_UNITS:
+        return None
+    target = amount // unit
+
+    # (coin, number of coins) items, a count of n is split in 1, 2, 4, ..., rest
+    items = []
+    for coin in denominations:
+        available = amount // coin
+        if limits is not None:
+            available = min(available, limits.get(coin, 0))
+        size = 1
+        while available > 0:
+            take = min(size, available)
+            items.append((coin, take))
+            available -= take
+            size *= 2
+
+    infinity = float("inf")
+    best = [0] + [infinity] * target
+    chosen = []
+    for coin, take in items:
+        weight = coin * take // unit
+        taken = bytearray(target + 1)
+        for value in range(target, weight - 1, -1):
+            candidate = best[value - weight] + take
+            if candidate < best[value]:
+                best[value] = candidate
+                taken[value] = 1
+        chosen.append(taken)
+
+    if best[target] == infinity:
+        return None
+
+    change = {}
+    value = target
+    for (coin, take), taken in zip(reversed(items), reversed(chosen)):
+        if taken[value]:
+            change[coin] = change.get(coin, 0) + take
+            value -= coin * take // unit
+    return change
+
+
+def make_change(amount, limits=None):
+    """
+    Split an amount into the configured coins as {coin: count}
+    The greedy split is used when it succeeds, the bounded search
+    otherwise. Returns None when no exact split exists.
+
+    :param int amount: Amount to split
+    :param dict limits: Coins available by value, unlimited when None
+    """
+    denominations = coin_denominations()
+    change = greedy_change(amount, denominations, limits)
+    if change is None:
+        change = bounded_change(amount, denominations, limits)
+    return change
+
+
+def change_as_list(change):
+    """
+    List form of the change, one entry per coin, highest first
+
+    :param dict change: Coin counts by value
+    """
+    return [coin for coin in sorted(change, reverse=True) for _ in range(change[coin])]
+
+
+def inventory_enabled():
+    """Check if the machine tracks its coins"""
+    return current_app.config.get("COIN_INVENTORY_ENABLED", False)
+
+
+def coin_limits():
+    """
+    Coins held by the machine, None when the inventory is not tracked
+    """
+    if not inventory_enabled():
+        return None
+    return dict(db.session.query(CoinInventory.coin, CoinInventory.count).all())
+
+
+def add_coin(coin):
+    """
+    Add a deposited coin to the inventory, in the running transaction
+
+    :param int coin: Coin value
+    """
+    updated = CoinInventory.query.filter(CoinInventory.coin == coin).update(
+        {CoinInventory.count: CoinInventory.count + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CoinInventory(coin=coin, count=1))
+        db.session.flush()
+
+
+def take_coins(change):
+    """
+    Remove paid out coins from the inventory, in the running transaction
+    Nothing is taken from a coin whose count is too low.
+
+    :param dict change: Coin counts by value
+    """
+    for coin, count in change.items():
+        updated = CoinInventory.query.filter(
+            CoinInventory.coin == coin, CoinInventory.count >= count
+        ).update(
+            {CoinInventory.count: CoinInventory.count - count},
+            synchronize_session=False,
+        )
+        if updated != 1:
+            return False
+    return True
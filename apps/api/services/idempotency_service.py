@@ -0,0 +1,203 @@
+"""Idempotency key related functions - services"""
+
+import hashlib
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from apps.api.models import IdempotencyRecord
+from apps.extensions import db, idempotency
+
+CLAIMED = "claimed"
+REPLAY = "replay"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+
+def scope_key(user, path, key):
+    """
+    Stored key of a client key, keys of two users or endpoints never clash
+
+    :param User user: Found user
+    :param str path: Request path
+    :param str key: Idempotency-Key header
+    """
+    return hashlib.sha256(f"{user.id}\n{path}\n{key}".encode()).hexdigest()
+
+
+def request_fingerprint(method, path, body):
+    """
+    Digest of a request, a key reused for another request is rejected
+
+    :param str method: Request method
+    :param str path: Request path and query string
+    :param bytes body: Request body
+    """
+    digest = hashlib.sha256(f"{method} {path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _cutoff(seconds):
+    """
+    Database time some seconds ago
+
+    :param float seconds: Seconds before now
+    """
+    now = db.session.execute(select(func.now())).scalar_one()
+    return now - timedelta(seconds=seconds)
+
+
+def _expiry_cutoff():
+    """Creation time before which a stored key is forgotten"""
+    return _cutoff(current_app.config["IDEMPOTENCY_TTL"])
+
+
+def _take_over(key):
+    """
+    Take over a claim left by a request that died before it committed
+    Claims older than IDEMPOTENCY_CLAIM_TIMEOUT are renewed in a single
+    conditional statement, concurrent takeovers cannot both win.
+
+    :param str key: Scoped idempotency key
+    """
+    timeout = current_app.config["IDEMPOTENCY_CLAIM_TIMEOUT"]
+    try:
+        taken = IdempotencyRecord.query.filter(
+            IdempotencyRecord.key == key,
+            IdempotencyRecord.status.is_(None),
+            IdempotencyRecord.applied.is_(False),
+            IdempotencyRecord.updated_at <= _cutoff(timeout),
+        ).update({IdempotencyRecord.updated_at: func.now()}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return taken == 1
+
+
+def claim_key(key, fingerprint):
+    """
+    Claim a key before processing its request
+    Returns (outcome, status, body): CLAIMED when the caller has to
+    process the request, REPLAY with the stored response, IN_PROGRESS
+    while another request holds the key and MISMATCH when the key was
+    used for another request. A claim older than IDEMPOTENCY_CLAIM_TIMEOUT
+    whose request never committed is claimed again.
+
+    :param str key: Scoped idempotency key
+    :param str fingerprint: Request fingerprint
+    """
+    cached = idempotency.get(key)
+    if cached is not None:
+        stored_fingerprint, status, body = cached
+        if stored_fingerprint != fingerprint:
+            return MISMATCH, None, None
+        return REPLAY, status, body
+
+    record = db.session.get(IdempotencyRecord, key)
+    try:
+        if record is not None and record.created_at <= _expiry_cutoff():
+            db.session.delete(record)
+            db.session.flush()
+            record = None
+        if record is None:
+            db.session.add(IdempotencyRecord(key=key, fingerprint=fingerprint))
+            db.session.commit()
+            return CLAIMED, None, None
+    except IntegrityError:
+        # claimed by a concurrent request
+        db.session.rollback()
+        record = db.session.get(IdempotencyRecord, key)
+        if record is None:
+            return IN_PROGRESS, None, None
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if record.fingerprint != fingerprint:
+        return MISMATCH, None, None
+    if record.status is None:
+        if _take_over(key):
+            return CLAIMED, None, None
+        return IN_PROGRESS, None, None
+
+    idempotency.set(key, (record.fingerprint, record.status, record.body))
+    return REPLAY, record.status, record.body
+
+
+def apply_key(key):
+    """
+    Mark a claimed key applied in the transaction of its request
+    Not committed here: the mark commits with the request changes, or is
+    rolled back with them. Returns False when the claim was lost.
+
+    :param str key: Scoped idempotency key
+    """
+    applied = IdempotencyRecord.query.filter(
+        IdempotencyRecord.key == key,
+        IdempotencyRecord.status.is_(None),
+        IdempotencyRecord.applied.is_(False),
+    ).update({IdempotencyRecord.applied: True}, synchronize_session=False)
+    if applied != 1:
+        db.session.rollback()
+        return False
+    return True
+
+
+def complete_key(key, fingerprint, status, body):
+    """
+    Store the response of a claimed key
+
+    :param str key: Scoped idempotency key
+    :param str fingerprint: Request fingerprint
+    :param int status: Response status code
+    :param bytes body: Response body
+    """
+    try:
+        IdempotencyRecord.query.filter(IdempotencyRecord.key == key).update(
+            {IdempotencyRecord.status: status, IdempotencyRecord.body: body},
+            synchronize_session=False,
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    idempotency.set(key, (fingerprint, status, body))
+
+
+def release_key(key):
+    """
+    Forget a claimed key whose request failed, so it can be retried
+
+    :param str key: Scoped idempotency key
+    """
+    try:
+        IdempotencyRecord.query.filter(IdempotencyRecord.key == key).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def purge_idempotency_keys():
+    """
+    Delete the expired keys
+
+    :return: Number of deleted keys
+    :rtype: int
+    """
+    try:
+        deleted = IdempotencyRecord.query.filter(
+            IdempotencyRecord.created_at <= _expiry_cutoff()
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return deleted
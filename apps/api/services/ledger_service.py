@@ -0,0 +1,148 @@
+"""Deposit ledger related functions - services"""
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam, func, literal, select
+
+from apps.api.models import LedgerEntry, LedgerKind, User
+from apps.extensions import db
+
+
+def ledger_enabled():
+    """Check if deposits are kept in the ledger"""
+    return current_app.config.get("DEPOSIT_LEDGER_ENABLED", False)
+
+
+def _balance():
+    """
+    Balance of the selected user row: the compacted deposit plus the
+    ledger entries written since
+    """
+    pending = (
+        select(func.coalesce(func.sum(LedgerEntry.amount), 0))
+        .where(LedgerEntry.userId == User.id, LedgerEntry.id > User.ledgerEntryId)
+        .scalar_subquery()
+    )
+    return User.deposit + pending
+
+
+def user_balance(user):
+    """
+    Read the user balance inside the running transaction
+
+    :param User user: Found user
+    """
+    return db.session.execute(select(_balance()).where(User.id == user.id)).scalar_one()
+
+
+def credit(user, amount, kind=LedgerKind.DEPOSIT):
+    """
+    Append a credit to the user ledger
+    Credits take no lock, they only ever add an entry
+
+    :param User user: Found user
+    :param int amount: Amount to credit
+    :param LedgerKind kind: Movement kind
+    """
+    db.session.execute(
+        LedgerEntry.__table__.insert().values(userId=user.id, amount=amount, kind=kind)
+    )
+
+
+def debit(user, amount, kind=LedgerKind.PURCHASE, exact=False):
+    """
+    Append a debit to the user ledger in a single conditional statement
+    Nothing is written when the balance is not enough, or with exact when
+    the balance is not the amount.
+
+    :param User user: Found user
+    :param int amount: Amount to debit
+    :param LedgerKind kind: Movement kind
+    :param bool exact: Debit only a balance equal to the amount
+    """
+    # debits of a user wait for each other so two cannot spend the same
+    # balance, credits and compactions do not take this lock
+    db.session.execute(select(User.id).where(User.id == user.id).with_for_update())
+    balance = _balance()
+    covered = balance == amount if exact else balance >= amount
+    table = LedgerEntry.__table__
+    result = db.session.execute(
+        table.insert().from_select(
+            ["userId", "amount", "kind"],
+            select(
+                User.id,
+                literal(-amount),
+                literal(kind, table.c.kind.type),
+            ).where(User.id == user.id, covered),
+        )
+    )
+    return result.rowcount == 1
+
+
+def compact_ledger(min_age=None):
+    """
+    Fold ledger entries into the user deposits
+    Entries are kept for auditing, only the user snapshot moves. Only the
+    entries up to the last one older than min_age are folded, every
+    transaction still running then holds entries above it and cannot
+    commit one below the new snapshot, so writers need no lock.
+
+    :param float min_age: Seconds an entry must be old to be compacted
+    :return: Number of users compacted
+    :rtype: int
+    """
+    if min_age is None:
+        min_age = current_app.config["DEPOSIT_LEDGER_COMPACT_AGE"]
+
+    cutoff = db.session.execute(select(func.now())).scalar_one() - timedelta(
+        seconds=min_age
+    )
+    last_id = db.session.execute(
+        select(func.max(LedgerEntry.id)).where(LedgerEntry.created_at <= cutoff)
+    ).scalar_one()
+    if last_id is None:
+        return 0
+
+    rows = db.session.execute(
+        select(
+            User.id,
+            User.ledgerEntryId,
+            func.sum(LedgerEntry.amount),
+            func.max(LedgerEntry.id),
+        )
+        .join(LedgerEntry, LedgerEntry.userId == User.id)
+        .where(LedgerEntry.id > User.ledgerEntryId, LedgerEntry.id <= last_id)
+        .group_by(User.id, User.ledgerEntryId)
+    ).all()
+    if not rows:
+        return 0
+
+    table = User.__table__
+    try:
+        # the previous snapshot guards against concurrent compactions
+        result = db.session.execute(
+            table.update()
+            .where(
+                table.c.id == bindparam("user_id"),
+                table.c.ledgerEntryId == bindparam("previous_id"),
+            )
+            .values(
+                deposit=table.c.deposit + bindparam("amount"),
+                ledgerEntryId=bindparam("entry_id"),
+            ),
+            [
+                {
+                    "user_id": user_id,
+                    "previous_id": previous_id,
+                    "amount": amount,
+                    "entry_id": entry_id,
+                }
+                for user_id, previous_id, amount, entry_id in rows
+            ],
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result.rowcount
@@ -1,13 +1,353 @@
 """Product related functions - services"""
-from apps.api.models import Product
-from apps.extensions import db
+import base64
+import binascii
+import json
+from dataclasses import dataclass, fields
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, null, or_
+from sqlalchemy.exc import IntegrityError
+
+from apps.api.models import CATALOG_VERSION_ID, CatalogVersion, Product
+from apps.extensions import catalog_cache, db
 
 from .user_service import check_user_role
 
 
-def list_products():
-    """List products"""
-    return Product.query.all()
+@dataclass(frozen=True)
+class ProductRow:
+    """Immutable product snapshot - safe to share through the catalog cache"""
+
+    id: int
+    amountAvailable: int
+    cost: int
+    productName: str
+    sellerId: int
+
+
+PRODUCT_COLUMNS = [getattr(Product, field.name) for field in fields(ProductRow)]
+
+ROW_FIELDS = tuple(field.name for field in fields(ProductRow))
+
+SORT_KEYS = {
+    "id": Product.id,
+    "cost": Product.cost,
+    "productName": Product.productName,
+    "amountAvailable": Product.amountAvailable,
+}
+
+
+def _filter_products(query, filters=None):
+    """
+    Apply listing filters to a product query
+
+    :param Query query: Product query
+    :param dict filters: sellerId, minCost, maxCost and inStock filters
+    """
+    filters = filters or {}
+
+    if filters.get("sellerId") is not None:
+        query = query.filter(Product.sellerId == filters["sellerId"])
+    if filters.get("minCost") is not None:
+        query = query.filter(Product.cost >= filters["minCost"])
+    if filters.get("maxCost") is not None:
+        query = query.filter(Product.cost <= filters["maxCost"])
+    if filters.get("inStock") is True:
+        query = query.filter(Product.amountAvailable > 0)
+    elif filters.get("inStock") is False:
+        query = query.filter(Product.amountAvailable <= 0)
+
+    return query
+
+
+def _filters_key(filters=None):
+    """
+    Hashable representation of listing filters
+
+    :param dict filters: sellerId, minCost, maxCost and inStock filters
+    """
+    return tuple(
+        sorted(
+            (key, value) for key, value in (filters or {}).items() if value is not None
+        )
+    )
+
+
+def _projection(columns=None):
+    """
+    Normalize the product fields to load, None when all of them are
+
+    :param columns: Names of the product fields
+    """
+    if columns is None or set(ROW_FIELDS) <= set(columns):
+        return None
+    return tuple(name for name in ROW_FIELDS if name in columns)
+
+
+def _product_entities(columns=None):
+    """
+    Columns selected for product snapshots, NULL for the fields not loaded
+
+    :param tuple columns: Names of the fields to load, all by default
+    """
+    if columns is None:
+        return PRODUCT_COLUMNS
+    return [column if column.key in columns else null() for column in PRODUCT_COLUMNS]
+
+
+def product_rows(query, columns=None):
+    """
+    Load product snapshots without building ORM objects
+    Fields that are not loaded are None
+
+    :param Query query: Product query
+    :param tuple columns: Names of the fields to load, all by default
+    """
+    entities = _product_entities(_projection(columns))
+    return [ProductRow(*row) for row in query.with_entities(*entities)]
+
+
+def encode_cursor(value, product_id):
+    """
+    Encode the position of the last product of a page
+
+    :param value: Sort key value of the last product
+    :param int product_id: Identifier of the last product
+    """
+    raw = json.dumps([value, product_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _valid_key(value, column):
+    """
+    Check a cursor value has the type of its column
+
+    :param value: Decoded value
+    :param Column column: Product column
+    """
+    python_type = column.type.python_type
+    return isinstance(value, python_type) and not isinstance(value, bool)
+
+
+def decode_cursor(cursor, sort_column=Product.id):
+    """
+    Decode a cursor created by encode_cursor
+    Returns None for a malformed cursor, or a sort key value that is not
+    of the type of the sort column
+
+    :param str cursor: Encoded cursor
+    :param Column sort_column: Column the page is sorted on
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, product_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+    if not _valid_key(product_id, Product.id) or not _valid_key(value, sort_column):
+        return None
+    return value, product_id
+
+
+def list_products(filters=None):
+    """
+    List products
+    Served from the catalog cache when possible
+
+    :param dict filters: sellerId, minCost, maxCost and inStock filters
+    """
+
+    def load():
+        return product_rows(_filter_products(Product.query, filters))
+
+    version = catalog_version()
+    if version is None:
+        return load()
+    return catalog_cache.get_or_load(
+        catalog_cache.listing_key("all", version, _filters_key(filters)), load
+    )
+
+
+def get_product(product_id):
+    """
+    Get a single product
+    Served from the catalog cache when possible
+
+    :param int product_id: Product identifier
+    """
+
+    def load():
+        rows = product_rows(Product.query.filter(Product.id == product_id))
+        return rows[0] if rows else None
+
+    return catalog_cache.get_or_load(catalog_cache.product_key(product_id), load)
+
+
+def catalog_version():
+    """
+    Version of the whole catalog
+    Bumped in the transaction of every product write, so every process
+    sees it change with the products.
+    Returns None while the version row is missing, the listings are then
+    neither cached nor tagged until the next write inserts it
+    """
+    return (
+        db.session.query(CatalogVersion.version)
+        .filter(CatalogVersion.id == CATALOG_VERSION_ID)
+        .scalar()
+    )
+
+
+def catalog_version_bump():
+    """Statement bumping the catalog version, run before a product write commits"""
+    table = CatalogVersion.__table__
+    return (
+        table.update()
+        .where(table.c.id == CATALOG_VERSION_ID)
+        .values(version=table.c.version + 1)
+    )
+
+
+def catalog_version_insert():
+    """Statement inserting the catalog version row when it is missing"""
+    return CatalogVersion.__table__.insert().values(id=CATALOG_VERSION_ID, version=1)
+
+
+def bump_catalog_version():
+    """
+    Bump the catalog version inside the running transaction
+    The row is inserted when missing, e.g. on a schema made by migrations
+    """
+    if db.session.execute(catalog_version_bump()).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(catalog_version_insert())
+    except IntegrityError:
+        # a concurrent writer inserted it first
+        db.session.execute(catalog_version_bump())
+
+
+def iter_products(filters=None, batch_size=None, columns=None):
+    """
+    Iterate over all products ordered by id
+    Rows are fetched in batches through a server side cursor
+
+    :param dict filters: sellerId, minCost, maxCost and inStock filters
+    :param int batch_size: Number of rows fetched per batch
+    :param tuple columns: Names of the fields to load, all by default
+    """
+    if batch_size is None:
+        batch_size = current_app.config["PRODUCT_STREAM_BATCH_SIZE"]
+
+    query = _filter_products(Product.query, filters).order_by(Product.id)
+    entities = _product_entities(_projection(columns))
+    for row in query.with_entities(*entities).yield_per(batch_size):
+        yield ProductRow(*row)
+
+
+def paginate_products(cursor=None, limit=None, sort=None, filters=None, columns=None):
+    """
+    List one page of products using keyset pagination
+    Products are ordered by the sort key and then by id, the cursor
+    points right after the last product of the previous page.
+    Pages are served from the catalog cache when possible.
+    Returns (None, None) for an invalid sort key or cursor
+
+    :param str cursor: Cursor of the previous page
+    :param int limit: Page size
+    :param str sort: Sort key, prefixed with "-" for descending order
+    :param dict filters: sellerId, minCost, maxCost and inStock filters
+    :param tuple columns: Names of the fields to load, all by default
+    """
+    sort = sort or "id"
+    descending = sort.startswith("-")
+    sort_column = SORT_KEYS.get(sort.lstrip("-"))
+    if sort_column is None:
+        return None, None
+
+    max_limit = current_app.config["PRODUCT_MAX_PAGE_SIZE"]
+    if limit is None:
+        limit = current_app.config["PRODUCT_PAGE_SIZE"]
+    limit = min(max(limit, 1), max_limit)
+
+    if columns is not None:
+        # the next cursor is made of the sort key and the id
+        columns = _projection({*columns, sort_column.key, "id"})
+
+    position = None
+    if cursor:
+        position = decode_cursor(cursor, sort_column)
+        if position is None:
+            return None, None
+
+    def load():
+        return _load_page(sort_column, descending, position, limit, filters, columns)
+
+    # keyed by the shared version, a write from any process moves every
+    # listing to new keys, so no stale page is served under a new ETag
+    version = catalog_version()
+    if version is None:
+        return load()
+    return catalog_cache.get_or_load(
+        catalog_cache.listing_key(
+            "page",
+            version,
+            sort,
+            limit,
+            position and tuple(position),
+            _filters_key(filters),
+            columns,
+        ),
+        load,
+    )
+
+
+def _load_page(sort_column, descending, position, limit, filters, columns=None):
+    """
+    Load one page of products from the database
+
+    :param Column sort_column: Column to sort by
+    :param bool descending: Sort in descending order
+    :param tuple position: Sort key value and id of the previous page last product
+    :param int limit: Page size
+    :param dict filters: sellerId, minCost, maxCost and inStock filters
+    :param tuple columns: Names of the fields to load, all by default
+    """
+    query = _filter_products(Product.query, filters)
+
+    if position:
+        value, last_id = position
+
+        if sort_column is Product.id:
+            after = Product.id < last_id if descending else Product.id > last_id
+        elif descending:
+            after = or_(
+                sort_column < value, and_(sort_column == value, Product.id < last_id)
+            )
+        else:
+            after = or_(
+                sort_column > value, and_(sort_column == value, Product.id > last_id)
+            )
+        query = query.filter(after)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Product.id.asc())
+
+    # one extra row tells if there is another page
+    products = product_rows(query.limit(limit + 1), columns)
+    has_more = len(products) > limit
+    products = products[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = products[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+
+    pagination = {"next_cursor": next_cursor, "page_size": limit, "has_more": has_more}
+    return products, pagination
 
 
 def create_product(payload=None, user=None):
@@ -32,11 +372,13 @@ def create_product(payload=None, user=None):
     db.session.add(product)
 
     try:
+        bump_catalog_version()
         db.session.commit()
     except Exception:
         db.session.rollback()
         raise
 
+    catalog_cache.invalidate_product(product.id)
     return product
 
 
@@ -69,6 +411,7 @@ def update_product(payload=None, user=None):
         product.cost = payload["cost"]
 
         db.session.add(product)
+        bump_catalog_version()
 
     try:
         db.session.commit()
@@ -76,6 +419,8 @@ def update_product(payload=None, user=None):
         db.session.rollback()
         raise
 
+    if product:
+        catalog_cache.invalidate_product(payload["product_id"])
     return product
 
 
@@ -96,10 +441,252 @@ def delete_product(payload=None, user=None):
     if product:
         db.session.delete(product)
         try:
+            bump_catalog_version()
             db.session.commit()
         except Exception:
             db.session.rollback()
             raise
 
+        catalog_cache.invalidate_product(payload["product_id"])
         return product
     return None
+
+
+PRODUCT_FIELDS = {"productName": str, "amountAvailable": int, "cost": int}
+
+
+def _product_fields_error(item, required=True):
+    """
+    Validate product fields of a bulk item
+    Returns an error message, or None when the fields are valid
+
+    :param dict item: Bulk item
+    :param bool required: Every field has to be present
+    """
+    for field, field_type in PRODUCT_FIELDS.items():
+        if field not in item:
+            if required:
+                return f"Missing {field}"
+            continue
+        value = item[field]
+        if not isinstance(value, field_type) or isinstance(value, bool):
+            return f"Invalid {field}"
+        if field_type is int and value < 0:
+            return f"Invalid {field}"
+        if field_type is str and not 0 < len(value) <= 255:
+            return f"Invalid {field}"
+    return None
+
+
+def _bulk_chunks(items):
+    """
+    Split bulk items into chunks of (index, item) pairs
+
+    :param items: Iterable of bulk items
+    """
+    chunk_size = current_app.config["BULK_CHUNK_SIZE"]
+    chunk = []
+    for index, item in enumerate(items):
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _owned_product_ids(product_ids, user):
+    """
+    Keep the product identifiers that belong to the user
+
+    :param list product_ids: Product identifiers
+    :param User user: Found user
+    """
+    product_ids = [product_id for product_id in product_ids if product_id is not None]
+    return {
+        product_id
+        for (product_id,) in db.session.query(Product.id).filter(
+            Product.id.in_(product_ids), Product.sellerId == user.id
+        )
+    }
+
+
+def _bulk_product_id(item):
+    """
+    Read the product identifier of a bulk item, None when invalid
+
+    :param item: Bulk item
+    """
+    if not isinstance(item, dict):
+        return None
+    product_id = item.get("product_id")
+    if not isinstance(product_id, int) or isinstance(product_id, bool):
+        return None
+    return product_id
+
+
+def _commit_chunk(product_ids):
+    """
+    Commit the statements of one chunk with a catalog version bump
+    The cache is invalidated right away, a later chunk may fail
+
+    :param product_ids: Identifiers of the changed products
+    """
+    try:
+        bump_catalog_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    catalog_cache.invalidate_products(product_ids)
+
+
+def bulk_create_products(items=None, user=None):
+    """
+    Create many products using bulk insert statements
+    User has to have the role of a SELLER
+
+    Items are validated one by one, valid items are inserted in chunks of
+    BULK_CHUNK_SIZE rows and every chunk is committed on its own.
+    Returns a report with the number of created products and per item
+    errors, or None when the user is not allowed.
+
+    :param items: Iterable of product payloads
+    :param User user: Found user
+    """
+    if items is None or check_user_role(user) != "SELLER":
+        return None
+
+    report = {"created": 0, "errors": []}
+    for chunk in _bulk_chunks(items):
+        rows = []
+        for index, item in chunk:
+            error = (
+                _product_fields_error(item)
+                if isinstance(item, dict)
+                else "Invalid item"
+            )
+            if error:
+                report["errors"].append({"index": index, "error": error})
+                continue
+            row = {field: item[field] for field in PRODUCT_FIELDS}
+            row["sellerId"] = user.id
+            rows.append(row)
+
+        if rows:
+            db.session.execute(Product.__table__.insert(), rows)
+            _commit_chunk([])
+            report["created"] += len(rows)
+
+    return report
+
+
+def bulk_update_products(items=None, user=None):
+    """
+    Update many products using bulk update statements
+    User has to have the role of a SELLER and own the products
+
+    Only the fields present in an item are changed. Items are processed
+    in chunks of BULK_CHUNK_SIZE and every chunk is committed on its own,
+    a product_id repeated in a chunk is reported as an error.
+    Returns a report with the number of updated products and per item
+    errors, or None when the user is not allowed.
+
+    :param items: Iterable of product payloads with product_id
+    :param User user: Found user
+    """
+    if items is None or check_user_role(user) != "SELLER":
+        return None
+
+    table = Product.__table__
+    report = {"updated": 0, "errors": []}
+    for chunk in _bulk_chunks(items):
+        owned = _owned_product_ids([_bulk_product_id(item) for _, item in chunk], user)
+
+        # rows changing the same columns share one executemany statement
+        statements = {}
+        product_ids = set()
+        for index, item in chunk:
+            product_id = _bulk_product_id(item)
+            if product_id is None:
+                error = "Invalid item"
+            elif product_id in product_ids:
+                error = "Duplicate product_id"
+            elif product_id not in owned:
+                error = "Product not found or you are not the owner of this product"
+            else:
+                error = _product_fields_error(item, required=False)
+            if not error and not PRODUCT_FIELDS.keys() & item.keys():
+                error = "Nothing to update"
+            if error:
+                report["errors"].append({"index": index, "error": error})
+                continue
+
+            columns = tuple(field for field in PRODUCT_FIELDS if field in item)
+            row = {f"b_{column}": item[column] for column in columns}
+            row["b_id"] = product_id
+            statements.setdefault(columns, []).append(row)
+            product_ids.add(product_id)
+
+        for columns, rows in statements.items():
+            statement = (
+                table.update()
+                .where(table.c.id == bindparam("b_id"))
+                .where(table.c.sellerId == user.id)
+                .values({column: bindparam(f"b_{column}") for column in columns})
+            )
+            db.session.execute(statement, rows)
+            report["updated"] += len(rows)
+        if statements:
+            _commit_chunk(product_ids)
+
+    return report
+
+
+def bulk_delete_products(items=None, user=None):
+    """
+    Delete many products using bulk delete statements
+    User has to have the role of a SELLER and own the products
+
+    Items are processed in chunks of BULK_CHUNK_SIZE and every chunk is
+    committed on its own. Returns a report with the number of deleted
+    products and per item errors, or None when the user is not allowed.
+
+    :param items: Iterable of payloads with product_id
+    :param User user: Found user
+    """
+    if items is None or check_user_role(user) != "SELLER":
+        return None
+
+    report = {"deleted": 0, "errors": []}
+    for chunk in _bulk_chunks(items):
+        owned = _owned_product_ids([_bulk_product_id(item) for _, item in chunk], user)
+
+        product_ids = set()
+        for index, item in chunk:
+            product_id = _bulk_product_id(item)
+            if product_id is None:
+                report["errors"].append({"index": index, "error": "Invalid item"})
+            elif product_id in product_ids:
+                report["errors"].append(
+                    {"index": index, "error": "Duplicate product_id"}
+                )
+            elif product_id not in owned:
+                report["errors"].append(
+                    {
+                        "index": index,
+                        "error": "Product not found or you are not the owner of "
+                        "this product",
+                    }
+                )
+            else:
+                product_ids.add(product_id)
+
+        if product_ids:
+            db.session.query(Product).filter(
+                Product.id.in_(product_ids), Product.sellerId == user.id
+            ).delete(synchronize_session=False)
+            _commit_chunk(product_ids)
+            report["deleted"] += len(product_ids)
+
+    return report
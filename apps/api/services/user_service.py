@@ -1,9 +1,10 @@
 """Product related functions - services"""
 
-from email_validator import validate_email
+from flask import g
+from flask_login import current_user
 
 from apps.api.models import User
-from apps.extensions import bcrypt, db
+from apps.extensions import db, hasher
 
 
 def check_user_role(user=None):
@@ -16,9 +17,59 @@ def check_user_role(user=None):
     if user is None:
         return None
 
-    user = User.query.filter_by(username=user.username).first()
+    # the role is loaded together with the user - no need to query again
+    role = user.role
+    return getattr(role, "value", role)
 
-    return user.role.value
+
+def resolve_identity(user_id):
+    """
+    Resolve the user stored in the session for the current request
+    The user is looked up once and kept on ``flask.g``
+
+    :param str user_id: User identifier from the session
+    """
+    identity = g.get("identity")
+    if identity is None or identity.id != int(user_id):
+        g.identity = User.query.get(int(user_id))
+    return g.identity
+
+
+def get_current_user():
+    """
+    Get the authenticated user of the current request
+    Reuses the identity resolved by the login manager - no extra query
+    """
+    if not current_user.is_authenticated:
+        return None
+    g.identity = current_user._get_current_object()
+    return g.identity
+
+
+def authenticate_user(username, password):
+    """
+    Find a user by credentials
+    Passwords stored with another bcrypt cost than the configured one
+    are rehashed on the way.
+
+    :param str username: User username
+    :param str password: Plain text password
+    :raises HasherSaturated: Every hashing slot is taken
+    """
+    user = User.query.filter_by(username=username).first()
+
+    if user is None or not hasher.check_password_hash(user.password, password):
+        return None
+
+    if hasher.needs_rehash(user.password):
+        user.password = hasher.generate_password_hash(password)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    return user
 
 
 def register_user(payload):
@@ -26,10 +77,14 @@ def register_user(payload):
     Register user using payload data
 
     :param dict payload: Request data payload
+    :raises HasherSaturated: Every hashing slot is taken
     """
     if payload is None or not isinstance(payload, dict):
         return False
 
+    # only registrations pay for the import
+    from email_validator import validate_email
+
     try:
         validate_email(payload["username"])
     except Exception:
@@ -40,7 +95,7 @@ def register_user(payload):
     if user:
         return False
 
-    hashed_password = bcrypt.generate_password_hash(payload["password"])
+    hashed_password = hasher.generate_password_hash(payload["password"])
     payload["password"] = hashed_password
     new_user = User(**payload)
 
@@ -1,3 +1,8 @@
 """Utilities related imports"""
 
-from .responses import response_with
+from .encoding import json_response
+from .idempotency import idempotent
+from .payloads import read_fields, read_items
+from .responses import (etag_matches, make_etag, response_with,
+                        stream_response_with)
+from .serializers import compile_model, model_serializer
@@ -0,0 +1,126 @@
+"""
+JSON encoding of the responses
+
+orjson, when installed, encodes the response bodies. Its output is only
+used when it is byte for byte the one of jsonify, the other bodies are
+encoded by the standard library as before. JSON_BACKEND=stdlib turns
+orjson off.
+"""
+
+import json
+import math
+import re
+
+from flask import current_app, jsonify
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+AUTO = "auto"
+STDLIB = "stdlib"
+
+# numbers with a fraction or an exponent, orjson writes some floats as
+# 1e16 or 0.00001 where the standard library writes 1e+16 and 1e-05
+FLOAT = re.compile(rb"[0-9][.eE]")
+
+
+def _non_finite(value):
+    """
+    Check a value holds a NaN or infinite float, orjson writes them as null
+
+    :param value: Value to encode
+    :rtype: bool
+    """
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_non_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_non_finite(item) for item in value)
+    return False
+
+
+def _unsupported(value):
+    """Leave the values jsonify encodes on its own to the standard library"""
+    raise TypeError(f"{type(value).__name__} is encoded by the standard library")
+
+
+def orjson_enabled(backend):
+    """
+    Check a JSON_BACKEND setting selects orjson
+
+    :param str backend: auto, orjson when installed, or stdlib
+    :rtype: bool
+    """
+    return orjson is not None and backend != STDLIB
+
+
+def fast_dumps(value, sort_keys=True, ensure_ascii=True):
+    """
+    Encode a value with orjson, as json.dumps with compact separators
+    followed by a new line
+
+    :param value: Value to encode
+    :param bool sort_keys: Sort the object keys
+    :param bool ensure_ascii: Escape the non ASCII characters
+    :return: Encoded value, None when orjson would not give the same bytes
+    :rtype: bytes
+    """
+    option = (
+        orjson.OPT_APPEND_NEWLINE
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    try:
+        body = orjson.dumps(value, default=_unsupported, option=option)
+    except TypeError:
+        return None
+    if (ensure_ascii and not body.isascii()) or FLOAT.search(body):
+        return None
+    # the standard library writes NaN and Infinity where orjson writes null
+    if b"null" in body and _non_finite(value):
+        return None
+    return body
+
+
+def dumps(value, backend=AUTO):
+    """
+    Compact JSON encoding with sorted keys and a final new line, the body
+    jsonify makes outside debug mode
+
+    :param value: Value to encode
+    :param str backend: auto, orjson when installed, or stdlib
+    :rtype: bytes
+    """
+    if orjson_enabled(backend):
+        body = fast_dumps(value)
+        if body is not None:
+            return body
+    return (json.dumps(value, separators=(",", ":"), sort_keys=True) + "\n").encode()
+
+
+def json_response(value):
+    """
+    Same response as jsonify, encoded by orjson when it can
+
+    :param value: Value to encode
+    :rtype: Response
+    """
+    app = current_app
+    if (
+        orjson_enabled(app.config["JSON_BACKEND"])
+        and app.json_encoder is JSONEncoder
+        and not (app.config["JSONIFY_PRETTYPRINT_REGULAR"] or app.debug)
+    ):
+        body = fast_dumps(
+            value, app.config["JSON_SORT_KEYS"], app.config["JSON_AS_ASCII"]
+        )
+        if body is not None:
+            return app.response_class(body, mimetype=app.config["JSONIFY_MIMETYPE"])
+    return jsonify(value)
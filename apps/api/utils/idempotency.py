@@ -0,0 +1,83 @@
+"""Idempotent endpoints"""
+
+from functools import wraps
+
+from flask import Response, current_app, make_response, request
+
+from apps.api.services import get_current_user
+from apps.api.services import idempotency_service as keys
+from apps.extensions import idempotency
+
+from . import responses as resp
+from .responses import response_with
+
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(view):
+    """
+    Replay the stored response of a request sent again with the same
+    Idempotency-Key header, the view is not called again.
+    Responses with a 5xx status are not stored so the request can be
+    retried. The key is marked applied in the transaction of the view,
+    so a claim left by a dead process is only taken over when nothing
+    was committed. Must be applied below login_required.
+
+    :param callable view: Endpoint method
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if key is None or not current_app.config["IDEMPOTENCY_ENABLED"]:
+            return view(*args, **kwargs)
+
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return response_with(
+                resp.BAD_REQUEST_400,
+                value={"response": f"Invalid {idempotency.HEADER} header"},
+            )
+
+        scoped = keys.scope_key(get_current_user(), request.path, key)
+        fingerprint = keys.request_fingerprint(
+            request.method, request.full_path, request.get_data()
+        )
+        outcome, status, body = keys.claim_key(scoped, fingerprint)
+
+        if outcome == keys.REPLAY:
+            return Response(
+                body,
+                status=status,
+                mimetype="application/json",
+                headers={
+                    "Access-Control-Allow-Origin": "*",
+                    "server": "FlaskRestAPI",
+                    "Idempotent-Replayed": "true",
+                },
+            )
+        if outcome == keys.MISMATCH:
+            return response_with(
+                resp.INVALID_INPUT_422,
+                value={"response": "Key already used for another request"},
+            )
+        if outcome == keys.IN_PROGRESS or not keys.apply_key(scoped):
+            return response_with(
+                resp.CONFLICT_409,
+                value={"response": "A request with this key is in progress"},
+            )
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            keys.release_key(scoped)
+            raise
+
+        if response.status_code >= 500:
+            keys.release_key(scoped)
+        else:
+            keys.complete_key(
+                scoped, fingerprint, response.status_code, response.get_data()
+            )
+        return response
+
+    return wrapper
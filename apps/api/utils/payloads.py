@@ -0,0 +1,60 @@
+"""Request payload helpers"""
+
+import json
+
+from flask import request
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson")
+
+
+def read_items():
+    """
+    Read a list of items from the request body.
+    Accepts a JSON array, or newline delimited JSON which is decoded line by
+    line while the body is read. Lines that are not valid JSON are returned
+    as None so they can be reported per item.
+
+    :return: Iterable of items, None when the body is not a list of items
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _ndjson_items(request.stream)
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, list):
+        return None
+    return payload
+
+
+def _ndjson_items(stream):
+    """
+    Decode newline delimited JSON
+
+    :param stream: Request body stream
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def read_fields(model):
+    """
+    Read the fields query parameter, a comma separated list of model keys.
+    Every key of the model is returned when the parameter is absent.
+
+    :param Model model: Model of the response
+    :return: Requested keys in model order, None when one is unknown
+    :rtype: tuple
+    """
+    value = request.args.get("fields")
+    if value is None:
+        return tuple(model)
+
+    requested = {name.strip() for name in value.split(",")} - {""}
+    if not requested or not requested <= model.keys():
+        return None
+    return tuple(key for key in model if key in requested)
@@ -1,6 +1,11 @@
 """Responses definitions"""
 
-from flask import jsonify, make_response
+import hashlib
+
+from flask import (Response, current_app, json, make_response, request,
+                   stream_with_context)
+
+from .encoding import json_response
 
 CONFLICT_409 = {
     "http_code": 409,
@@ -32,6 +37,12 @@ SERVER_ERROR_500 = {"http_code": 500, "code": "serverError", "message": "Server
 
 SERVER_ERROR_404 = {"http_code": 404, "code": "notFound", "message": "Not found"}
 
+SERVICE_UNAVAILABLE_503 = {
+    "http_code": 503,
+    "code": "serviceUnavailable",
+    "message": "Service temporarily unavailable",
+}
+
 UNAUTHORIZED_403 = {
     "http_code": 403,
     "code": "notAuthorized",
@@ -44,8 +55,33 @@ SUCCESS_201 = {"http_code": 201, "code": "success"}
 
 SUCCESS_204 = {"http_code": 204, "code": "success"}
 
+NOT_MODIFIED_304 = {"http_code": 304, "code": "notModified"}
+
 
-def response_with(response, value=None, error=None, headers=None, pagination=None):
+def make_etag(*parts):
+    """
+    Build an entity tag from the values identifying a representation
+
+    :param parts: Values identifying the representation
+    :return: Entity tag, without quotes
+    :rtype: str
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def etag_matches(etag):
+    """
+    Check the If-None-Match request header against an entity tag
+
+    :param str etag: Entity tag of the current representation
+    :rtype: bool
+    """
+    return request.if_none_match.contains_weak(etag)
+
+
+def response_with(
+    response, value=None, error=None, headers=None, pagination=None, etag=None
+):
     """
     Make response from Flask library to create standard responses for APIs.
 
@@ -54,12 +90,22 @@ def response_with(response, value=None, error=None, headers=None, pagination=Non
     :param error: Error to return in response body
     :param headers: Response headers. Added mainly to avoid CORS issues.
     :param pagination: Response pagination in case of filters.
+    :param etag: Entity tag of the returned representation.
     :return: Standard json response for APIs
     :rtype: json
     """
     if headers is None:
         headers = {}
 
+    if etag is not None:
+        # clients have to revalidate, a matching tag gets a 304
+        headers.update({"ETag": f'"{etag}"', "Cache-Control": "no-cache"})
+
+    if response["http_code"] == 304:
+        headers.update({"Access-Control-Allow-Origin": "*"})
+        headers.update({"server": "FlaskRestAPI"})
+        return make_response("", 304, headers)
+
     result = {}
 
     if value is not None:
@@ -79,4 +125,55 @@ def response_with(response, value=None, error=None, headers=None, pagination=Non
     headers.update({"Access-Control-Allow-Origin": "*"})
     headers.update({"server": "FlaskRestAPI"})
 
-    return make_response(jsonify(result), response["http_code"], headers)
+    return make_response(json_response(result), response["http_code"], headers)
+
+
+def stream_response_with(response, items, headers=None, chunk_size=None):
+    """
+    Make a streamed response with the same body as response_with.
+    Items are encoded and sent in chunks while they are produced, so the
+    whole list is never held in memory.
+
+    :param dict response: Represent by one of above response types
+    :param items: Iterable of serializable values sent as "response"
+    :param headers: Response headers. Added mainly to avoid CORS issues.
+    :param int chunk_size: Number of items encoded per chunk
+    :return: Streamed json response for APIs
+    :rtype: Response
+    """
+    if headers is None:
+        headers = {}
+
+    if chunk_size is None:
+        chunk_size = current_app.config["PRODUCT_STREAM_BATCH_SIZE"]
+
+    envelope = {"code": response["code"]}
+    if response.get("message", None) is not None:
+        envelope.update({"message": response["message"]})
+
+    # "response" sorts after "code" and "message", as jsonify orders keys
+    head = json.dumps(envelope, separators=(",", ":"))[:-1] + ',"response":['
+
+    def generate():
+        yield head
+        chunk = []
+        separator = ""
+        for item in items:
+            chunk.append(json.dumps(item, separators=(",", ":")))
+            if len(chunk) >= chunk_size:
+                yield separator + ",".join(chunk)
+                separator = ","
+                chunk = []
+        if chunk:
+            yield separator + ",".join(chunk)
+        yield "]}\n"
+
+    headers.update({"Access-Control-Allow-Origin": "*"})
+    headers.update({"server": "FlaskRestAPI"})
+
+    return Response(
+        stream_with_context(generate()),
+        status=response["http_code"],
+        headers=headers,
+        mimetype="application/json",
+    )
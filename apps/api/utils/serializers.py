@@ -0,0 +1,134 @@
+"""
+Compiled marshalling
+
+A flask-restx model is turned once into a Python function reading each
+field straight off the object, instead of api.marshal walking the field
+dict for every object of every request. The output is the one of
+api.marshal, anything the generated code does not cover goes through it.
+"""
+
+import re
+
+from flask_restx import fields, marshal
+
+# field classes the generated code formats itself, with their format call
+FORMATS = {
+    fields.Raw: "{}",
+    fields.String: "str({})",
+    fields.Integer: "int({})",
+    fields.Float: "float({})",
+    fields.Boolean: "bool({})",
+}
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# compiled functions by model name and selected keys
+_compiled = {}
+
+
+def _indexable(obj):
+    """Objects flask-restx reads by key rather than by attribute"""
+    return not hasattr(obj, "strip") and hasattr(obj, "__iter__")
+
+
+def _field_source(index, key, field):
+    """
+    Statements computing one field into the variable f<index>
+
+    :param int index: Field position
+    :param str key: Output key
+    :param Raw field: flask-restx field
+    :return: Source lines, None when the field needs flask-restx
+    :rtype: list
+    """
+    attribute = key if field.attribute is None else field.attribute
+    if (
+        type(field) not in FORMATS
+        or field.default is not None
+        or field.mask is not None
+        or not isinstance(attribute, str)
+        or not IDENTIFIER.match(attribute)
+    ):
+        return None
+    value = f"getattr(obj, {attribute!r}, None)"
+    return [
+        f"    f{index} = {value}",
+        f"    if f{index} is not None:",
+        f"        f{index} = {FORMATS[type(field)].format(f'f{index}')}",
+    ]
+
+
+def compile_model(model, only=None):
+    """
+    Compile a model into a marshalling function
+    The function takes an object or a list of objects, as api.marshal.
+
+    :param Model model: flask-restx model
+    :param tuple only: Keys to output, all the model keys by default
+    :return: Marshalling function
+    :rtype: callable
+    """
+    selected = model
+    if only is not None:
+        selected = {key: field for key, field in model.items() if key in only}
+
+    def fallback(data):
+        return marshal(data, selected)
+
+    fields_by_key = {
+        key: field() if isinstance(field, type) else field
+        for key, field in selected.items()
+    }
+    if not fields_by_key or getattr(model, "__mask__", None):
+        return fallback
+
+    lines = []
+    for index, (key, field) in enumerate(fields_by_key.items()):
+        source = (
+            _field_source(index, key, field) if isinstance(field, fields.Raw) else None
+        )
+        if source is None:
+            return fallback
+        lines += source
+
+    body = ", ".join(f"{key!r}: f{index}" for index, key in enumerate(fields_by_key))
+    name = re.sub(r"\W", "_", f"marshal_{model.name}")
+    source = "\n".join(
+        [
+            "def one(obj):",
+            "    if _indexable(obj):",
+            "        return _fallback(obj)",
+            "    try:",
+            *[f"    {line}" for line in lines],
+            "    except (TypeError, ValueError):",
+            "        return _fallback(obj)",
+            f"    return {{{body}}}",
+            "",
+            f"def {name}(data):",
+            "    if isinstance(data, (list, tuple)):",
+            "        return [one(obj) for obj in data]",
+            "    return one(data)",
+        ]
+    )
+    namespace = {"_fallback": fallback, "_indexable": _indexable}
+    exec(compile(source, f"<{name}>", "exec"), namespace)  # pylint: disable=exec-used
+    function = namespace[name]
+    function.source = source
+    return function
+
+
+def model_serializer(model, only=None):
+    """
+    Compiled marshalling function of a model, compiled once per selection
+
+    :param Model model: flask-restx model
+    :param tuple only: Keys to output, all the model keys by default
+    :rtype: callable
+    """
+    if only is not None and set(only) >= model.keys():
+        only = None
+    key = (model.name, only and tuple(only))
+    function = _compiled.get(key)
+    if function is None:
+        function = _compiled[key] = compile_model(model, only)
+    return function
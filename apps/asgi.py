@@ -0,0 +1,487 @@
+"""
+ASGI serving mode
+
+The hot product and action endpoints are served by coroutines on an async
+database driver, so a waiting query does not hold a thread. Every other
+request goes to the Flask application through asgiref's WSGI adapter.
+
+Optional dependencies, not needed by the WSGI server:
+- asgiref, for the WSGI fallback;
+- aiomysql for MySQL, aiosqlite for SQLite;
+- an ASGI server such as uvicorn.
+
+Requests the coroutines do not cover fall back to Flask: the ones using
+the deposit ledger, the coin inventory, an Idempotency-Key header or the
+fields query parameter, and sessions that only hold a remember cookie.
+Coroutine requests skip the Flask request hooks, they are not in the HTTP
+metrics nor the query profiler.
+"""
+
+import asyncio
+import json
+import re
+from dataclasses import asdict
+from urllib.parse import parse_qs
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+from werkzeug.http import parse_cookie, parse_etags
+
+from apps.api.models import Product, User
+from apps.api.services.change_service import (bounded_change, change_as_list,
+                                              greedy_change)
+from apps.api.services.product_service import (PRODUCT_COLUMNS, ProductRow,
+                                               catalog_version_bump,
+                                               catalog_version_insert)
+from apps.api.utils import make_etag
+from apps.api.utils import responses as resp
+from apps.api.utils.encoding import AUTO, dumps
+from apps.extensions import catalog_cache, idempotency, metrics
+
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+PRODUCT_ROUTE = re.compile(r"^/api/product/(\d+)$")
+
+NOT_AUTHORIZED = "You are not authorized to perform this action"
+
+
+def async_database_uri(uri):
+    """
+    Database URI for the async driver of the same database
+
+    :param str uri: Synchronous database URI
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(
+        hide_password=False
+    )
+
+
+def create_async_db_engine(app):
+    """
+    Async engine on the application database
+    ASYNC_DATABASE_URI overrides the URI derived from
+    SQLALCHEMY_DATABASE_URI, MySQL pools use the DB_POOL_* settings.
+
+    :param Flask app: Flask application
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    uri = app.config.get("ASYNC_DATABASE_URI") or async_database_uri(
+        app.config["SQLALCHEMY_DATABASE_URI"]
+    )
+    url = make_url(uri)
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        if not url.database or url.database == ":memory:":
+            options = {"poolclass": StaticPool}
+    else:
+        options = {
+            "pool_size": app.config["DB_POOL_SIZE"],
+            "max_overflow": app.config["DB_MAX_OVERFLOW"],
+            "pool_timeout": app.config["DB_POOL_TIMEOUT"],
+            "pool_recycle": app.config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": app.config["DB_POOL_PRE_PING"],
+        }
+    return create_async_engine(url, **options)
+
+
+def json_body(response, value=None, backend=AUTO):
+    """
+    Body of response_with for a response type
+
+    :param dict response: Represent by one of the response types
+    :param dict value: Value to return as response
+    :param str backend: JSON_BACKEND setting
+    """
+    result = dict(value or {})
+    if response.get("message", None) is not None:
+        result["message"] = response["message"]
+    result["code"] = response["code"]
+    # same bytes as jsonify outside debug mode
+    return dumps(result, backend)
+
+
+class Refused(Exception):
+    """Rolls back an action that cannot be done"""
+
+
+class AsgiApp:
+    """
+    ASGI application serving the hot endpoints with coroutines
+
+    :param Flask app: Flask application, with its blueprint registered
+    """
+
+    def __init__(self, app):
+        try:
+            from asgiref.wsgi import WsgiToAsgi
+        except ImportError as exc:
+            raise RuntimeError(
+                "The ASGI serving mode needs asgiref, pip install asgiref"
+            ) from exc
+
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.engine = create_async_db_engine(app)
+        self.serializer = app.session_interface.get_signing_serializer(app)
+        self.routes = {
+            ("POST", "/api/action/buy"): self.buy,
+            ("POST", "/api/action/deposit"): self.deposit,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] == "http":
+            handler, args = self.route(scope)
+            if handler is not None:
+                await handler(scope, receive, send, *args)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """
+        Dispose the engine when the server stops
+
+        :param callable receive: ASGI receive
+        :param callable send: ASGI send
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def route(self, scope):
+        """
+        Coroutine serving a request and its arguments, None for Flask
+
+        :param dict scope: ASGI connection scope
+        """
+        config = self.app.config
+        if config.get("DEPOSIT_LEDGER_ENABLED") or config.get("COIN_INVENTORY_ENABLED"):
+            return None, ()
+
+        headers = dict(scope["headers"])
+        if config.get("IDEMPOTENCY_ENABLED") and (
+            idempotency.HEADER.lower().encode() in headers
+        ):
+            return None, ()
+        if "fields" in parse_qs(scope.get("query_string", b"").decode("latin-1")):
+            return None, ()
+
+        user_id = self.session_user_id(headers.get(b"cookie", b"").decode("latin-1"))
+        if user_id is None:
+            return None, ()
+
+        method, path = scope["method"], scope["path"]
+        handler = self.routes.get((method, path))
+        if handler is not None:
+            return handler, (user_id,)
+
+        match = PRODUCT_ROUTE.match(path)
+        if method == "GET" and match:
+            return self.get_product, (user_id, int(match.group(1)))
+        return None, ()
+
+    def session_user_id(self, cookie):
+        """
+        Logged in user of a Flask session cookie, None when anonymous
+
+        :param str cookie: Cookie request header
+        """
+        value = parse_cookie(cookie).get(self.app.session_cookie_name)
+        if not value or self.serializer is None:
+            return None
+        try:
+            session = self.serializer.loads(
+                value,
+                max_age=int(self.app.permanent_session_lifetime.total_seconds()),
+            )
+        except Exception:  # pylint: disable=broad-except
+            return None
+        user_id = session.get("_user_id")
+        return int(user_id) if user_id is not None else None
+
+    async def respond(self, send, response, value=None, headers=None):
+        """
+        Send a response_with response
+
+        :param callable send: ASGI send
+        :param dict response: Represent by one of the response types
+        :param dict value: Value to return as response
+        :param dict headers: Extra response headers
+        """
+        body = (
+            b""
+            if response["http_code"] == 304
+            else json_body(response, value, self.app.config["JSON_BACKEND"])
+        )
+        headers = dict(headers or {})
+        headers.update({"Access-Control-Allow-Origin": "*", "server": "FlaskRestAPI"})
+        raw_headers = [(b"content-length", str(len(body)).encode())]
+        if body:
+            raw_headers.append((b"content-type", b"application/json"))
+        raw_headers += [
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response["http_code"],
+                "headers": raw_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def read_json(receive):
+        """
+        Request JSON payload, None when malformed
+
+        :param callable receive: ASGI receive
+        """
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def load_user(self, conn, user_id):
+        """
+        Role and deposit of a user, None when unknown
+
+        :param AsyncConnection conn: Database connection
+        :param int user_id: User identifier
+        """
+        result = await conn.execute(
+            select(User.role, User.deposit).where(User.id == user_id)
+        )
+        return result.first()
+
+    async def get_product(self, scope, receive, send, user_id, product_id):
+        """GET /api/product/<product_id>"""
+        async with self.engine.connect() as conn:
+            if await self.load_user(conn, user_id) is None:
+                await self.respond(send, resp.UNAUTHORIZED_403)
+                return
+
+            key = catalog_cache.product_key(product_id)
+            product = catalog_cache.backend.get(key)
+            if product is None:
+                result = await conn.execute(
+                    select(*PRODUCT_COLUMNS).where(Product.id == product_id)
+                )
+                row = result.first()
+                if row is not None:
+                    product = ProductRow(*row)
+                    catalog_cache.backend.set(key, product)
+
+        if product is None:
+            await self.respond(
+                send, resp.SERVER_ERROR_404, {"response": "Product not found"}
+            )
+            return
+
+        etag = make_etag(product)
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        if if_none_match and parse_etags(if_none_match.decode()).contains_weak(etag):
+            await self.respond(send, resp.NOT_MODIFIED_304, headers=headers)
+            return
+        await self.respond(
+            send, resp.SUCCESS_200, {"response": asdict(product)}, headers
+        )
+
+    async def buy(self, scope, receive, send, user_id):
+        """POST /api/action/buy"""
+        payload = await self.read_json(receive)
+        quantity = payload.get("quantity") if isinstance(payload, dict) else None
+        product_id = payload.get("product_id") if isinstance(payload, dict) else None
+        valid = (
+            isinstance(quantity, int)
+            and not isinstance(quantity, bool)
+            and quantity > 0
+            and isinstance(product_id, int)
+        )
+
+        try:
+            async with self.engine.begin() as conn:
+                user = await self.load_user(conn, user_id)
+                if user is None or user.role.value != "BUYER":
+                    await self.respond(
+                        send, resp.UNAUTHORIZED_403, {"response": NOT_AUTHORIZED}
+                    )
+                    return
+                if not valid:
+                    raise Refused()
+                report = await self.buy_product(conn, user_id, product_id, quantity)
+        except Refused:
+            await self.respond(
+                send,
+                resp.BAD_REQUEST_400,
+                {"response": "Product not found or not enough money"},
+            )
+            return
+
+        catalog_cache.invalidate_product(product_id)
+        metrics.record_purchase(
+            "single", quantity, report["spending"], report["change"]
+        )
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if query.get("change_format") == ["list"]:
+            report["change"] = change_as_list(report["change"])
+        await self.respond(send, resp.SUCCESS_200, {"response": report})
+
+    async def search_change(self, amount):
+        """
+        Split an amount into the configured coins
+        The bounded search runs on the default executor, it would block the
+        event loop.
+
+        :param int amount: Amount to split
+        """
+        denominations = tuple(
+            sorted(self.app.config["COIN_DENOMINATIONS"], reverse=True)
+        )
+        change = greedy_change(amount, denominations)
+        if change is None:
+            change = await asyncio.get_running_loop().run_in_executor(
+                None, bounded_change, amount, denominations
+            )
+        return change
+
+    async def buy_product(self, conn, user_id, product_id, quantity):
+        """
+        Same statements as the buy_product service, raises Refused when
+        nothing can be bought
+
+        :param AsyncConnection conn: Connection in a transaction
+        :param int user_id: Buyer identifier
+        :param int product_id: Product identifier
+        :param int quantity: Amount of items to take
+        """
+        result = await conn.execute(
+            select(Product.cost).where(Product.id == product_id)
+        )
+        cost = result.scalar()
+        if cost is None:
+            raise Refused()
+        spending = cost * quantity
+
+        # the change is searched before any row is locked
+        result = await conn.execute(select(User.deposit).where(User.id == user_id))
+        expected = result.scalar() - spending
+        if expected < 0:
+            raise Refused()
+        change = await self.search_change(expected)
+
+        products = Product.__table__
+        result = await conn.execute(
+            products.update()
+            .where(
+                products.c.id == product_id,
+                products.c.cost == cost,
+                products.c.amountAvailable >= quantity,
+            )
+            .values(amountAvailable=products.c.amountAvailable - quantity)
+        )
+        if result.rowcount != 1:
+            raise Refused()
+
+        users = User.__table__
+        result = await conn.execute(
+            users.update()
+            .where(users.c.id == user_id, users.c.deposit >= spending)
+            .values(deposit=users.c.deposit - spending)
+        )
+        if result.rowcount != 1:
+            raise Refused()
+
+        result = await conn.execute(select(User.deposit).where(User.id == user_id))
+        remaining = result.scalar()
+        if remaining != expected:
+            change = await self.search_change(remaining)
+        if change is None:
+            raise Refused()
+        await self.bump_catalog_version(conn)
+
+        result = await conn.execute(
+            select(*PRODUCT_COLUMNS).where(Product.id == product_id)
+        )
+        product = ProductRow(*result.first())
+        return {"change": change, "spending": spending, "product": asdict(product)}
+
+    async def bump_catalog_version(self, conn):
+        """
+        Bump the catalog version, inserting the row when it is missing
+
+        :param AsyncConnection conn: Connection in a transaction
+        """
+        result = await conn.execute(catalog_version_bump())
+        if result.rowcount:
+            return
+        try:
+            async with conn.begin_nested():
+                await conn.execute(catalog_version_insert())
+        except IntegrityError:
+            # a concurrent writer inserted it first
+            await conn.execute(catalog_version_bump())
+
+    async def deposit(self, scope, receive, send, user_id):
+        """POST /api/action/deposit"""
+        payload = await self.read_json(receive)
+        amount = payload.get("amount") if isinstance(payload, dict) else None
+
+        async with self.engine.begin() as conn:
+            user = await self.load_user(conn, user_id)
+            if user is None or user.role.value != "BUYER":
+                await self.respond(
+                    send, resp.UNAUTHORIZED_403, {"response": NOT_AUTHORIZED}
+                )
+                return
+            valid = (
+                isinstance(amount, int)
+                and amount in self.app.config["COIN_DENOMINATIONS"]
+            )
+            if valid:
+                users = User.__table__
+                await conn.execute(
+                    users.update()
+                    .where(users.c.id == user_id)
+                    .values(deposit=users.c.deposit + amount)
+                )
+
+        if not valid:
+            await self.respond(
+                send,
+                resp.BAD_REQUEST_400,
+                {"response": "User not found or invalid coin type inserted"},
+            )
+            return
+        metrics.record_deposit(amount)
+        await self.respond(send, resp.SUCCESS_201, {"response": "Deposit successful"})
+
+
+def create_asgi_app(app):
+    """
+    Wrap a Flask application for the ASGI serving mode
+
+    :param Flask app: Flask application, with its blueprint registered
+    """
+    return AsgiApp(app)
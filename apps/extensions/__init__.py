@@ -6,10 +6,23 @@ Each extension is initialized when app is created.
 
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
+from .cache import CatalogCache
+from .compression import Compression
+from .hashing import HasherSaturated, PasswordHasher
+from .idempotency import IdempotencyCache
+from .metrics import Metrics
+from .pool import PoolManager, pool_stats
+from .queries import QueryProfiler
+
 db = SQLAlchemy()
-migrate = Migrate()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
+catalog_cache = CatalogCache()
+hasher = PasswordHasher(bcrypt)
+pool_manager = PoolManager()
+query_profiler = QueryProfiler()
+metrics = Metrics()
+idempotency = IdempotencyCache()
+compression = Compression()
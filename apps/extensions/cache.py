@@ -0,0 +1,279 @@
+"""
+Catalog cache extension
+
+Keeps product reads in process memory. The default backend is an LRU
+cache with a time to live, bounded by entry count and approximate size.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.utils import import_string
+
+
+def _sizeof(value):
+    """
+    Approximate memory used by a cached value
+
+    :param value: Cached value
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(key) + _sizeof(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_sizeof(item) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += _sizeof(vars(value))
+    return size
+
+
+class NullCache:
+    """Cache backend that never stores anything"""
+
+    def __init__(self, **kwargs):
+        self.misses = 0
+
+    def get(self, key):
+        """Always a miss"""
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Nothing to store"""
+
+    def delete(self, key):
+        """Nothing to delete"""
+
+    def delete_prefix(self, prefix):
+        """Nothing to delete"""
+
+    def clear(self):
+        """Nothing to clear"""
+
+    def stats(self):
+        """Backend counters"""
+        return {"hits": 0, "misses": self.misses, "evictions": 0, "entries": 0}
+
+
+class LRUCache:
+    """
+    Least recently used cache with a time to live
+    Bounded by the number of entries and by approximate size in bytes.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=10):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key):
+        """Remove an entry, the lock must be held"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """
+        Get a cached value, None when missing or expired
+
+        :param str key: Cache key
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if needed
+
+        :param str key: Cache key
+        :param value: Value to store
+        """
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Remove a value
+
+        :param str key: Cache key
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def delete_prefix(self, prefix):
+        """
+        Remove every value whose key starts with prefix
+
+        :param str prefix: Cache key prefix
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self):
+        """Remove every value"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Backend counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+BACKENDS = {"lru": LRUCache, "null": NullCache}
+
+
+class CatalogCache:
+    """
+    Read-through cache for the product catalog
+
+    Configuration:
+    - CATALOG_CACHE_BACKEND: "lru", "null" or an import path of a class
+      implementing get, set, delete, delete_prefix, clear and stats;
+    - CATALOG_CACHE_TTL: seconds an entry stays valid;
+    - CATALOG_CACHE_MAX_ENTRIES: maximum number of entries;
+    - CATALOG_CACHE_MAX_BYTES: maximum approximate size of all entries;
+
+    Writes only invalidate the cache of the process that made them,
+    other processes see the change once their entries expire.
+    """
+
+    LISTING_PREFIX = "products:"
+    PRODUCT_PREFIX = "product:"
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Create the configured backend
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("CATALOG_CACHE_BACKEND", "lru")
+        app.config.setdefault("CATALOG_CACHE_TTL", 10)
+        app.config.setdefault("CATALOG_CACHE_MAX_ENTRIES", 1024)
+        app.config.setdefault("CATALOG_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+        backend = app.config["CATALOG_CACHE_BACKEND"]
+        backend_class = BACKENDS.get(backend) or import_string(backend)
+        self.backend = backend_class(
+            max_entries=app.config["CATALOG_CACHE_MAX_ENTRIES"],
+            max_bytes=app.config["CATALOG_CACHE_MAX_BYTES"],
+            ttl=app.config["CATALOG_CACHE_TTL"],
+        )
+        self.invalidations = 0
+        app.extensions["catalog_cache"] = self
+
+    def get_or_load(self, key, loader):
+        """
+        Get a cached value or load and store it
+        None values are not cached.
+
+        :param str key: Cache key
+        :param callable loader: Function loading the value
+        """
+        value = self.backend.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.backend.set(key, value)
+        return value
+
+    def listing_key(self, *parts):
+        """
+        Build the cache key of a product listing
+
+        :param parts: Values identifying the listing
+        """
+        return self.LISTING_PREFIX + repr(parts)
+
+    def product_key(self, product_id):
+        """
+        Build the cache key of a single product
+
+        :param int product_id: Product identifier
+        """
+        return f"{self.PRODUCT_PREFIX}{product_id}"
+
+    def invalidate_product(self, product_id):
+        """
+        Drop a product and every listing
+        Listings are not tracked per product on purpose: a write can also
+        move the product into a filtered listing or a page that did not
+        hold it, so only dropping the listings holding it would serve
+        stale pages.
+
+        :param int product_id: Product identifier
+        """
+        self.backend.delete(self.product_key(product_id))
+        self.backend.delete_prefix(self.LISTING_PREFIX)
+        self.invalidations += 1
+
+    def invalidate_products(self, product_ids):
+        """
+        Drop several products and every listing
+
+        :param product_ids: Product identifiers
+        """
+        for product_id in product_ids:
+            self.backend.delete(self.product_key(product_id))
+        self.backend.delete_prefix(self.LISTING_PREFIX)
+        self.invalidations += 1
+
+    def clear(self):
+        """Drop every cached value"""
+        self.backend.clear()
+
+    def stats(self):
+        """Cache counters"""
+        stats = dict(self.backend.stats())
+        stats["invalidations"] = self.invalidations
+        return stats
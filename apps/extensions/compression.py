@@ -0,0 +1,171 @@
+"""
+Response compression extension
+
+Compresses the response bodies with the best content coding the client
+accepts: brotli when the brotli package is installed, gzip or deflate.
+Compressed bytes are kept in memory by digest of the plain body, so a
+client polling an unchanged listing does not cost a compression per
+request.
+"""
+
+import gzip
+import hashlib
+import zlib
+
+from flask import current_app, request
+
+from .cache import LRUCache, NullCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+)
+
+
+def _brotli(data, level, brotli_quality):
+    """brotli content coding"""
+    return brotli.compress(data, quality=brotli_quality)
+
+
+def _gzip(data, level, brotli_quality):
+    """gzip content coding, without a timestamp so the bytes are stable"""
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _deflate(data, level, brotli_quality):
+    """deflate content coding, a zlib stream"""
+    return zlib.compress(data, level)
+
+
+class Compression:
+    """
+    Negotiated compression of the response bodies
+
+    Configuration:
+    - COMPRESSION_ENABLED: compress the responses;
+    - COMPRESSION_MIN_SIZE: smallest body compressed, in bytes;
+    - COMPRESSION_LEVEL: gzip and deflate level, 1 to 9;
+    - COMPRESSION_BROTLI_QUALITY: brotli quality, 0 to 11;
+    - COMPRESSION_MIMETYPES: media types compressed;
+    - COMPRESSION_CACHE_MAX_ENTRIES: compressed bodies kept in memory, by
+      digest of the plain body;
+    - COMPRESSION_CACHE_MAX_BYTES: maximum size of the kept bodies;
+    """
+
+    def __init__(self, app=None):
+        self.codings = {"gzip": _gzip, "deflate": _deflate}
+        if brotli is not None:
+            self.codings = {"br": _brotli, **self.codings}
+        self.backend = NullCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the response hook
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("COMPRESSION_ENABLED", True)
+        app.config.setdefault("COMPRESSION_MIN_SIZE", 500)
+        app.config.setdefault("COMPRESSION_LEVEL", 6)
+        app.config.setdefault("COMPRESSION_BROTLI_QUALITY", 5)
+        app.config.setdefault("COMPRESSION_MIMETYPES", DEFAULT_MIMETYPES)
+        app.config.setdefault("COMPRESSION_CACHE_MAX_ENTRIES", 256)
+        app.config.setdefault("COMPRESSION_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+
+        self.backend = LRUCache(
+            max_entries=app.config["COMPRESSION_CACHE_MAX_ENTRIES"],
+            max_bytes=app.config["COMPRESSION_CACHE_MAX_BYTES"],
+            ttl=0,
+        )
+        app.after_request(self._compress)
+        app.extensions["compression"] = self
+
+    def negotiate(self):
+        """Content coding of the current request, None for the identity"""
+        return request.accept_encodings.best_match(self.codings)
+
+    @staticmethod
+    def _compressible(response, config):
+        """
+        Check a response is worth compressing
+
+        :param Response response: Flask response
+        :param Config config: Application configuration
+        """
+        return (
+            200 <= response.status_code < 300
+            and response.status_code != 204
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and "Content-Encoding" not in response.headers
+            and response.content_length is not None
+            and response.content_length >= config["COMPRESSION_MIN_SIZE"]
+        )
+
+    def _compress(self, response):
+        """
+        Compress a response body for the current request
+
+        :param Response response: Flask response
+        """
+        config = current_app.config
+        if not config["COMPRESSION_ENABLED"]:
+            return response
+
+        etag, weak = response.get_etag()
+        if response.status_code == 304:
+            # same tag as the compressed response it stands for
+            if etag and not weak and self.negotiate() is not None:
+                response.set_etag(etag, weak=True)
+            return response
+        if response.mimetype not in config["COMPRESSION_MIMETYPES"]:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        coding = self.negotiate()
+        if coding is None or not self._compressible(response, config):
+            return response
+
+        # hashing is far cheaper than compressing, and a tag does not
+        # always pin the bytes of the body
+        data = response.get_data()
+        key = (
+            hashlib.sha1(data).hexdigest(),
+            coding,
+            config["COMPRESSION_LEVEL"],
+            config["COMPRESSION_BROTLI_QUALITY"],
+        )
+        body = self.backend.get(key)
+        if body is None:
+            body = self.codings[coding](
+                data,
+                config["COMPRESSION_LEVEL"],
+                config["COMPRESSION_BROTLI_QUALITY"],
+            )
+            self.backend.set(key, body)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = coding
+        if etag and not weak:
+            # the compressed bytes are another representation of the tag
+            response.set_etag(etag, weak=True)
+        return response
+
+    def clear(self):
+        """Drop every kept body"""
+        self.backend.clear()
+
+    def stats(self):
+        """Kept bodies counters"""
+        return self.backend.stats()
@@ -0,0 +1,145 @@
+"""
+Password hashing extension
+
+bcrypt is CPU bound on purpose. Hashing runs on a bounded pool of workers
+so a burst of logins cannot take every request thread, requests that
+cannot get a slot are rejected right away.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt as bcrypt_lib
+
+
+class HasherSaturated(Exception):
+    """Raised when every hashing slot is taken"""
+
+
+def hash_log_rounds(pw_hash):
+    """
+    Read the cost factor stored in a bcrypt hash
+    Returns None when the hash is not a bcrypt hash
+
+    :param pw_hash: Stored password hash
+    """
+    if isinstance(pw_hash, bytes):
+        pw_hash = pw_hash.decode("utf-8", "replace")
+
+    parts = pw_hash.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def calibrate_log_rounds(target_ms, min_rounds=4, max_rounds=16):
+    """
+    Find the highest bcrypt cost that hashes within target_ms on this host
+
+    :param float target_ms: Target hashing latency in milliseconds
+    :param int min_rounds: Lowest cost to consider
+    :param int max_rounds: Highest cost to consider
+    :return: Chosen cost and measured milliseconds per cost
+    :rtype: tuple
+    """
+    timings = {}
+    chosen = min_rounds
+
+    for rounds in range(min_rounds, max_rounds + 1):
+        salt = bcrypt_lib.gensalt(rounds=rounds)
+        start = time.perf_counter()
+        bcrypt_lib.hashpw(b"calibration password", salt)
+        timings[rounds] = (time.perf_counter() - start) * 1000
+
+        if timings[rounds] > target_ms:
+            break
+        chosen = rounds
+
+    return chosen, timings
+
+
+class PasswordHasher:
+    """
+    Bounded executor for bcrypt hashing
+
+    Configuration:
+    - PASSWORD_HASH_WORKERS: hashing operations running at the same time;
+    - PASSWORD_HASH_QUEUE: extra requests allowed to wait for a worker;
+    - PASSWORD_HASH_TIMEOUT: seconds to wait for a slot before rejecting;
+    - PASSWORD_REHASH_ON_LOGIN: rehash passwords stored with another cost;
+    """
+
+    def __init__(self, bcrypt, app=None):
+        self.bcrypt = bcrypt
+        self.timeout = 0
+        self.log_rounds = 12
+        self.rehash_on_login = True
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Create the worker pool
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("PASSWORD_HASH_WORKERS", 4)
+        app.config.setdefault("PASSWORD_HASH_QUEUE", 16)
+        app.config.setdefault("PASSWORD_HASH_TIMEOUT", 0.05)
+        app.config.setdefault("PASSWORD_REHASH_ON_LOGIN", True)
+
+        workers = app.config["PASSWORD_HASH_WORKERS"]
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
+        self._slots = threading.BoundedSemaphore(
+            workers + app.config["PASSWORD_HASH_QUEUE"]
+        )
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+        self.log_rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        self.rehash_on_login = app.config["PASSWORD_REHASH_ON_LOGIN"]
+        app.extensions["password_hasher"] = self
+
+    def _run(self, func, *args):
+        """
+        Run func on the pool and wait for its result
+
+        :param callable func: Hashing function
+        :raises HasherSaturated: No slot freed up within the timeout
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherSaturated()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def generate_password_hash(self, password):
+        """
+        Hash a password with the configured cost
+
+        :param str password: Plain text password
+        """
+        return self._run(self.bcrypt.generate_password_hash, password)
+
+    def check_password_hash(self, pw_hash, password):
+        """
+        Check a password against a stored hash
+
+        :param pw_hash: Stored password hash
+        :param str password: Plain text password
+        """
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """
+        Check if a stored hash uses another cost than the configured one
+
+        :param pw_hash: Stored password hash
+        """
+        return self.rehash_on_login and hash_log_rounds(pw_hash) != self.log_rounds
@@ -0,0 +1,75 @@
+"""
+Idempotency extension
+
+Keeps the responses of recently completed idempotent requests in process
+memory, in front of the idempotency_key table.
+"""
+
+from .cache import LRUCache, NullCache
+
+
+class IdempotencyCache:
+    """
+    Bounded in-process store of idempotent responses
+
+    Configuration:
+    - IDEMPOTENCY_ENABLED: honour the Idempotency-Key header;
+    - IDEMPOTENCY_TTL: seconds a key is remembered;
+    - IDEMPOTENCY_CLAIM_TIMEOUT: seconds before a claim whose request never
+      committed can be taken over;
+    - IDEMPOTENCY_MAX_ENTRIES: maximum number of responses kept in memory;
+    - IDEMPOTENCY_MAX_BYTES: maximum approximate size of the kept responses;
+    """
+
+    HEADER = "Idempotency-Key"
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Create the in-process store
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("IDEMPOTENCY_ENABLED", True)
+        app.config.setdefault("IDEMPOTENCY_TTL", 24 * 3600)
+        app.config.setdefault("IDEMPOTENCY_CLAIM_TIMEOUT", 60)
+        app.config.setdefault("IDEMPOTENCY_MAX_ENTRIES", 10000)
+        app.config.setdefault("IDEMPOTENCY_MAX_BYTES", 16 * 1024 * 1024)
+
+        self.ttl = app.config["IDEMPOTENCY_TTL"]
+        self.backend = LRUCache(
+            max_entries=app.config["IDEMPOTENCY_MAX_ENTRIES"],
+            max_bytes=app.config["IDEMPOTENCY_MAX_BYTES"],
+            ttl=self.ttl,
+        )
+        app.extensions["idempotency"] = self
+
+    def get(self, key):
+        """
+        Stored response, None when unknown
+
+        :param str key: Scoped idempotency key
+        """
+        return self.backend.get(key)
+
+    def set(self, key, response):
+        """
+        Store a completed response
+
+        :param str key: Scoped idempotency key
+        :param tuple response: Fingerprint, status code and body
+        """
+        self.backend.set(key, response)
+
+    def clear(self):
+        """Drop every stored response"""
+        self.backend.clear()
+
+    def stats(self):
+        """Store counters"""
+        return self.backend.stats()
@@ -0,0 +1,570 @@
+"""
+Metrics extension
+
+Request, connection pool and business metrics served at /metrics in the
+Prometheus text format. With several worker processes each one writes its
+values to a file of a shared directory and the scrape sums them. An
+exiting worker folds its counters into a retired file and removes its own.
+"""
+
+import atexit
+import glob
+import json
+import math
+import os
+import secrets
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, request
+
+from .pool import pool_stats
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+RETIRED_FILE = "metrics_retired.json"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    """
+    Escape a label value
+
+    :param str value: Label value
+    """
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_value(value):
+    """
+    Format a sample value
+
+    :param float value: Sample value
+    """
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names, values, extra=()):
+    """
+    Format a label set
+
+    :param tuple names: Label names
+    :param tuple values: Label values
+    :param tuple extra: Additional (name, value) pairs
+    """
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """
+    Base metric holding one value per label set
+    Updates take a short lock, reads copy the values.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """
+        Label values in label name order
+
+        :param dict labels: Label values by name
+        """
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        """Copy of the values, keyed by label values"""
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        """Copy a single value"""
+        return value
+
+    @staticmethod
+    def merge(first, second):
+        """Combine values of the same label set from two processes"""
+        return first + second
+
+    def reset(self):
+        """Drop every value"""
+        with self._lock:
+            self._values.clear()
+
+    def expose(self, values):
+        """
+        Text format lines of the given values
+
+        :param dict values: Values keyed by label values
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, value in sorted(values.items()):
+            lines.append(
+                f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """Monotonic counter"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the counter
+
+        :param float amount: Increment
+        :param labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the gauge
+
+        :param float amount: Increment
+        :param labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """
+        Decrement the gauge
+
+        :param float amount: Decrement
+        :param labels: Label values
+        """
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observations counted in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """
+        Record an observation
+
+        :param float value: Observed value
+        :param labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-1] += value
+
+    @staticmethod
+    def _copy(value):
+        """Copy bucket counts and sum"""
+        return list(value)
+
+    @staticmethod
+    def merge(first, second):
+        """Add bucket counts and sums"""
+        return [left + right for left, right in zip(first, second)]
+
+    def expose(self, values):
+        """
+        Text format lines of the given values
+
+        :param dict values: Values keyed by label values
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Prometheus metrics
+
+    Configuration:
+    - METRICS_ENABLED: record metrics and serve /metrics, off by default as
+      /metrics takes no credentials;
+    - METRICS_MULTIPROC_DIR: directory shared by the worker processes,
+      empty for a single process. Each process writes
+      metrics_<pid>_<token>.json, the token keeps a reused process
+      identifier from overwriting the file of a dead worker;
+    - METRICS_FLUSH_INTERVAL: seconds between two writes of the process
+      file in multiprocess mode;
+    - METRICS_LATENCY_BUCKETS: request latency histogram buckets in seconds;
+
+    Connection pool gauges describe the process answering the scrape.
+    """
+
+    def __init__(self, app=None):
+        self.multiproc_dir = None
+        self.flush_interval = 1.0
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        self._file_pid = None
+        self._file_token = None
+        self._metrics = []
+        self._create_metrics(DEFAULT_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def _create_metrics(self, buckets):
+        """
+        Create the registered metrics
+
+        :param tuple buckets: Request latency buckets
+        """
+        self.requests = Counter(
+            "http_requests_total",
+            "HTTP requests by namespace, route, method and status code.",
+            ("namespace", "route", "method", "status"),
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency in seconds.",
+            ("namespace", "route", "method"),
+            buckets=buckets,
+        )
+        self.in_flight = Gauge(
+            "http_requests_in_flight", "HTTP requests being processed."
+        )
+        self.purchases = Counter(
+            "vending_purchases_total", "Successful purchases.", ("kind",)
+        )
+        self.items_sold = Counter("vending_items_sold_total", "Product items sold.")
+        self.spending = Counter("vending_spending_cents_total", "Cents spent.")
+        self.deposits = Counter(
+            "vending_deposits_total", "Deposits by coin.", ("coin",)
+        )
+        self.coins_returned = Counter(
+            "vending_coins_returned_total", "Coins returned as change.", ("coin",)
+        )
+        self._metrics = [
+            self.requests,
+            self.latency,
+            self.in_flight,
+            self.purchases,
+            self.items_sold,
+            self.spending,
+            self.deposits,
+            self.coins_returned,
+        ]
+
+    def init_app(self, app):
+        """
+        Register request hooks and the /metrics endpoint
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("METRICS_ENABLED", False)
+        app.config.setdefault("METRICS_MULTIPROC_DIR", None)
+        app.config.setdefault("METRICS_FLUSH_INTERVAL", 1.0)
+        app.config.setdefault("METRICS_LATENCY_BUCKETS", DEFAULT_BUCKETS)
+
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        self._create_metrics(app.config["METRICS_LATENCY_BUCKETS"])
+        self.flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+        self.multiproc_dir = app.config["METRICS_MULTIPROC_DIR"] or None
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            atexit.register(self.retire)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.view)
+        app.extensions["metrics"] = self
+
+    def _start_request(self):
+        """Count the request as in flight"""
+        g.metrics_started_at = time.perf_counter()
+        self.in_flight.inc()
+
+    def _finish_request(self, response):
+        """
+        Record the request count and latency
+
+        :param Response response: Flask response
+        """
+        started_at = g.get("metrics_started_at")
+        if started_at is None:
+            return response
+
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        parts = rule.strip("/").split("/")
+        namespace = parts[1] if len(parts) > 1 and parts[0] == "api" else parts[0]
+
+        self.requests.inc(
+            namespace=namespace,
+            route=rule,
+            method=request.method,
+            status=response.status_code,
+        )
+        self.latency.observe(
+            time.perf_counter() - started_at,
+            namespace=namespace,
+            route=rule,
+            method=request.method,
+        )
+        return response
+
+    def _teardown_request(self, exc=None):
+        """Remove the request from the in flight gauge and flush if needed"""
+        if g.pop("metrics_started_at", None) is not None:
+            self.in_flight.dec()
+        if self.multiproc_dir and time.monotonic() - self._last_flush > (
+            self.flush_interval
+        ):
+            self.flush()
+
+    def record_purchase(self, kind, quantity, spending, change):
+        """
+        Record a successful purchase
+
+        :param str kind: "single" or "batch"
+        :param int quantity: Items bought
+        :param int spending: Cents spent
+        :param change: Coins returned, a list of coins or a {coin: count} dict
+        """
+        self.purchases.inc(kind=kind)
+        self.items_sold.inc(quantity)
+        self.spending.inc(spending)
+        if not isinstance(change, dict):
+            counts = {}
+            for coin in change:
+                counts[coin] = counts.get(coin, 0) + 1
+            change = counts
+        for coin, count in change.items():
+            self.coins_returned.inc(count, coin=coin)
+
+    def record_deposit(self, coin):
+        """
+        Record a deposited coin
+
+        :param int coin: Coin value in cents
+        """
+        self.deposits.inc(coin=coin)
+
+    def _process_file(self):
+        """Path of the file holding the values of this process"""
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file_pid = pid
+            self._file_token = secrets.token_hex(4)
+        return os.path.join(
+            self.multiproc_dir, f"metrics_{pid}_{self._file_token}.json"
+        )
+
+    @contextmanager
+    def _directory_lock(self, exclusive):
+        """
+        Lock the shared directory while files are folded or read
+
+        :param bool exclusive: Lock for a change rather than a read
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.multiproc_dir, "metrics.lock"), "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _write(self, path, values):
+        """
+        Replace a file of the shared directory in one step
+
+        :param str path: File path
+        :param dict values: Values keyed by label values, by metric name
+        """
+        data = {
+            name: [[list(key), value] for key, value in metric_values.items()]
+            for name, metric_values in values.items()
+        }
+        handle, tmp_path = tempfile.mkstemp(dir=self.multiproc_dir, suffix=".tmp")
+        with os.fdopen(handle, "w") as tmp:
+            json.dump(data, tmp)
+        os.replace(tmp_path, path)
+
+    def _read(self, paths, kinds=None):
+        """
+        Values of the given files, summed
+
+        :param list paths: Files written by flush or retire
+        :param tuple kinds: Metric kinds to read, all by default
+        :return: Values keyed by label values, by metric name
+        :rtype: dict
+        """
+        metrics = [
+            metric for metric in self._metrics if kinds is None or metric.kind in kinds
+        ]
+        merged = {metric.name: {} for metric in metrics}
+        for path in paths:
+            try:
+                with open(path) as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for metric in metrics:
+                values = merged[metric.name]
+                for key, value in data.get(metric.name, []):
+                    key = tuple(key)
+                    values[key] = (
+                        metric.merge(values[key], value) if key in values else value
+                    )
+        return merged
+
+    def flush(self):
+        """Write the values of this process to its file"""
+        if not self.multiproc_dir:
+            return
+        with self._flush_lock:
+            self._write(
+                self._process_file(),
+                {metric.name: metric.snapshot() for metric in self._metrics},
+            )
+            self._last_flush = time.monotonic()
+
+    def retire(self, pid=None):
+        """
+        Fold the files of an exited process into the retired file
+        Counters and histograms keep their totals, the gauges of an exited
+        process are dropped. Registered at exit of every process, a server
+        master can also call it with the identifier of a worker that was
+        killed.
+
+        :param int pid: Process identifier, the current process by default
+        """
+        if not self.multiproc_dir:
+            return
+        if pid is None:
+            self.flush()
+            pid = os.getpid()
+
+        retired = os.path.join(self.multiproc_dir, RETIRED_FILE)
+        own = pid == os.getpid()
+        with self._directory_lock(exclusive=True):
+            paths = glob.glob(os.path.join(self.multiproc_dir, f"metrics_{pid}_*.json"))
+            if not paths:
+                return
+            self._write(
+                retired, self._read([retired] + paths, ("counter", "histogram"))
+            )
+            for path in paths:
+                os.remove(path)
+            if own:
+                # a later flush must not count the folded values again
+                self.reset()
+
+    def collect(self):
+        """Values of every metric, summed over the processes"""
+        if not self.multiproc_dir:
+            return [(metric, metric.snapshot()) for metric in self._metrics]
+
+        self.flush()
+        with self._directory_lock(exclusive=False):
+            merged = self._read(
+                glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json"))
+            )
+        return [(metric, merged[metric.name]) for metric in self._metrics]
+
+    @staticmethod
+    def _pool_lines():
+        """Connection pool gauges of this process"""
+        state = current_app.extensions.get("sqlalchemy")
+        if state is None:
+            return []
+
+        stats = pool_stats(state.db.get_engine())
+        lines = [
+            "# TYPE db_pool_info gauge",
+            f'db_pool_info{{pool="{stats["pool"]}"}} 1',
+        ]
+        for key in ("size", "checked_in", "checked_out", "overflow"):
+            if key in stats:
+                lines.append(f"# TYPE db_pool_{key} gauge")
+                lines.append(f"db_pool_{key} {stats[key]}")
+        if "timeouts" in stats:
+            lines.append("# TYPE db_pool_timeouts_total counter")
+            lines.append(f"db_pool_timeouts_total {stats['timeouts']}")
+            lines.append("# TYPE db_pool_wait_seconds_total counter")
+            lines.append(
+                "db_pool_wait_seconds_total "
+                f"{_format_value(stats['wait_time_total_ms'] / 1000)}"
+            )
+            lines.append("# TYPE db_pool_connect_seconds_total counter")
+            lines.append(
+                "db_pool_connect_seconds_total "
+                f"{_format_value(stats['connect_time_total_ms'] / 1000)}"
+            )
+        return lines
+
+    def expose(self):
+        """Every metric in the Prometheus text format"""
+        lines = []
+        for metric, values in self.collect():
+            lines.extend(metric.expose(values))
+        lines.extend(self._pool_lines())
+        return "\n".join(lines) + "\n"
+
+    def view(self):
+        """Serve the metrics"""
+        return Response(self.expose(), content_type=CONTENT_TYPE)
+
+    def reset(self):
+        """Drop every value of this process"""
+        for metric in self._metrics:
+            metric.reset()
@@ -0,0 +1,182 @@
+"""
+Connection pool extension
+
+Builds the SQLAlchemy engine pool options from the configuration, can open
+connections ahead of the first requests and keeps pool statistics.
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool recording how long checkouts wait for a connection
+    Time spent opening a new connection during a checkout is counted apart
+    from the wait for a free one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkout = threading.local()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.connect_time_total = 0.0
+
+    def _do_get(self):
+        """Get a connection, measuring the time spent waiting for it"""
+        start = time.perf_counter()
+        self._checkout.connect_time = 0.0
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            waited = max(elapsed - self._checkout.connect_time, 0.0)
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+
+    def _create_connection(self):
+        """Open a new database connection, measuring the time it takes"""
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            elapsed = time.perf_counter() - start
+            self._checkout.connect_time = (
+                getattr(self._checkout, "connect_time", 0.0) + elapsed
+            )
+            with self._stats_lock:
+                self.connects += 1
+                self.connect_time_total += elapsed
+
+    def stats(self):
+        """Pool counters"""
+        with self._stats_lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "timeouts": self.timeouts,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+                "connect_time_total_ms": round(self.connect_time_total * 1000, 3),
+            }
+
+
+def pool_stats(engine):
+    """
+    Live statistics of an engine connection pool
+
+    :param Engine engine: SQLAlchemy engine
+    """
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        stats.update(
+            {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,  # pylint: disable=protected-access
+            }
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.stats())
+    return stats
+
+
+class PoolManager:
+    """
+    Connection pool configuration and warmup
+
+    Configuration:
+    - DB_POOL_SIZE: connections kept open;
+    - DB_MAX_OVERFLOW: extra connections opened under load;
+    - DB_POOL_TIMEOUT: seconds to wait for a free connection;
+    - DB_POOL_RECYCLE: seconds after which a connection is replaced, keep it
+      below the MySQL wait_timeout;
+    - DB_POOL_PRE_PING: test connections before using them;
+    - DB_POOL_WARMUP: connections opened before the first request of each
+      process;
+
+    SQLite databases keep the SQLAlchemy default pool.
+    """
+
+    def init_app(self, app):
+        """
+        Build SQLALCHEMY_ENGINE_OPTIONS from the pool configuration
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("DB_POOL_SIZE", 10)
+        app.config.setdefault("DB_MAX_OVERFLOW", 20)
+        app.config.setdefault("DB_POOL_TIMEOUT", 30)
+        app.config.setdefault("DB_POOL_RECYCLE", 280)
+        app.config.setdefault("DB_POOL_PRE_PING", True)
+        app.config.setdefault("DB_POOL_WARMUP", 0)
+
+        if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+            return
+
+        options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+        options.setdefault("poolclass", InstrumentedQueuePool)
+        options.setdefault("pool_size", app.config["DB_POOL_SIZE"])
+        options.setdefault("max_overflow", app.config["DB_MAX_OVERFLOW"])
+        options.setdefault("pool_timeout", app.config["DB_POOL_TIMEOUT"])
+        options.setdefault("pool_recycle", app.config["DB_POOL_RECYCLE"])
+        options.setdefault("pool_pre_ping", app.config["DB_POOL_PRE_PING"])
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+        app.extensions["pool_manager"] = self
+
+    def warmup_on_first_request(self, app, db):
+        """
+        Warm the pool up before the first request of each process
+        Connections opened when the app is created would be inherited by
+        the workers of a pre-fork server.
+
+        :param Flask app: Flask application
+        :param SQLAlchemy db: Database extension
+        """
+        if app.config.get("DB_POOL_WARMUP", 0):
+            app.before_first_request(lambda: self.warmup(app, db))
+
+    @staticmethod
+    def warmup(app, db):
+        """
+        Open DB_POOL_WARMUP connections and return them to the pool
+        Call it in every worker process, connections must not be shared
+        across a fork.
+
+        :param Flask app: Flask application
+        :param SQLAlchemy db: Database extension
+        """
+        size = app.config.get("DB_POOL_WARMUP", 0)
+        if not size:
+            return 0
+
+        connections = []
+        try:
+            with app.app_context():
+                engine = db.get_engine(app)
+                for _ in range(size):
+                    connections.append(engine.connect())
+        except Exception as exc:  # pylint: disable=broad-except
+            app.logger.warning("Database pool warmup failed: %s", exc)
+        finally:
+            for connection in connections:
+                connection.close()
+        return len(connections)
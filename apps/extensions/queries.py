@@ -0,0 +1,202 @@
+"""
+Query profiler extension
+
+Counts and times the SQL statements issued by each request, reports them
+in a Server-Timing header and keeps aggregates per endpoint.
+"""
+
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_START_KEY = "query_profiler_start"
+
+
+class QueryProfile:
+    """Statements issued by one request"""
+
+    __slots__ = ("started_at", "count", "duration", "slowest", "slowest_duration")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = None
+        self.slowest_duration = 0.0
+
+    def record(self, statement, duration):
+        """
+        Record an executed statement
+
+        :param str statement: SQL statement
+        :param float duration: Execution time in seconds
+        """
+        self.count += 1
+        self.duration += duration
+        if duration >= self.slowest_duration:
+            self.slowest = statement
+            self.slowest_duration = duration
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Remember when a statement started"""
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Record a statement in the profile of the running request"""
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+
+    profile = g.get("query_profile") if has_app_context() else None
+    if profile is not None:
+        profile.record(statement, duration)
+
+
+def _handle_error(exception_context):
+    """Drop the start time of a failed statement"""
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_START_KEY):
+        connection.info[_START_KEY].pop()
+
+
+class QueryProfiler:
+    """
+    Per request SQL instrumentation
+
+    Configuration:
+    - QUERY_PROFILER_ENABLED: record statements and add the header;
+    - QUERY_PROFILER_WARN_QUERIES: log requests issuing more statements,
+      0 turns the warning off;
+    - QUERY_PROFILER_STATEMENT_LENGTH: characters kept of the slowest
+      statement;
+
+    Statements issued while a streamed body is generated happen after the
+    response headers are sent and are not counted.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.warn_queries = 0
+        self.statement_length = 200
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Hook engine events and request handlers
+
+        :param Flask app: Flask application
+        """
+        app.config.setdefault("QUERY_PROFILER_ENABLED", True)
+        app.config.setdefault("QUERY_PROFILER_WARN_QUERIES", 20)
+        app.config.setdefault("QUERY_PROFILER_STATEMENT_LENGTH", 200)
+
+        if not app.config["QUERY_PROFILER_ENABLED"]:
+            return
+
+        self.warn_queries = app.config["QUERY_PROFILER_WARN_QUERIES"]
+        self.statement_length = app.config["QUERY_PROFILER_STATEMENT_LENGTH"]
+        self.reset()
+
+        # engines are created lazily, listen on every engine once
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.extensions["query_profiler"] = self
+
+    @staticmethod
+    def _start_request():
+        """Start the profile of a request"""
+        g.query_profile = QueryProfile()
+
+    def _finish_request(self, response):
+        """
+        Add the Server-Timing header and update the endpoint aggregates
+
+        :param Response response: Flask response
+        """
+        profile = g.pop("query_profile", None)
+        if profile is None:
+            return response
+
+        total_ms = (time.perf_counter() - profile.started_at) * 1000
+        db_ms = profile.duration * 1000
+        timing = (
+            f'db;dur={db_ms:.2f};desc="{profile.count} queries", '
+            f"app;dur={total_ms:.2f}"
+        )
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = (
+            f"{existing}, {timing}" if existing else timing
+        )
+
+        endpoint = request.endpoint or "unknown"
+        self._aggregate(endpoint, profile)
+
+        if self.warn_queries and profile.count > self.warn_queries:
+            current_app.logger.warning(
+                "%s issued %d queries in %.2f ms", endpoint, profile.count, db_ms
+            )
+        return response
+
+    def _aggregate(self, endpoint, profile):
+        """
+        Add a request profile to its endpoint aggregates
+
+        :param str endpoint: Flask endpoint name
+        :param QueryProfile profile: Request profile
+        """
+        with self._lock:
+            stats = self._endpoints.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "queries": 0,
+                    "max_queries": 0,
+                    "db_time_ms": 0.0,
+                    "max_db_time_ms": 0.0,
+                    "slowest_ms": 0.0,
+                    "slowest_statement": None,
+                },
+            )
+            db_ms = profile.duration * 1000
+            stats["requests"] += 1
+            stats["queries"] += profile.count
+            stats["max_queries"] = max(stats["max_queries"], profile.count)
+            stats["db_time_ms"] += db_ms
+            stats["max_db_time_ms"] = max(stats["max_db_time_ms"], db_ms)
+
+            slowest_ms = profile.slowest_duration * 1000
+            if profile.slowest is not None and slowest_ms >= stats["slowest_ms"]:
+                stats["slowest_ms"] = slowest_ms
+                stats["slowest_statement"] = profile.slowest[: self.statement_length]
+
+    def stats(self):
+        """Aggregates per endpoint"""
+        with self._lock:
+            return {
+                endpoint: dict(
+                    stats,
+                    avg_queries=round(stats["queries"] / stats["requests"], 2),
+                    db_time_ms=round(stats["db_time_ms"], 3),
+                    max_db_time_ms=round(stats["max_db_time_ms"], 3),
+                    slowest_ms=round(stats["slowest_ms"], 3),
+                )
+                for endpoint, stats in sorted(self._endpoints.items())
+            }
+
+    def reset(self):
+        """Drop every aggregate"""
+        with self._lock:
+            self._endpoints.clear()
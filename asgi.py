@@ -0,0 +1,16 @@
+"""
+ASGI entry point
+
+Serve with an ASGI server, for example:
+    uvicorn asgi:application --workers 4
+"""
+import os
+
+from apps import create_app
+from apps.api import blueprint
+from apps.asgi import create_asgi_app
+
+app = create_app(os.getenv("FLASK_ENV", "default"))
+app.register_blueprint(blueprint)
+
+application = create_asgi_app(app)
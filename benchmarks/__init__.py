@@ -0,0 +1,10 @@
+"""
+Benchmarks module
+
+Measures the throughput and latency of the API hot paths.
+"""
+
+from .loadgen import load_collection, parse_mix, run_load
+from .serialization import compare_serialization
+from .serving import compare_serving
+from .suite import compare, dumps, run_benchmarks
@@ -0,0 +1,389 @@
+"""
+Load generator replaying the Postman collection
+
+Every request of the collection is a scenario named FOLDER/NAME, for
+example ACTION/BUY. Virtual users, each with its own session cookies,
+pick scenarios by weight until the run ends. Virtual users are BUYER
+accounts registered and logged in through the collection requests, the
+catalog is created by a SELLER the same way.
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import email_validator
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from apps import create_app, db
+from apps.api import blueprint
+
+from .suite import percentile
+
+COLLECTION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "Vending Machine.postman_collection.json",
+)
+DEFAULT_MIX = {"PRODUCT/LIST": 80, "ACTION/BUY": 15, "ACTION/DEPOSIT": 5}
+PASSWORD = "Load1234"
+
+
+def load_collection(path=COLLECTION):
+    """
+    Read the requests of a Postman collection
+
+    :param str path: Collection file
+    :return: Request templates by FOLDER/NAME
+    :rtype: dict
+    """
+    with open(path) as handle:
+        collection = json.load(handle)
+
+    templates = {}
+
+    def walk(items, prefix):
+        for item in items:
+            name = f"{prefix}{item['name']}"
+            if "item" in item:
+                walk(item["item"], f"{name}/")
+                continue
+
+            request = item["request"]
+            url = request["url"]
+            raw = url if isinstance(url, str) else url.get("raw", "")
+            body = (request.get("body") or {}).get("raw") or None
+            templates[name] = {
+                "method": request["method"],
+                "path": urlsplit(raw).path,
+                "body": json.loads(body) if body else None,
+            }
+
+    walk(collection["item"], "")
+    return templates
+
+
+def parse_mix(values):
+    """
+    Parse NAME=WEIGHT pairs
+
+    :param values: Strings like "ACTION/BUY=15"
+    """
+    mix = {}
+    for value in values:
+        name, _, weight = value.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without access log"""
+
+    def log_request(self, *args, **kwargs):
+        """Access lines would flood the report"""
+
+
+class LocalServer:
+    """Application served by werkzeug on a free local port"""
+
+    def __init__(self, config=None):
+        self.tmpdir = tempfile.mkdtemp(prefix="vending-load-")
+        self.config = {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+            + os.path.join(self.tmpdir, "load.db"),
+            "SQLALCHEMY_ENGINE_OPTIONS": {},
+            **(config or {}),
+        }
+        self.app = None
+        self._server = None
+        self._thread = None
+        self._check_deliverability = email_validator.CHECK_DELIVERABILITY
+
+    def start(self):
+        """Create the database, start serving and return the base URL"""
+        self.app = create_app("testing", config=self.config)
+        self.app.register_blueprint(blueprint)
+        with self.app.app_context():
+            db.create_all()
+
+        # generated emails have no DNS records
+        email_validator.CHECK_DELIVERABILITY = False
+        self._server = make_server(
+            "127.0.0.1",
+            0,
+            self.app,
+            threaded=True,
+            request_handler=QuietRequestHandler,
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        """Stop serving and drop the database"""
+        email_validator.CHECK_DELIVERABILITY = self._check_deliverability
+        if self._server is not None:
+            self._server.shutdown()
+            self._thread.join()
+            with self.app.app_context():
+                db.session.remove()
+                db.drop_all()
+        for name in os.listdir(self.tmpdir):
+            os.remove(os.path.join(self.tmpdir, name))
+        os.rmdir(self.tmpdir)
+
+
+class Recorder:
+    """Latencies and outcomes per scenario"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, name, latency, status):
+        """
+        Record a request
+
+        :param str name: Scenario name
+        :param float latency: Seconds until the response
+        :param status: HTTP status code, or the exception class name
+        """
+        with self._lock:
+            self._samples.setdefault(name, []).append((latency, status))
+
+    def report(self, elapsed):
+        """
+        Throughput, error rate and latency percentiles per scenario
+
+        :param float elapsed: Run duration in seconds
+        """
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+
+        report = {}
+        for name, values in sorted(samples.items()):
+            latencies = sorted(latency for latency, _ in values)
+            statuses = {}
+            errors = 0
+            for _, status in values:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if not isinstance(status, int) or status >= 400:
+                    errors += 1
+            report[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4),
+                "throughput": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                "max_ms": round(latencies[-1] * 1000, 3),
+                "statuses": statuses,
+            }
+        return report
+
+
+class VirtualUser:
+    """
+    Simulated client with its own session cookies
+
+    :param str base_url: Server base URL
+    :param dict templates: Request templates by scenario name
+    :param Recorder recorder: Measured requests sink, None for setup requests
+    """
+
+    def __init__(self, base_url, templates, recorder=None):
+        self.base_url = base_url
+        self.templates = templates
+        self.recorder = recorder
+        self.session = requests.Session()
+
+    def send(self, name, body=None, record=True):
+        """
+        Send a collection request
+
+        :param str name: Scenario name
+        :param dict body: Body replacing the collection one
+        :param bool record: Record the request latency and status
+        """
+        template = self.templates[name]
+        if body is None:
+            body = template["body"]
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                template["method"], self.base_url + template["path"], json=body
+            )
+            status = response.status_code
+        except requests.RequestException as exc:
+            response, status = None, type(exc).__name__
+        if record and self.recorder is not None:
+            self.recorder.record(name, time.perf_counter() - start, status)
+        return response
+
+    def register(self, username, role):
+        """
+        Register and log in through the collection requests
+
+        :param str username: Email to register
+        :param str role: BUYER or SELLER
+        """
+        credentials = {"username": username, "password": PASSWORD}
+        self.send("USER/REGISTER", dict(credentials, role=role), record=False)
+        response = self.send("USER/LOGIN", credentials, record=False)
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Could not log in {username}")
+
+
+def render(template, product_ids, rng):
+    """
+    Body of a measured request
+    Product ids of the collection are replaced by seeded products.
+
+    :param dict template: Request template
+    :param list product_ids: Seeded product identifiers
+    :param Random rng: Random generator of the virtual user
+    """
+    body = template["body"]
+    if not isinstance(body, dict):
+        return body
+
+    body = dict(body)
+    if "product_id" in body:
+        body["product_id"] = rng.choice(product_ids)
+    if "quantity" in body:
+        body["quantity"] = 1
+    return body
+
+
+def setup_catalog(base_url, templates, products, run_id):
+    """
+    Create products through a SELLER session
+
+    :param str base_url: Server base URL
+    :param dict templates: Request templates
+    :param int products: Number of products to create
+    :param str run_id: Unique suffix of generated usernames
+    """
+    seller = VirtualUser(base_url, templates)
+    seller.register(f"seller.{run_id}@lg.example", "SELLER")
+
+    product_ids = []
+    for index in range(products):
+        body = dict(
+            templates["PRODUCT/CREATE"]["body"],
+            amountAvailable=10**6,
+            cost=5 * (1 + index % 20),
+            productName=f"Load product {index}",
+        )
+        response = seller.send("PRODUCT/CREATE", body, record=False)
+        if response is not None and response.status_code == 201:
+            product_ids.append(response.json()["response"]["id"])
+    if not product_ids:
+        raise RuntimeError("Could not create products")
+    return product_ids
+
+
+def run_load(
+    collection=COLLECTION,
+    mix=None,
+    users=10,
+    duration=10.0,
+    url=None,
+    products=20,
+    deposits=10,
+    think_time=0.0,
+    seed=0,
+    server_config=None,
+):
+    """
+    Replay the collection with concurrent virtual users
+
+    :param str collection: Postman collection file
+    :param dict mix: Scenario weights by FOLDER/NAME
+    :param int users: Concurrent virtual users
+    :param float duration: Measured seconds
+    :param str url: Server base URL, a local server is started by default
+    :param int products: Products created before the run
+    :param int deposits: 100 cent deposits made by each user before the run
+    :param float think_time: Seconds each user waits between requests
+    :param int seed: Random seed of the scenario choices
+    :param dict server_config: Configuration overrides of the local server
+    :return: Run metadata and results per scenario
+    :rtype: dict
+    """
+    templates = load_collection(collection)
+    mix = mix or DEFAULT_MIX
+    unknown = sorted(set(mix) - set(templates))
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(unknown)}")
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    server = LocalServer(server_config) if url is None else None
+    base_url = server.start() if server else url.rstrip("/")
+    try:
+        run_id = uuid.uuid4().hex[:4]
+        product_ids = setup_catalog(base_url, templates, products, run_id)
+
+        recorder = Recorder()
+        virtual_users = []
+        for index in range(users):
+            virtual_user = VirtualUser(base_url, templates, recorder)
+            virtual_user.register(f"vu{index}.{run_id}@lg.example", "BUYER")
+            for _ in range(deposits):
+                virtual_user.send("ACTION/DEPOSIT", {"amount": 100}, record=False)
+            virtual_users.append(virtual_user)
+
+        deadline = time.monotonic() + duration
+
+        def work(index, virtual_user):
+            rng = random.Random(seed + index)
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                virtual_user.send(
+                    name, render(templates[name], product_ids, rng), record=True
+                )
+                if think_time:
+                    time.sleep(think_time)
+
+        threads = [
+            threading.Thread(target=work, args=(index, virtual_user))
+            for index, virtual_user in enumerate(virtual_users)
+        ]
+        started_at = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started_at
+    finally:
+        if server:
+            server.stop()
+
+    results = recorder.report(elapsed)
+    total = sum(result["requests"] for result in results.values())
+    errors = sum(result["errors"] for result in results.values())
+    return {
+        "meta": {
+            "url": url or "local",
+            "users": users,
+            "duration": round(elapsed, 3),
+            "mix": mix,
+            "products": products,
+            "seed": seed,
+        },
+        "total": {
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "throughput": round(total / elapsed, 2),
+        },
+        "results": results,
+    }
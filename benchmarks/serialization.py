@@ -0,0 +1,108 @@
+"""
+Response serialization micro-benchmark
+
+Marshals and encodes a product list the way the list endpoint does, with
+api.marshal and jsonify and with the compiled marshaller and the orjson
+encoder. No database is needed, the products are built in memory.
+"""
+
+import time
+
+from apps import create_app
+from apps.api.dto import ProductDto
+from apps.api.services.product_service import ProductRow
+from apps.api.utils import compile_model, json_response
+from apps.api.utils.encoding import orjson
+
+from .suite import percentile
+
+
+def time_calls(operation, iterations, warmup):
+    """
+    Median and p95 latency of an operation
+
+    :param callable operation: Operation to run
+    :param int iterations: Measured calls
+    :param int warmup: Calls made before measuring
+    """
+    for _ in range(warmup):
+        operation()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+    }
+
+
+def compare_serialization(products=1000, iterations=200, warmup=10):
+    """
+    Time the marshalling and the encoding of a product list
+
+    :param int products: Products in the list
+    :param int iterations: Measured calls per case
+    :param int warmup: Calls made before measuring
+    :return: Run metadata, latencies per case and speedups
+    :rtype: dict
+    """
+    app = create_app("testing")
+    model = ProductDto.product
+    compiled = compile_model(model)
+    rows = [
+        ProductRow(index + 1, 10, 5 * (1 + index % 20), f"Product {index}", 2)
+        for index in range(products)
+    ]
+
+    def restx_marshal():
+        return ProductDto.api.marshal(rows, model)
+
+    def compiled_marshal():
+        return compiled(rows)
+
+    def encode(backend, marshaller):
+        def operation():
+            app.config["JSON_BACKEND"] = backend
+            return json_response({"code": "success", "response": marshaller()})
+
+        return operation
+
+    cases = {
+        "marshal.restx": restx_marshal,
+        "marshal.compiled": compiled_marshal,
+        "response.restx_stdlib": encode("stdlib", restx_marshal),
+        "response.compiled_stdlib": encode("stdlib", compiled_marshal),
+    }
+    if orjson is not None:
+        cases["response.compiled_orjson"] = encode("auto", compiled_marshal)
+
+    with app.app_context():
+        results = {
+            name: time_calls(operation, iterations, warmup)
+            for name, operation in cases.items()
+        }
+
+    baseline = results["response.restx_stdlib"]["p50_ms"]
+    speedups = {
+        "marshal": round(
+            results["marshal.restx"]["p50_ms"] / results["marshal.compiled"]["p50_ms"],
+            2,
+        )
+    }
+    for name in ("response.compiled_stdlib", "response.compiled_orjson"):
+        if name in results:
+            speedups[name] = round(baseline / results[name]["p50_ms"], 2)
+
+    return {
+        "meta": {
+            "products": products,
+            "iterations": iterations,
+            "warmup": warmup,
+            "orjson": orjson.__version__ if orjson is not None else None,
+        },
+        "results": results,
+        "speedups": speedups,
+    }
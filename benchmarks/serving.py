@@ -0,0 +1,254 @@
+"""
+Sync and async serving modes compared
+
+The same application and database are served by the threaded werkzeug
+server (WSGI) and by uvicorn with the ASGI entry point, then loaded with
+the same number of concurrent connections. Needs the optional ASGI
+dependencies: asgiref, aiosqlite and uvicorn.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import email_validator
+import requests
+from werkzeug.serving import make_server
+
+from apps import create_app, db
+from apps.api import blueprint
+
+from .loadgen import QuietRequestHandler
+from .suite import BUYER, PASSWORD, check_disposable, percentile, seed
+
+SCENARIOS = {
+    "product": ("GET", "/api/product/{product}", None),
+    "deposit": ("POST", "/api/action/deposit", b'{"amount": 5}'),
+}
+
+
+class WsgiServer:
+    """Threaded werkzeug server on a free local port"""
+
+    def __init__(self, app):
+        self._server = make_server(
+            "127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self.port = self._server.server_port
+
+    def start(self):
+        """Start serving"""
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving"""
+        self._server.shutdown()
+        self._thread.join()
+
+
+class AsgiServer:
+    """uvicorn server on a free local port"""
+
+    def __init__(self, app):
+        import uvicorn
+
+        from apps.asgi import create_asgi_app
+
+        self._server = uvicorn.Server(
+            uvicorn.Config(
+                create_asgi_app(app),
+                host="127.0.0.1",
+                port=0,
+                log_level="warning",
+                lifespan="on",
+                backlog=4096,
+            )
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self.port = None
+
+    def start(self):
+        """Start serving and wait for the listening socket"""
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+
+    def stop(self):
+        """Stop serving"""
+        self._server.should_exit = True
+        self._thread.join()
+
+
+async def fetch(port, method, path, cookie, body):
+    """
+    Send one request on a new connection and read the status code
+
+    :param int port: Server port
+    :param str method: HTTP method
+    :param str path: Request path
+    :param str cookie: Cookie request header
+    :param bytes body: Request body
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+            f"Cookie: {cookie}\r\nConnection: close\r\n"
+        )
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        writer.write(head.encode() + b"\r\n" + (body or b""))
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def load(port, scenario, cookie, concurrency, total, products):
+    """
+    Send requests with a fixed number of open connections
+
+    :param int port: Server port
+    :param str scenario: Name of the scenario
+    :param str cookie: Cookie request header
+    :param int concurrency: Concurrent connections
+    :param int total: Requests to send
+    :param int products: Number of seeded products
+    """
+    method, path, body = SCENARIOS[scenario]
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def connection():
+        nonlocal errors
+        for index in counter:
+            start = time.perf_counter()
+            try:
+                status = await fetch(
+                    port,
+                    method,
+                    path.format(product=1 + index % products),
+                    cookie,
+                    body,
+                )
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def compare_serving(
+    database_uri=None,
+    concurrency=100,
+    requests_per_scenario=2000,
+    products=100,
+    allow_drop=False,
+):
+    """
+    Load the WSGI and ASGI servers with the same scenarios
+
+    :param str database_uri: Database to seed and use, a temporary SQLite
+        file by default
+    :param int concurrency: Concurrent connections
+    :param int requests_per_scenario: Requests sent per scenario and mode
+    :param int products: Number of products to seed
+    :param bool allow_drop: Drop the tables of database_uri, it is refused
+        otherwise
+    :return: Run metadata and results per mode and scenario
+    :rtype: dict
+    """
+    tmpdir = None
+    engine_options = {}
+    if database_uri is not None:
+        check_disposable(database_uri, allow_drop)
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="vending-serving-")
+        database_uri = f"sqlite:///{os.path.join(tmpdir, 'serving.db')}"
+        engine_options = {"connect_args": {"timeout": 30}}
+
+    app = create_app(
+        "testing",
+        config={
+            "SQLALCHEMY_DATABASE_URI": database_uri,
+            "SQLALCHEMY_ENGINE_OPTIONS": engine_options,
+            "IDEMPOTENCY_ENABLED": False,
+        },
+    )
+    app.register_blueprint(blueprint)
+
+    check_deliverability = email_validator.CHECK_DELIVERABILITY
+    email_validator.CHECK_DELIVERABILITY = False
+    results = {}
+    try:
+        with app.app_context():
+            seed(products, 0, deposit=0)
+            db.session.remove()
+
+        for mode, server_class in (("sync", WsgiServer), ("async", AsgiServer)):
+            server = server_class(app)
+            server.start()
+            try:
+                session = requests.Session()
+                session.post(
+                    f"http://127.0.0.1:{server.port}/api/user/login",
+                    json={"username": BUYER, "password": PASSWORD},
+                )
+                cookie = "; ".join(f"{k}={v}" for k, v in session.cookies.items())
+                results[mode] = {
+                    scenario: asyncio.run(
+                        load(
+                            server.port,
+                            scenario,
+                            cookie,
+                            concurrency,
+                            requests_per_scenario,
+                            products,
+                        )
+                    )
+                    for scenario in SCENARIOS
+                }
+            finally:
+                server.stop()
+    finally:
+        email_validator.CHECK_DELIVERABILITY = check_deliverability
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            database = db.engine.url.get_backend_name()
+            db.engine.dispose()
+        if tmpdir:
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+
+    return {
+        "meta": {
+            "database": database,
+            "concurrency": concurrency,
+            "requests_per_scenario": requests_per_scenario,
+            "products": products,
+        },
+        "results": results,
+    }
@@ -0,0 +1,107 @@
+"""
+Cold start profile
+
+Imports the application in a fresh interpreter with -X importtime and
+reports the wall time and where the import time goes.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_STATEMENT = "import app"
+
+
+def parse_importtime(output):
+    """
+    Parse the -X importtime lines of an interpreter
+
+    :param str output: Standard error of the interpreter
+    :return: Modules in import order with their self and cumulative time
+    :rtype: list
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            }
+        )
+    return modules
+
+
+def measure_startup(statement=STARTUP_STATEMENT, importtime=False):
+    """
+    Run a statement in a fresh interpreter
+
+    :param str statement: Python statement starting the application
+    :param bool importtime: Record the import times
+    :return: Wall time in milliseconds and the interpreter standard error
+    :rtype: tuple
+    """
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        args + ["-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall_ms = (time.perf_counter() - started_at) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return wall_ms, result.stderr
+
+
+def profile_startup(statement=STARTUP_STATEMENT, top=20):
+    """
+    Import time breakdown of the application start
+
+    :param str statement: Python statement starting the application
+    :param int top: Number of modules and packages reported
+    :return: Wall time, import time per top level package and the
+        slowest modules
+    :rtype: dict
+    """
+    wall_ms, _ = measure_startup(statement)
+    _, output = measure_startup(statement, importtime=True)
+    modules = parse_importtime(output)
+
+    packages = {}
+    for module in modules:
+        package = module["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + module["self_ms"]
+
+    return {
+        "statement": statement,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(module["self_ms"] for module in modules), 1),
+        "modules": len(modules),
+        "packages": [
+            {"package": package, "self_ms": round(self_ms, 1)}
+            for package, self_ms in sorted(
+                packages.items(), key=lambda item: item[1], reverse=True
+            )[:top]
+        ],
+        "slowest": [
+            {
+                "module": module["module"],
+                "self_ms": module["self_ms"],
+                "cumulative_ms": module["cumulative_ms"],
+            }
+            for module in sorted(
+                modules, key=lambda module: module["self_ms"], reverse=True
+            )[:top]
+        ],
+    }
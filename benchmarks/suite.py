@@ -0,0 +1,365 @@
+"""
+Benchmarks of the vending machine hot paths
+
+Seeds a dataset, then runs every benchmark through the service functions
+and through the Flask test client. Each benchmark reports operations per
+second, latency percentiles and SQL statements per operation.
+"""
+
+import json
+import math
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import email_validator
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from apps import create_app
+from apps.api import blueprint
+from apps.api.models import Product, User
+from apps.api.services import (buy_product, deposit_amount, list_products,
+                               paginate_products)
+from apps.extensions import bcrypt, catalog_cache, db
+
+PASSWORD = "Bench1234"
+BUYER = "buyer@bench.example"
+BUYER_ID = 1
+SELLER_ID = 2
+
+
+def percentile(values, pct):
+    """
+    Nearest rank percentile
+
+    :param list values: Sorted values
+    :param float pct: Percentile between 0 and 100
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+class QueryCounter:
+    """Counts the statements issued on an engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _record(self, *args):
+        """Count a statement"""
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+def measure(operation, iterations, warmup, engine):
+    """
+    Run an operation and summarize its latencies
+
+    :param callable operation: Called with the iteration number, responses
+        with an error status are counted
+    :param int iterations: Measured calls
+    :param int warmup: Calls made before measuring
+    :param Engine engine: Engine whose statements are counted
+    """
+    for index in range(warmup):
+        operation(index)
+
+    latencies = []
+    errors = 0
+    with QueryCounter(engine) as queries:
+        started_at = time.perf_counter()
+        for index in range(iterations):
+            start = time.perf_counter()
+            result = operation(warmup + index)
+            latencies.append(time.perf_counter() - start)
+            # endpoints return a response, services return their result
+            if getattr(result, "status_code", 200) >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "ops_per_sec": round(iterations / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "queries_per_op": round(queries.count / iterations, 2),
+    }
+
+
+def check_disposable(database_uri, allow_drop=False):
+    """
+    Refuse to seed a database that may hold real data
+    The seed and the clean up drop every table, only in-memory SQLite
+    databases are used without allow_drop.
+
+    :param str database_uri: Database given by the caller
+    :param bool allow_drop: The caller accepts losing every table
+    """
+    url = make_url(database_uri)
+    in_memory = url.database in (None, "", ":memory:")
+    if not allow_drop and not (url.get_backend_name() == "sqlite" and in_memory):
+        raise ValueError(
+            f"Every table of {url!r} is dropped, pass allow_drop to use it"
+        )
+
+
+def seed(products, users, deposit):
+    """
+    Insert the benchmark dataset
+    One BUYER, one SELLER owning every product and extra BUYER accounts
+    for the login benchmark.
+
+    :param int products: Number of products
+    :param int users: Number of extra users
+    :param int deposit: BUYER deposit
+    """
+    db.drop_all()
+    db.create_all()
+
+    pw_hash = bcrypt.generate_password_hash(PASSWORD).decode("utf-8")
+    rows = [
+        {"id": BUYER_ID, "username": BUYER, "role": "BUYER", "deposit": deposit},
+        {
+            "id": SELLER_ID,
+            "username": "seller@bench.example",
+            "role": "SELLER",
+            "deposit": 0,
+        },
+    ] + [
+        {
+            "id": 3 + index,
+            "username": f"user{index}@bench.example",
+            "role": "BUYER",
+            "deposit": 0,
+        }
+        for index in range(users)
+    ]
+    for row in rows:
+        row["password"] = pw_hash
+    db.session.execute(User.__table__.insert(), rows)
+
+    db.session.execute(
+        Product.__table__.insert(),
+        [
+            {
+                "id": index + 1,
+                "amountAvailable": 10**9,
+                "cost": 5 * (1 + index % 20),
+                "productName": f"Product {index}",
+                "sellerId": SELLER_ID,
+            }
+            for index in range(products)
+        ],
+    )
+    db.session.commit()
+
+
+def service_benchmarks(products):
+    """
+    Benchmarks calling the service functions
+
+    :param int products: Number of seeded products
+    """
+
+    def buyer():
+        return db.session.get(User, BUYER_ID)
+
+    def list_warm(index):
+        list_products()
+
+    def list_cold(index):
+        catalog_cache.clear()
+        list_products()
+
+    def paginate(index):
+        catalog_cache.clear()
+        paginate_products(limit=50)
+
+    def buy(index):
+        buy_product({"product_id": 1 + index % products, "quantity": 1}, buyer())
+
+    def deposit(index):
+        deposit_amount({"amount": 5}, buyer())
+
+    return {
+        "service.list_products": list_warm,
+        "service.list_products_uncached": list_cold,
+        "service.paginate_products": paginate,
+        "service.buy_product": buy,
+        "service.deposit_amount": deposit,
+    }
+
+
+def http_benchmarks(app, products):
+    """
+    Benchmarks driving the endpoints with the Flask test client
+
+    :param Flask app: Benchmarked application
+    :param int products: Number of seeded products
+    """
+    credentials = {"username": BUYER, "password": PASSWORD}
+    buyer = app.test_client()
+    buyer.post("/api/user/login", json=credentials)
+
+    def login(index):
+        return app.test_client().post("/api/user/login", json=credentials)
+
+    def list_page(index):
+        return buyer.get("/api/product/?limit=50")
+
+    def get_item(index):
+        return buyer.get(f"/api/product/{1 + index % products}")
+
+    def buy(index):
+        return buyer.post(
+            "/api/action/buy",
+            json={"product_id": 1 + index % products, "quantity": 1},
+        )
+
+    def deposit(index):
+        return buyer.post("/api/action/deposit", json={"amount": 5})
+
+    return {
+        "http.login": login,
+        "http.list_products": list_page,
+        "http.get_product": get_item,
+        "http.buy": buy,
+        "http.deposit": deposit,
+    }
+
+
+def run_benchmarks(
+    database_uri=None,
+    products=1000,
+    users=10,
+    iterations=200,
+    warmup=10,
+    only=None,
+    allow_drop=False,
+):
+    """
+    Seed a database and run the benchmarks
+
+    :param str database_uri: Database to use, a temporary SQLite file by default
+    :param int products: Number of products to seed
+    :param int users: Number of extra users to seed
+    :param int iterations: Measured calls per benchmark
+    :param int warmup: Calls made before measuring
+    :param list only: Names of the benchmarks to run, all by default
+    :param bool allow_drop: Drop the tables of database_uri, it is refused
+        otherwise
+    :return: Run metadata and results per benchmark
+    :rtype: dict
+    """
+    tmpdir = None
+    if database_uri is not None:
+        check_disposable(database_uri, allow_drop)
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="vending-bench-")
+        database_uri = f"sqlite:///{os.path.join(tmpdir, 'benchmark.db')}"
+
+    app = create_app(
+        "testing",
+        config={
+            "SQLALCHEMY_DATABASE_URI": database_uri,
+            "SQLALCHEMY_ENGINE_OPTIONS": {},
+            "BCRYPT_LOG_ROUNDS": int(os.environ.get("BCRYPT_LOG_ROUNDS", 12)),
+        },
+    )
+    app.register_blueprint(blueprint)
+
+    def selected(benchmarks):
+        return {
+            name: operation
+            for name, operation in benchmarks.items()
+            if not only or name in only
+        }
+
+    # DNS lookups of the login email check would dominate the results
+    check_deliverability = email_validator.CHECK_DELIVERABILITY
+    email_validator.CHECK_DELIVERABILITY = False
+
+    results = {}
+    try:
+        with app.app_context():
+            # both buy benchmarks spend at most the highest product cost per call
+            seed(products, users, deposit=2 * (iterations + warmup) * 100)
+            engine = db.engine
+            for name, operation in selected(service_benchmarks(products)).items():
+                results[name] = measure(operation, iterations, warmup, engine)
+            db.session.remove()
+
+        # requests push their own context, like in production
+        for name, operation in selected(http_benchmarks(app, products)).items():
+            results[name] = measure(operation, iterations, warmup, engine)
+    finally:
+        email_validator.CHECK_DELIVERABILITY = check_deliverability
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        if tmpdir:
+            os.remove(os.path.join(tmpdir, "benchmark.db"))
+            os.rmdir(tmpdir)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.url.get_backend_name(),
+            "products": products,
+            "users": users,
+            "iterations": iterations,
+            "warmup": warmup,
+            "bcrypt_log_rounds": app.config["BCRYPT_LOG_ROUNDS"],
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline):
+    """
+    Relative change of throughput and p95 latency against a baseline run
+
+    :param dict current: Benchmark run
+    :param dict baseline: Previous benchmark run
+    """
+    changes = {}
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        changes[name] = {
+            "ops_per_sec": round(result["ops_per_sec"] / previous["ops_per_sec"], 3),
+            "p95_ms": round(result["p95_ms"] / previous["p95_ms"], 3),
+            "queries_per_op": round(
+                result["queries_per_op"] - previous["queries_per_op"], 2
+            ),
+        }
+    return changes
+
+
+def dumps(run):
+    """
+    Serialize a benchmark run
+
+    :param dict run: Benchmark run
+    """
+    return json.dumps(run, indent=2, sort_keys=True)
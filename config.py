@@ -2,6 +2,8 @@
 from os import environ, path
 
 from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
 
 basedir = path.dirname(path.abspath(__file__))
 ENV = environ.get("FLASK_ENV", "default")
@@ -14,6 +16,26 @@ else:
 load_dotenv(path.join(basedir, dotenv_file))
 
 
+def worker_database_uri(uri, worker_id):
+    """
+    Database of a parallel test worker
+    The database name, or the SQLite file name, gets the worker suffix.
+    In-memory SQLite databases are already private to each process.
+
+    :param str uri: Test database URI
+    :param str worker_id: Worker identifier
+    """
+    url = make_url(uri)
+    if not url.database or url.database == ":memory:":
+        return uri
+    if url.get_backend_name() == "sqlite":
+        root, ext = path.splitext(url.database)
+        url = url.set(database=f"{root}_w{worker_id}{ext}")
+    else:
+        url = url.set(database=f"{url.database}_w{worker_id}")
+    return url.render_as_string(hide_password=False)
+
+
 class Config:
     """Configuration class."""
 
@@ -30,6 +52,52 @@ class Config:
         f"{environ.get('DATABASE_HOST')}:{environ.get('DATABASE_PORT')}/{environ.get('DATABASE_NAME')}"
     )
     SECRET_KEY = environ.get("SECRET_KEY")
+    DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(environ.get("DB_POOL_RECYCLE", 280))
+    DB_POOL_PRE_PING = environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_POOL_WARMUP = int(environ.get("DB_POOL_WARMUP", 0))
+    PRODUCT_PAGE_SIZE = int(environ.get("PRODUCT_PAGE_SIZE", 50))
+    PRODUCT_MAX_PAGE_SIZE = int(environ.get("PRODUCT_MAX_PAGE_SIZE", 500))
+    PRODUCT_STREAM_BATCH_SIZE = int(environ.get("PRODUCT_STREAM_BATCH_SIZE", 1000))
+    BULK_CHUNK_SIZE = int(environ.get("BULK_CHUNK_SIZE", 1000))
+    BATCH_BUY_MAX_ITEMS = int(environ.get("BATCH_BUY_MAX_ITEMS", 100))
+    COIN_DENOMINATIONS = tuple(
+        sorted(map(int, environ.get("COIN_DENOMINATIONS", "5,10,20,50,100").split(",")))
+    )[::-1]
+    COIN_INVENTORY_ENABLED = environ.get("COIN_INVENTORY_ENABLED", "0") == "1"
+    DEPOSIT_LEDGER_ENABLED = environ.get("DEPOSIT_LEDGER_ENABLED", "0") == "1"
+    DEPOSIT_LEDGER_COMPACT_AGE = float(environ.get("DEPOSIT_LEDGER_COMPACT_AGE", 60))
+    IDEMPOTENCY_ENABLED = environ.get("IDEMPOTENCY_ENABLED", "1") == "1"
+    IDEMPOTENCY_TTL = int(environ.get("IDEMPOTENCY_TTL", 24 * 3600))
+    IDEMPOTENCY_CLAIM_TIMEOUT = int(environ.get("IDEMPOTENCY_CLAIM_TIMEOUT", 60))
+    IDEMPOTENCY_MAX_ENTRIES = int(environ.get("IDEMPOTENCY_MAX_ENTRIES", 10000))
+    IDEMPOTENCY_MAX_BYTES = int(environ.get("IDEMPOTENCY_MAX_BYTES", 16 * 1024 * 1024))
+    CATALOG_CACHE_BACKEND = environ.get("CATALOG_CACHE_BACKEND", "lru")
+    CATALOG_CACHE_TTL = int(environ.get("CATALOG_CACHE_TTL", 10))
+    CATALOG_CACHE_MAX_ENTRIES = int(environ.get("CATALOG_CACHE_MAX_ENTRIES", 1024))
+    CATALOG_CACHE_MAX_BYTES = int(
+        environ.get("CATALOG_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    BCRYPT_LOG_ROUNDS = int(environ.get("BCRYPT_LOG_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(environ.get("PASSWORD_HASH_WORKERS", 4))
+    PASSWORD_HASH_QUEUE = int(environ.get("PASSWORD_HASH_QUEUE", 16))
+    PASSWORD_HASH_TIMEOUT = float(environ.get("PASSWORD_HASH_TIMEOUT", 0.05))
+    PASSWORD_REHASH_ON_LOGIN = environ.get("PASSWORD_REHASH_ON_LOGIN", "1") == "1"
+    QUERY_PROFILER_ENABLED = environ.get("QUERY_PROFILER_ENABLED", "1") == "1"
+    QUERY_PROFILER_WARN_QUERIES = int(environ.get("QUERY_PROFILER_WARN_QUERIES", 20))
+    METRICS_ENABLED = environ.get("METRICS_ENABLED", "0") == "1"
+    METRICS_MULTIPROC_DIR = environ.get("METRICS_MULTIPROC_DIR")
+    METRICS_FLUSH_INTERVAL = float(environ.get("METRICS_FLUSH_INTERVAL", 1))
+    JSON_BACKEND = environ.get("JSON_BACKEND", "auto")
+    COMPRESSION_ENABLED = environ.get("COMPRESSION_ENABLED", "1") == "1"
+    COMPRESSION_MIN_SIZE = int(environ.get("COMPRESSION_MIN_SIZE", 500))
+    COMPRESSION_LEVEL = int(environ.get("COMPRESSION_LEVEL", 6))
+    COMPRESSION_BROTLI_QUALITY = int(environ.get("COMPRESSION_BROTLI_QUALITY", 5))
+    DOCS_ENABLED = environ.get("DOCS_ENABLED", "1") == "1"
+    DOCS_SPEC_FILE = environ.get("DOCS_SPEC_FILE")
+    INTERNAL_ENDPOINTS_ENABLED = environ.get("INTERNAL_ENDPOINTS_ENABLED", "0") == "1"
 
 
 class DevelopmentConfig(Config):
@@ -43,12 +111,35 @@ class TestConfig(Config):
 
     TESTING = True
     SECRET_KEY = environ.get("SECRET_KEY")
+    # Lowest bcrypt cost keeps hashing out of the test run time
+    BCRYPT_LOG_ROUNDS = 4
+    # The request hooks and /metrics are registered when the app is created
+    METRICS_ENABLED = True
 
     # For test purpose use a new database
-    SQLALCHEMY_DATABASE_URI = (
-        f"mysql+pymysql://{environ.get('DATABASE_USERNAME')}:{environ.get('DATABASE_PASSWORD')}@"
-        f"{environ.get('DATABASE_HOST')}:{environ.get('DATABASE_PORT')}/{environ.get('TEST_DATABASE_NAME')}"
-    )
+    # MySQL when a database host is configured, in-memory SQLite otherwise
+    if environ.get("TEST_DATABASE_URI"):
+        SQLALCHEMY_DATABASE_URI = environ.get("TEST_DATABASE_URI")
+    elif environ.get("DATABASE_HOST"):
+        SQLALCHEMY_DATABASE_URI = (
+            f"mysql+pymysql://{environ.get('DATABASE_USERNAME')}:{environ.get('DATABASE_PASSWORD')}@"
+            f"{environ.get('DATABASE_HOST')}:{environ.get('DATABASE_PORT')}/{environ.get('TEST_DATABASE_NAME')}"
+        )
+    else:
+        SQLALCHEMY_DATABASE_URI = "sqlite://"
+
+    # Parallel test workers each get their own database
+    if environ.get("TEST_WORKER_ID"):
+        SQLALCHEMY_DATABASE_URI = worker_database_uri(
+            SQLALCHEMY_DATABASE_URI, environ["TEST_WORKER_ID"]
+        )
+
+    if SQLALCHEMY_DATABASE_URI == "sqlite://":
+        # The in-memory database lives in its connection, share it
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
     PRESERVE_CONTEXT_ON_EXCEPTION = False
 
 
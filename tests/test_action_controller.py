@@ -0,0 +1,119 @@
+"""Action controller tests"""
+import json
+
+from tests.utils.base import BaseTestCase
+
+
+class TestActionController(BaseTestCase):
+    """Tests for action controller"""
+
+    def deposit(self, amount):
+        """Deposit a coin as the logged in user"""
+        return self.client.post(
+            "/api/action/deposit",
+            content_type="application/json",
+            data=json.dumps({"amount": amount}),
+        )
+
+    def test_buy_batch_success(self):
+        """Test buying a basket through the API"""
+        self.login("user0_buyer@gmail.com")
+        self.deposit(50)
+
+        resp = self.client.post(
+            "/api/action/buy/batch",
+            content_type="application/json",
+            data=json.dumps(
+                {
+                    "items": [
+                        {"product_id": 200, "quantity": 1},
+                        {"product_id": 201, "quantity": 2},
+                    ]
+                }
+            ),
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        report = resp.get_json()["response"]
+        self.assertEqual(report["spending"], 20)
+        self.assertEqual(report["change"], {"20": 1, "10": 1})
+        self.assertEqual(report["lines"][0]["product"]["amountAvailable"], 19)
+        self.assertEqual(report["lines"][1]["product"]["productName"], "Sprite")
+
+    def test_buy_change_as_list(self):
+        """Test the change is returned one coin per entry on request"""
+        self.login("user0_buyer@gmail.com")
+        self.deposit(50)
+
+        resp = self.client.post(
+            "/api/action/buy?change_format=list",
+            content_type="application/json",
+            data=json.dumps({"product_id": 201, "quantity": 1}),
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["response"]["change"], [20, 20, 5])
+
+    def test_buy_fields(self):
+        """Test the fields parameter restricts the bought products"""
+        self.login("user0_buyer@gmail.com")
+        self.deposit(50)
+
+        resp = self.client.post(
+            "/api/action/buy?fields=id,amountAvailable",
+            content_type="application/json",
+            data=json.dumps({"product_id": 201, "quantity": 1}),
+        )
+        self.assertEqual(
+            resp.get_json()["response"]["product"], {"id": 201, "amountAvailable": 39}
+        )
+
+        resp = self.client.post(
+            "/api/action/buy?fields=deposit",
+            content_type="application/json",
+            data=json.dumps({"product_id": 201, "quantity": 1}),
+        )
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(resp.get_json()["code"], "invalidField")
+
+    def test_buy_batch_reports_failed_lines(self):
+        """Test failed basket lines are reported as errors"""
+        self.login("user0_buyer@gmail.com")
+        self.deposit(50)
+
+        resp = self.client.post(
+            "/api/action/buy/batch",
+            content_type="application/json",
+            data=json.dumps(
+                {
+                    "items": [
+                        {"product_id": 200, "quantity": 1},
+                        {"product_id": 201, "quantity": 400},
+                    ]
+                }
+            ),
+        )
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(
+            resp.get_json()["errors"],
+            [
+                {
+                    "product_id": 201,
+                    "quantity": 400,
+                    "error": "Not enough items available",
+                }
+            ],
+        )
+
+    def test_buy_batch_seller_not_allowed(self):
+        """Test sellers cannot buy"""
+        self.login("user1_seller@gmail.com")
+
+        resp = self.client.post(
+            "/api/action/buy/batch",
+            content_type="application/json",
+            data=json.dumps({"items": [{"product_id": 200, "quantity": 1}]}),
+        )
+
+        self.assertEqual(resp.status_code, 403)
@@ -1,6 +1,14 @@
 """Actions tests"""
+import os
+import tempfile
+import threading
+import unittest
+
+from app import create_app, db
 from apps.api.models import Product, User
-from apps.api.services import buy_product, deposit_amount, reset_deposit
+from apps.api.services import (buy_product, buy_products, deposit_amount,
+                               reset_deposit)
+from apps.api.services.action_service import _stock_error
 from tests.utils.base import BaseTestCase
 
 
@@ -20,9 +28,9 @@ class TestActionService(BaseTestCase):
         product = Product.query.filter_by(id=payload["product_id"]).first()
 
         change, spent, product = buy_product(payload, user)
-        self.assertEqual(isinstance(change, list), True)
+        self.assertEqual(change, {50: 1, 20: 2, 5: 1})
 
-        total_change = sum(change)
+        total_change = sum(coin * count for coin, count in change.items())
 
         self.assertEqual(product.cost * payload["quantity"], spent)
         self.assertEqual(total_change, user.deposit)
@@ -41,6 +49,32 @@ class TestActionService(BaseTestCase):
         self.assertEqual(product, False)
         self.assertEqual(change, False)
 
+    def test_buy_product_invalid_quantity(self):
+        """Test buying a zero or negative quantity changes nothing"""
+        user = User.query.filter_by(id=100).first()
+        deposit_amount({"amount": 100}, user)
+
+        for quantity in [0, -5, "1"]:
+            payload = {"product_id": 201, "quantity": quantity}
+            change, spent, product = buy_product(payload, user)
+            self.assertEqual(product, False)
+
+        product = Product.query.filter_by(id=201).first()
+        self.assertEqual(product.amountAvailable, 40)
+        self.assertEqual(user.deposit, 100)
+
+    def test_buy_product_not_enough_stock(self):
+        """Test buying more items than available leaves deposit untouched"""
+        user = User.query.filter_by(id=100).first()
+        deposit_amount({"amount": 100}, user)
+
+        payload = {"product_id": 200, "quantity": 21}
+        change, spent, product = buy_product(payload, user)
+
+        self.assertEqual(product, False)
+        self.assertEqual(Product.query.filter_by(id=200).first().amountAvailable, 20)
+        self.assertEqual(user.deposit, 100)
+
     def test_buy_product_non_existent_product(self):
         """Test buying a product that does not exist"""
         user = User.query.filter_by(id=100).first()
@@ -51,6 +85,91 @@ class TestActionService(BaseTestCase):
         with self.assertRaises(TypeError):
             change, spent, product = buy_product(payload, user)
 
+    # #######################################################
+    # # BUY BATCH
+    # #######################################################
+    def test_buy_products_success(self):
+        """Test buying a basket in one go"""
+        user = User.query.filter_by(id=100).first()
+        deposit_amount({"amount": 100}, user)
+
+        items = [
+            {"product_id": 200, "quantity": 2},
+            {"product_id": 201, "quantity": 3},
+            {"product_id": 200, "quantity": 1},
+        ]
+        change, spent, lines = buy_products(items, user)
+
+        self.assertEqual(spent, 3 * 10 + 3 * 5)
+        self.assertEqual([line["spending"] for line in lines], [20, 15, 10])
+        self.assertEqual(lines[0]["product"].amountAvailable, 17)
+        self.assertEqual(lines[1]["product"].amountAvailable, 37)
+        self.assertEqual(change, {50: 1, 5: 1})
+        self.assertEqual(user.deposit, 100 - 45)
+
+    def test_buy_products_all_or_nothing(self):
+        """Test nothing is bought when one line cannot be bought"""
+        user = User.query.filter_by(id=100).first()
+        deposit_amount({"amount": 100}, user)
+
+        items = [
+            {"product_id": 200, "quantity": 1},
+            {"product_id": 201, "quantity": 41},
+            {"product_id": 4000, "quantity": 1},
+        ]
+        change, spent, lines = buy_products(items, user)
+
+        self.assertEqual(change, False)
+        self.assertEqual(spent, False)
+        self.assertNotIn("error", lines[0])
+        self.assertEqual(lines[1]["error"], "Not enough items available")
+        self.assertEqual(lines[2]["error"], "Product not found")
+        self.assertEqual(Product.query.filter_by(id=200).first().amountAvailable, 20)
+        self.assertEqual(Product.query.filter_by(id=201).first().amountAvailable, 40)
+        self.assertEqual(user.deposit, 100)
+
+    def test_buy_products_price_changed(self):
+        """Test a price changed since the basket was read is reported as such"""
+        product = Product.query.filter_by(id=201).first()
+        Product.query.filter_by(id=201).update(
+            {Product.cost: 50}, synchronize_session=False
+        )
+
+        self.assertEqual(_stock_error(product, 1), "Price changed")
+        self.assertEqual(_stock_error(product, 100), "Price changed")
+        product.cost = 50
+        self.assertEqual(_stock_error(product, 100), "Not enough items available")
+        Product.query.filter_by(id=201).delete(synchronize_session=False)
+        self.assertEqual(_stock_error(product, 1), "Product not found")
+
+    def test_buy_products_not_enough_money(self):
+        """Test nothing is bought when the basket costs more than the deposit"""
+        user = User.query.filter_by(id=100).first()
+        deposit_amount({"amount": 20}, user)
+
+        items = [
+            {"product_id": 200, "quantity": 1},
+            {"product_id": 201, "quantity": 3},
+        ]
+        change, spent, lines = buy_products(items, user)
+
+        self.assertEqual(spent, False)
+        self.assertEqual(lines[0]["error"], "Not enough money")
+        self.assertEqual(Product.query.filter_by(id=200).first().amountAvailable, 20)
+        self.assertEqual(user.deposit, 20)
+
+    def test_buy_products_invalid_basket(self):
+        """Test malformed baskets are rejected"""
+        user = User.query.filter_by(id=100).first()
+
+        for items in [
+            None,
+            [],
+            [{"product_id": 200}],
+            [{"product_id": "200", "quantity": 1}],
+        ]:
+            self.assertEqual(buy_products(items, user), (False, False, None))
+
     # #######################################################
     # # DEPOSIT
     # #######################################################
@@ -114,3 +233,103 @@ class TestActionService(BaseTestCase):
 
         user_after_reset = User.query.filter_by(id=user_id).first()
         self.assertEqual(user_after_reset.deposit, 0)
+
+
+class TestActionServiceConcurrency(unittest.TestCase):
+    """Concurrency tests for actions - run against a file based SQLite database"""
+
+    THREADS = 30
+
+    def setUp(self):
+        """Set up a database shared by all threads"""
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{self.db_path}"
+        self.app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "connect_args": {"timeout": 30}
+        }
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(
+                User(id=100, username="buyer@gmail.com", password="-", role="BUYER")
+            )
+            db.session.add(
+                User(id=101, username="seller@gmail.com", password="-", role="SELLER")
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        """Remove the shared database"""
+        with self.app.app_context():
+            db.session.remove()
+            db.get_engine(self.app).dispose()
+        os.remove(self.db_path)
+
+    def _seed(self, deposit, amount_available, cost):
+        """Set the buyer deposit and add a product"""
+        with self.app.app_context():
+            User.query.filter_by(id=100).update({User.deposit: deposit})
+            db.session.add(
+                Product(
+                    id=200,
+                    amountAvailable=amount_available,
+                    cost=cost,
+                    productName="Diet Coke",
+                    sellerId=101,
+                )
+            )
+            db.session.commit()
+
+    def _buy_concurrently(self):
+        """Buy one item from every thread at the same time"""
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        errors = []
+
+        def worker():
+            with self.app.app_context():
+                try:
+                    user = User.query.filter_by(id=100).first()
+                    barrier.wait()
+                    _, _, product = buy_product(
+                        {"product_id": 200, "quantity": 1}, user
+                    )
+                    results.append(bool(product))
+                except Exception as exc:  # pylint: disable=broad-except
+                    errors.append(exc)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with self.app.app_context():
+            product = Product.query.filter_by(id=200).first()
+            user = User.query.filter_by(id=100).first()
+            return results.count(True), product.amountAvailable, user.deposit
+
+    def test_buy_product_no_oversell(self):
+        """Test concurrent buyers never take more items than available"""
+        self._seed(deposit=1000, amount_available=10, cost=5)
+
+        sold, amount_available, deposit = self._buy_concurrently()
+
+        self.assertEqual(sold, 10)
+        self.assertEqual(amount_available, 0)
+        self.assertEqual(deposit, 1000 - 10 * 5)
+
+    def test_buy_product_no_overdraw(self):
+        """Test concurrent buys never spend more than the deposit"""
+        self._seed(deposit=50, amount_available=100, cost=10)
+
+        sold, amount_available, deposit = self._buy_concurrently()
+
+        self.assertEqual(sold, 5)
+        self.assertEqual(amount_available, 95)
+        self.assertEqual(deposit, 0)
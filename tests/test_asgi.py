@@ -0,0 +1,200 @@
+"""ASGI serving mode tests"""
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+
+import email_validator
+
+from app import create_app, db
+from apps.api import blueprint
+from apps.api.models import Product, User
+from apps.asgi import async_database_uri
+from tests.utils.base import PASSWORD_HASH
+
+ASGI_DEPENDENCIES = all(
+    importlib.util.find_spec(name) for name in ("asgiref", "aiosqlite")
+)
+
+
+class TestAsyncDatabaseUri(unittest.TestCase):
+    """Tests for the async driver URIs"""
+
+    def test_drivers(self):
+        """Test the async driver of each database"""
+        self.assertEqual(
+            async_database_uri("mysql+pymysql://user:secret@db:3306/vending"),
+            "mysql+aiomysql://user:secret@db:3306/vending",
+        )
+        self.assertEqual(
+            async_database_uri("sqlite:////tmp/vending.db"),
+            "sqlite+aiosqlite:////tmp/vending.db",
+        )
+        with self.assertRaises(ValueError):
+            async_database_uri("postgresql://db/vending")
+
+
+@unittest.skipUnless(ASGI_DEPENDENCIES, "asgiref and aiosqlite are not installed")
+class TestAsgiApp(unittest.TestCase):
+    """Tests for the coroutine endpoints - run against a SQLite file"""
+
+    def setUp(self):
+        """Serve a seeded database"""
+        from apps.asgi import create_asgi_app
+
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.app = create_app(
+            "testing",
+            config={
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.db_path}",
+                "SQLALCHEMY_ENGINE_OPTIONS": {},
+            },
+        )
+        self.app.register_blueprint(blueprint)
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(
+                User(id=100, username="buyer@gmail.com", password=PASSWORD_HASH)
+            )
+            db.session.add(
+                User(
+                    id=101,
+                    username="seller@gmail.com",
+                    password=PASSWORD_HASH,
+                    role="SELLER",
+                )
+            )
+            db.session.add(
+                Product(
+                    id=200,
+                    amountAvailable=10,
+                    cost=15,
+                    productName="Fanta",
+                    sellerId=101,
+                )
+            )
+            db.session.commit()
+
+        self.client = self.app.test_client()
+        check_deliverability = email_validator.CHECK_DELIVERABILITY
+        email_validator.CHECK_DELIVERABILITY = False
+        try:
+            self.client.post(
+                "/api/user/login",
+                json={"username": "buyer@gmail.com", "password": "Test1234"},
+            )
+        finally:
+            email_validator.CHECK_DELIVERABILITY = check_deliverability
+        self.cookie = "; ".join(
+            f"{cookie.name}={cookie.value}" for cookie in self.client.cookie_jar
+        )
+        self.asgi = create_asgi_app(self.app)
+
+    def tearDown(self):
+        """Drop the database"""
+        asyncio.run(self.asgi.engine.dispose())
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        os.remove(self.db_path)
+
+    def request(self, method, path, payload=None, query=b""):
+        """
+        Send a request to the ASGI application
+
+        :return: Status code, headers and body
+        """
+        body = json.dumps(payload).encode() if payload is not None else b""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query,
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"cookie", self.cookie.encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("127.0.0.1", 5000),
+            "server": ("localhost", 80),
+        }
+        messages = []
+        requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.asgi(scope, receive, send))
+        start = messages[0]
+        return (
+            start["status"],
+            dict(start["headers"]),
+            b"".join(message.get("body", b"") for message in messages[1:]),
+        )
+
+    def test_get_product_matches_wsgi(self):
+        """Test the coroutine returns the Flask response body"""
+        status, headers, body = self.request("GET", "/api/product/200")
+
+        expected = self.client.get("/api/product/200")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, expected.get_data())
+        self.assertEqual(headers[b"etag"], expected.headers["ETag"].encode())
+
+    def test_buy_and_deposit(self):
+        """Test coroutine actions update the database"""
+        status, _, _ = self.request("POST", "/api/action/deposit", {"amount": 50})
+        self.assertEqual(status, 201)
+        status, _, _ = self.request("POST", "/api/action/deposit", {"amount": 3})
+        self.assertEqual(status, 400)
+
+        status, _, body = self.request(
+            "POST",
+            "/api/action/buy",
+            {"product_id": 200, "quantity": 2},
+            query=b"change_format=list",
+        )
+        report = json.loads(body)["response"]
+        self.assertEqual(status, 200)
+        self.assertEqual(report["change"], [20])
+        self.assertEqual(report["product"]["amountAvailable"], 8)
+
+        status, _, _ = self.request(
+            "POST", "/api/action/buy", {"product_id": 200, "quantity": 2}
+        )
+        self.assertEqual(status, 400)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(User, 100).deposit, 20)
+
+    def test_search_change(self):
+        """Test change the greedy split misses is searched off the event loop"""
+        self.app.config["COIN_DENOMINATIONS"] = (4, 3)
+
+        self.assertEqual(asyncio.run(self.asgi.search_change(8)), {4: 2})
+        self.assertEqual(asyncio.run(self.asgi.search_change(6)), {3: 2})
+        self.assertEqual(asyncio.run(self.asgi.search_change(5)), None)
+
+    def test_other_requests_served_by_flask(self):
+        """Test uncovered endpoints and anonymous requests fall back to Flask"""
+        status, _, body = self.request("GET", "/api/product/")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["response"][0]["productName"], "Fanta")
+
+        self.cookie = ""
+        status, _, _ = self.request("GET", "/api/product/200")
+        self.assertEqual(status, 401)
@@ -0,0 +1,63 @@
+"""Benchmark suite tests"""
+import unittest
+
+from benchmarks import (compare, compare_serialization, compare_serving,
+                        run_benchmarks)
+from benchmarks.suite import check_disposable, percentile
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Tests for the benchmark suite"""
+
+    def test_run_benchmarks(self):
+        """Test a small run reports every requested benchmark"""
+        run = run_benchmarks(
+            products=5,
+            users=1,
+            iterations=3,
+            warmup=1,
+            only=["service.buy_product", "http.buy", "http.list_products"],
+        )
+
+        self.assertEqual(
+            sorted(run["results"]),
+            ["http.buy", "http.list_products", "service.buy_product"],
+        )
+        for result in run["results"].values():
+            self.assertEqual(result["errors"], 0)
+            self.assertEqual(result["iterations"], 3)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertGreater(run["results"]["service.buy_product"]["queries_per_op"], 0)
+        self.assertEqual(run["meta"]["database"], "sqlite")
+
+        changes = compare(run, run)
+        self.assertEqual(changes["http.buy"]["ops_per_sec"], 1)
+
+    def test_database_uri_needs_allow_drop(self):
+        """Test a database that may hold data is not seeded without allow_drop"""
+        for uri in ("sqlite:////srv/vending.db", "mysql+pymysql://u:p@db/vending"):
+            with self.assertRaises(ValueError):
+                run_benchmarks(database_uri=uri)
+            with self.assertRaises(ValueError):
+                compare_serving(database_uri=uri)
+
+        check_disposable("sqlite://")
+        check_disposable("sqlite:///:memory:")
+        check_disposable("sqlite:////srv/vending.db", allow_drop=True)
+
+    def test_compare_serialization(self):
+        """Test the serialization micro-benchmark reports every case"""
+        run = compare_serialization(products=20, iterations=3, warmup=1)
+
+        self.assertIn("marshal.compiled", run["results"])
+        self.assertIn("response.restx_stdlib", run["results"])
+        self.assertGreater(run["speedups"]["marshal"], 0)
+
+    def test_percentile(self):
+        """Test nearest rank percentiles"""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([], 95), None)
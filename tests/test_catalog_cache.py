@@ -0,0 +1,142 @@
+"""Catalog cache tests"""
+import time
+
+from sqlalchemy import event
+
+from apps.api.models import User
+from apps.api.services import (buy_product, create_product, delete_product,
+                               deposit_amount, get_product, list_products,
+                               update_product)
+from apps.extensions import catalog_cache, db
+from apps.extensions.cache import LRUCache
+from tests.utils.base import BaseTestCase
+
+
+class TestCatalogCache(BaseTestCase):
+    """Tests for the catalog cache"""
+
+    def count_queries(self, func):
+        """Run func and return its result and the number of statements issued"""
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return result, len(statements)
+
+    def test_list_products_served_from_cache(self):
+        """Test a repeated listing only reads the catalog version"""
+        first, first_queries = self.count_queries(list_products)
+        second, second_queries = self.count_queries(list_products)
+
+        self.assertEqual(first_queries, 2)
+        self.assertEqual(second_queries, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(catalog_cache.stats()["hits"], 1)
+
+    def test_get_product_served_from_cache(self):
+        """Test a repeated single product read does not hit the database"""
+        product, _ = self.count_queries(lambda: get_product(200))
+        _, queries = self.count_queries(lambda: get_product(200))
+
+        self.assertEqual(product.productName, "Diet Coke")
+        self.assertEqual(queries, 0)
+        self.assertEqual(get_product(4000), None)
+
+    def test_cache_invalidated_on_writes(self):
+        """Test create, update, delete and buy invalidate cached products"""
+        seller = User.query.filter_by(id=101).first()
+        self.assertEqual(len(list_products()), 2)
+
+        product = create_product(
+            dict(amountAvailable=5, cost=5, productName="Water"), seller
+        )
+        product_id = product.id
+        self.assertEqual(len(list_products()), 3)
+
+        get_product(product_id)
+        update_product(
+            dict(
+                product_id=product_id,
+                amountAvailable=5,
+                cost=5,
+                productName="Sparkling Water",
+            ),
+            seller,
+        )
+        self.assertEqual(get_product(product_id).productName, "Sparkling Water")
+
+        buyer = User.query.filter_by(id=100).first()
+        deposit_amount({"amount": 20}, buyer)
+        buy_product({"product_id": product_id, "quantity": 2}, buyer)
+        self.assertEqual(get_product(product_id).amountAvailable, 3)
+
+        delete_product({"product_id": product_id}, seller)
+        self.assertEqual(get_product(product_id), None)
+        self.assertEqual(len(list_products()), 2)
+
+    def test_cache_stats_endpoint(self):
+        """Test cache counters are exposed"""
+        self.app.config["INTERNAL_ENDPOINTS_ENABLED"] = True
+        self.login("user0_buyer@gmail.com")
+        list_products()
+        list_products()
+
+        resp = self.client.get("/api/internal/cache")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["response"]["hits"], 1)
+        self.assertEqual(resp.get_json()["response"]["misses"], 1)
+
+    def test_cache_stats_endpoint_protected(self):
+        """Test the counters are off by default and need a logged in user"""
+        resp = self.client.get("/api/internal/cache")
+        self.assertEqual(resp.status_code, 401)
+
+        self.login("user0_buyer@gmail.com")
+        resp = self.client.get("/api/internal/cache")
+        self.assertEqual(resp.status_code, 404)
+
+        self.app.config["INTERNAL_ENDPOINTS_ENABLED"] = True
+        self.client.post("/api/user/logout")
+        resp = self.client.get("/api/internal/cache")
+        self.assertEqual(resp.status_code, 401)
+
+
+class TestLRUCache(BaseTestCase):
+    """Tests for the LRU cache backend"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used entry goes first"""
+        cache = LRUCache(max_entries=2, ttl=None)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_bounded_by_bytes(self):
+        """Test entries are evicted once the size bound is reached"""
+        cache = LRUCache(max_entries=100, max_bytes=2000, ttl=None)
+        for index in range(20):
+            cache.set(str(index), "x" * 100)
+
+        self.assertLessEqual(cache.stats()["bytes"], 2000)
+        self.assertLess(cache.stats()["entries"], 20)
+
+    def test_expires_entries(self):
+        """Test entries expire after the time to live"""
+        cache = LRUCache(ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.stats()["expirations"], 1)
@@ -0,0 +1,116 @@
+"""Change tests"""
+from sqlalchemy import event
+
+from apps.api.models import CoinInventory, User
+from apps.api.services import (buy_product, change_as_list, deposit_amount,
+                               make_change, reset_deposit)
+from apps.api.services.action_service import _final_change, _search_change
+from apps.api.services.change_service import bounded_change, greedy_change
+from apps.extensions import db
+from tests.utils.base import BaseTestCase
+
+
+class TestChangeService(BaseTestCase):
+    """Tests for the change engine and the coin inventory"""
+
+    def test_greedy_change_counts(self):
+        """Test large amounts are split in counts per coin"""
+        self.assertEqual(
+            make_change(10**9 + 85), {100: 10**7, 50: 1, 20: 1, 10: 1, 5: 1}
+        )
+        self.assertEqual(make_change(0), {})
+
+    def test_change_as_list(self):
+        """Test the list form has one entry per coin, highest first"""
+        self.assertEqual(change_as_list({5: 1, 20: 2}), [20, 20, 5])
+
+    def test_non_canonical_denominations(self):
+        """Test the fewest coins are found when greedy is not optimal"""
+        self.assertEqual(greedy_change(60, (50, 20, 5), {50: 1, 20: 3}), None)
+        self.assertEqual(bounded_change(60, (50, 20, 5), {50: 1, 20: 3}), {20: 3})
+        self.assertEqual(bounded_change(6, (4, 3, 1)), {3: 2})
+
+    def test_bounded_change_impossible(self):
+        """Test None is returned when the coins cannot pay the amount"""
+        self.assertEqual(make_change(30, {20: 1, 5: 1}), None)
+        self.assertEqual(bounded_change(7, (5, 10)), None)
+
+    def test_change_searched_before_locks(self):
+        """Test the change is only searched again when the deposit moved"""
+        user = db.session.get(User, 100)
+        user.deposit = 35
+        db.session.commit()
+
+        expected, change = _search_change(user, 15, None)
+        self.assertEqual((expected, change), (20, {20: 1}))
+        self.assertEqual(_search_change(user, 40, None), (-5, None))
+
+        self.assertIs(_final_change(user, 35, change, None), change)
+        self.assertEqual(_final_change(user, 20, change, None), {20: 1, 10: 1, 5: 1})
+
+    def test_configured_denominations(self):
+        """Test deposits accept the configured coins only"""
+        self.app.config["COIN_DENOMINATIONS"] = (200, 100)
+        user = db.session.get(User, 100)
+
+        self.assertEqual(deposit_amount({"amount": 5}, user), False)
+        self.assertEqual(deposit_amount({"amount": 200}, user), True)
+        self.assertEqual(make_change(300), {200: 1, 100: 1})
+
+    def test_inventory_limits_change(self):
+        """Test purchases need exact change from the machine coins"""
+        self.app.config["COIN_INVENTORY_ENABLED"] = True
+        user = db.session.get(User, 100)
+        deposit_amount({"amount": 20}, user)
+
+        # 15 change cannot be paid with a single 20 coin
+        change, spent, product = buy_product({"product_id": 201, "quantity": 1}, user)
+        self.assertEqual(product, False)
+        self.assertEqual(db.session.get(User, 100).deposit, 20)
+
+        deposit_amount({"amount": 5}, user)
+        deposit_amount({"amount": 10}, user)
+        change, spent, product = buy_product({"product_id": 201, "quantity": 2}, user)
+        self.assertEqual(change, {20: 1, 5: 1})
+
+    def test_inventory_reset_pays_out(self):
+        """Test resetting the deposit takes the coins from the machine"""
+        self.app.config["COIN_INVENTORY_ENABLED"] = True
+        user = db.session.get(User, 100)
+        for amount in [50, 20, 20, 10]:
+            deposit_amount({"amount": amount}, user)
+
+        self.assertEqual(reset_deposit(user), True)
+        self.assertEqual(
+            dict(db.session.query(CoinInventory.coin, CoinInventory.count).all()),
+            {50: 0, 20: 0, 10: 0},
+        )
+        self.assertEqual(db.session.get(User, 100).deposit, 0)
+
+    def test_inventory_reset_concurrent_deposit(self):
+        """Test a deposit moved after it was read is not reset"""
+        self.app.config["COIN_INVENTORY_ENABLED"] = True
+        user = db.session.get(User, 100)
+        deposit_amount({"amount": 20}, user)
+        deposit_amount({"amount": 5}, user)
+
+        moved = []
+
+        def deposit_meanwhile(conn, cursor, statement, *args):
+            # another request deposits once the coins are taken
+            if statement.startswith("UPDATE coin_inventory") and not moved:
+                moved.append(True)
+                conn.exec_driver_sql(
+                    "UPDATE user SET deposit = deposit + 10 WHERE id = 100"
+                )
+
+        event.listen(db.engine, "after_cursor_execute", deposit_meanwhile)
+        try:
+            self.assertEqual(reset_deposit(user), False)
+        finally:
+            event.remove(db.engine, "after_cursor_execute", deposit_meanwhile)
+        self.assertEqual(db.session.get(User, 100).deposit, 25)
+        self.assertEqual(
+            dict(db.session.query(CoinInventory.coin, CoinInventory.count).all()),
+            {20: 1, 5: 1},
+        )
@@ -0,0 +1,98 @@
+"""Response compression tests"""
+import gzip
+import json
+import zlib
+
+from apps.api.models import Product
+from apps.extensions import compression, db
+from tests.utils.base import BaseTestCase
+
+
+class TestCompression(BaseTestCase):
+    """Tests for the negotiated response compression"""
+
+    def setUp(self):
+        """Log in the buyer and fill a listing above the minimum size"""
+        super().setUp()
+        self.login("user0_buyer@gmail.com")
+        db.session.add_all(
+            Product(
+                amountAvailable=1, cost=5, productName=f"Water {index}", sellerId=101
+            )
+            for index in range(20)
+        )
+        db.session.commit()
+
+    def list_products(self, encoding, **headers):
+        """List products accepting a content coding"""
+        return self.client.get(
+            "/api/product/?limit=50", headers={"Accept-Encoding": encoding, **headers}
+        )
+
+    def test_gzip(self):
+        """Test the body is compressed and the ETag turned weak"""
+        plain = self.list_products("identity")
+        resp = self.list_products("gzip")
+
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertEqual(gzip.decompress(resp.get_data()), plain.get_data())
+        self.assertLess(resp.content_length, plain.content_length)
+        self.assertEqual(resp.headers["ETag"], f"W/{plain.headers['ETag']}")
+        self.assertNotIn("Content-Encoding", plain.headers)
+
+    def test_deflate(self):
+        """Test the coding preferred by the client is used"""
+        plain = self.list_products("identity")
+        resp = self.list_products("gzip;q=0.5, deflate")
+
+        self.assertEqual(resp.headers["Content-Encoding"], "deflate")
+        self.assertEqual(zlib.decompress(resp.get_data()), plain.get_data())
+
+    def test_not_modified(self):
+        """Test the weak ETag of a compressed response is revalidated"""
+        etag = self.list_products("gzip").headers["ETag"]
+        resp = self.list_products("gzip", **{"If-None-Match": etag})
+
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.headers["ETag"], etag)
+
+    def test_compressed_once(self):
+        """Test an unchanged listing is not compressed again"""
+        first = self.list_products("gzip")
+        hits = compression.stats()["hits"]
+        second = self.list_products("gzip")
+
+        self.assertEqual(compression.stats()["hits"], hits + 1)
+        self.assertEqual(second.get_data(), first.get_data())
+
+    def test_same_etag_other_body(self):
+        """Test a body changed under the same tag is compressed again"""
+        for stock in (10, 9):
+            body = json.dumps([{"amountAvailable": stock}] * 50)
+            with self.app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+                response = self.app.response_class(body, mimetype="application/json")
+                response.set_etag("catalog")
+                response = compression._compress(response)
+            self.assertEqual(gzip.decompress(response.get_data()).decode(), body)
+
+    def test_small_and_excluded_bodies(self):
+        """Test small bodies and other media types are sent as is"""
+        resp = self.client.get("/api/product/200", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+        self.app.config["COMPRESSION_MIMETYPES"] = ("text/html",)
+        self.assertNotIn("Content-Encoding", self.list_products("gzip").headers)
+
+        self.app.config["COMPRESSION_MIMETYPES"] = ("application/json",)
+        self.app.config["COMPRESSION_ENABLED"] = False
+        self.assertNotIn("Content-Encoding", self.list_products("gzip").headers)
+
+    def test_stream_not_compressed(self):
+        """Test streamed listings are sent as is"""
+        resp = self.client.get(
+            "/api/product/?stream=true", headers={"Accept-Encoding": "gzip"}
+        )
+
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(len(resp.get_json()["response"]), 22)
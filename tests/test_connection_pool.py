@@ -0,0 +1,129 @@
+"""Connection pool tests"""
+import os
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from apps.extensions.pool import InstrumentedQueuePool, PoolManager, pool_stats
+from tests.utils.base import BaseTestCase
+
+
+class TestConnectionPool(BaseTestCase):
+    """Tests for the connection pool configuration and statistics"""
+
+    def make_engine(self, **kwargs):
+        """Create an engine on a temporary SQLite file with the instrumented pool"""
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        engine = create_engine(
+            f"sqlite:///{path}", poolclass=InstrumentedQueuePool, **kwargs
+        )
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_engine_options_from_config(self):
+        """Test pool settings are turned into engine options"""
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "mysql+pymysql://u:p@db/vending"
+        app.config["DB_POOL_SIZE"] = 3
+        app.config["DB_POOL_RECYCLE"] = 60
+
+        PoolManager().init_app(app)
+
+        options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        self.assertEqual(options["poolclass"], InstrumentedQueuePool)
+        self.assertEqual(options["pool_size"], 3)
+        self.assertEqual(options["max_overflow"], 20)
+        self.assertEqual(options["pool_recycle"], 60)
+        self.assertTrue(options["pool_pre_ping"])
+
+    def test_sqlite_keeps_default_pool(self):
+        """Test SQLite databases get no pool options"""
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+
+        PoolManager().init_app(app)
+
+        self.assertNotIn("SQLALCHEMY_ENGINE_OPTIONS", app.config)
+
+    def test_pool_counters(self):
+        """Test checkouts, overflow and timeouts are counted"""
+        engine = self.make_engine(pool_size=1, max_overflow=1, pool_timeout=0.05)
+
+        first = engine.connect()
+        second = engine.connect()
+        stats = pool_stats(engine)
+        self.assertEqual(stats["checked_out"], 2)
+        self.assertEqual(stats["overflow"], 1)
+        self.assertEqual(stats["connects"], 2)
+
+        with self.assertRaises(PoolTimeoutError):
+            engine.connect()
+        first.close()
+        second.close()
+
+        stats = pool_stats(engine)
+        self.assertEqual(stats["pool"], "InstrumentedQueuePool")
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["wait_time_max_ms"], 40)
+
+    def test_warmup_opens_connections(self):
+        """Test warmup fills the pool before the first request"""
+        engine = self.make_engine(pool_size=3, max_overflow=0)
+        app = Flask(__name__)
+        app.config["DB_POOL_WARMUP"] = 3
+
+        class Database:
+            """Stand-in exposing get_engine"""
+
+            @staticmethod
+            def get_engine(app):
+                return engine
+
+        self.assertEqual(PoolManager.warmup(app, Database()), 3)
+        self.assertEqual(pool_stats(engine)["checked_in"], 3)
+
+    def test_warmup_on_first_request(self):
+        """Test warmup waits for the first request of the process"""
+        engine = self.make_engine(pool_size=2, max_overflow=0)
+        app = Flask(__name__)
+        app.config["DB_POOL_WARMUP"] = 2
+
+        class Database:
+            """Stand-in exposing get_engine"""
+
+            @staticmethod
+            def get_engine(app):
+                return engine
+
+        PoolManager().warmup_on_first_request(app, Database())
+        self.assertEqual(pool_stats(engine)["connects"], 0)
+
+        app.test_client().get("/")
+        self.assertEqual(pool_stats(engine)["checked_in"], 2)
+
+    def test_connect_time_not_counted_as_wait(self):
+        """Test opening a connection is not reported as waiting for one"""
+        engine = self.make_engine(pool_size=1, max_overflow=0)
+        event.listen(engine, "connect", lambda *args: time.sleep(0.05))
+
+        engine.connect().close()
+
+        stats = pool_stats(engine)
+        self.assertGreaterEqual(stats["connect_time_total_ms"], 40)
+        self.assertLess(stats["wait_time_max_ms"], 40)
+
+    def test_pool_stats_endpoint(self):
+        """Test pool statistics are exposed"""
+        self.app.config["INTERNAL_ENDPOINTS_ENABLED"] = True
+        self.login("user0_buyer@gmail.com")
+        resp = self.client.get("/api/internal/pool")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("pool", resp.get_json()["response"])
@@ -0,0 +1,96 @@
+"""API documentation tests"""
+import gzip
+import json
+import os
+import tempfile
+
+from apps import create_app
+from apps.api import api, blueprint
+from apps.api.docs import render_spec
+from tests.utils.base import BaseTestCase
+
+
+class TestDocs(BaseTestCase):
+    """Tests for the precomputed specification and documentation page"""
+
+    def test_spec_served(self):
+        """Test the specification is the one of flask-restx"""
+        resp = self.client.get("/api/swagger.json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content_type, "application/json")
+        self.assertEqual(resp.get_json()["info"]["title"], "Flask Vending Machine")
+        self.assertIn("/action/buy", resp.get_json()["paths"])
+
+    def test_spec_not_modified(self):
+        """Test a current client copy gets a 304"""
+        first = self.client.get("/api/swagger.json")
+        second = self.client.get(
+            "/api/swagger.json", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.get_data(), b"")
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+
+    def test_spec_gzip(self):
+        """Test the gzip variant has its own ETag and the same content"""
+        plain = self.client.get("/api/swagger.json")
+        compressed = self.client.get(
+            "/api/swagger.json", headers={"Accept-Encoding": "gzip, deflate"}
+        )
+
+        self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+        self.assertEqual(compressed.headers["Vary"], "Accept-Encoding")
+        self.assertNotEqual(compressed.headers["ETag"], plain.headers["ETag"])
+        self.assertEqual(gzip.decompress(compressed.get_data()), plain.get_data())
+
+    def test_spec_rendered_once(self):
+        """Test the specification is not rendered again"""
+        self.client.get("/api/swagger.json")
+        spec = self.app.extensions["api_docs"]["spec"]
+        self.client.get("/api/swagger.json")
+
+        self.assertIs(self.app.extensions["api_docs"]["spec"], spec)
+
+    def test_doc_page_cached(self):
+        """Test the documentation page is rendered once per host"""
+        first = self.client.get("/api/docs")
+        second = self.client.get("/api/docs")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.mimetype, "text/html")
+        self.assertIn(b"swagger.json", first.get_data())
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(len(self.app.extensions["api_docs"]["pages"]), 1)
+
+    def test_docs_disabled(self):
+        """Test both documentation endpoints can be turned off"""
+        self.app.config["DOCS_ENABLED"] = False
+
+        self.assertEqual(self.client.get("/api/swagger.json").status_code, 404)
+        self.assertEqual(self.client.get("/api/docs").status_code, 404)
+
+    def test_spec_file(self):
+        """Test an exported specification is served as is"""
+        with self.app.test_request_context():
+            body = render_spec(api)
+        handle, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "wb") as spec_file:
+            spec_file.write(body)
+
+        try:
+            app = create_app(
+                "testing",
+                config={
+                    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                    "DOCS_SPEC_FILE": path,
+                },
+            )
+            app.register_blueprint(blueprint)
+        finally:
+            os.remove(path)
+
+        resp = app.test_client().get("/api/swagger.json")
+        self.assertEqual(resp.get_data(), body)
+        self.assertEqual(json.loads(body)["basePath"], "/api")
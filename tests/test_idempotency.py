@@ -0,0 +1,135 @@
+"""Idempotency key tests"""
+import json
+
+from sqlalchemy import event
+
+from apps.api.models import IdempotencyRecord, User
+from apps.extensions import db, idempotency
+from tests.utils.base import BaseTestCase
+
+
+class TestIdempotency(BaseTestCase):
+    """Tests for the Idempotency-Key header of the action endpoints"""
+
+    def setUp(self):
+        """Log in the buyer"""
+        super().setUp()
+        self.login("user0_buyer@gmail.com")
+
+    def post(self, path, payload, key):
+        """Send an action with an idempotency key"""
+        return self.client.post(
+            path,
+            content_type="application/json",
+            data=json.dumps(payload),
+            headers={"Idempotency-Key": key},
+        )
+
+    def deposit(self):
+        """Current deposit of the buyer"""
+        return db.session.get(User, 100).deposit
+
+    def test_deposit_replayed(self):
+        """Test a retried deposit is credited once"""
+        first = self.post("/api/action/deposit", {"amount": 50}, "key-1")
+        second = self.post("/api/action/deposit", {"amount": 50}, "key-1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(self.deposit(), 50)
+
+        self.post("/api/action/deposit", {"amount": 50}, "key-2")
+        self.assertEqual(self.deposit(), 100)
+
+    def test_buy_replayed_without_queries(self):
+        """Test a retried purchase is served from memory"""
+        self.post("/api/action/deposit", {"amount": 50}, "deposit")
+        first = self.post("/api/action/buy", {"product_id": 201, "quantity": 1}, "buy")
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            second = self.post(
+                "/api/action/buy", {"product_id": 201, "quantity": 1}, "buy"
+            )
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertFalse([sql for sql in statements if "product" in sql.lower()])
+        self.assertEqual(self.deposit(), 45)
+
+    def test_replayed_from_database(self):
+        """Test keys survive the in-process store"""
+        first = self.post("/api/action/deposit", {"amount": 20}, "durable")
+        idempotency.clear()
+
+        second = self.post("/api/action/deposit", {"amount": 20}, "durable")
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(self.deposit(), 20)
+
+    def test_key_reused_for_another_request(self):
+        """Test a key sent with another payload is rejected"""
+        self.post("/api/action/deposit", {"amount": 20}, "reused")
+        resp = self.post("/api/action/deposit", {"amount": 100}, "reused")
+
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(self.deposit(), 20)
+
+    def test_key_in_progress(self):
+        """Test a key claimed by a running request is a conflict"""
+        self.post("/api/action/deposit", {"amount": 5}, "running")
+        IdempotencyRecord.query.update({IdempotencyRecord.status: None})
+        db.session.commit()
+        idempotency.clear()
+
+        resp = self.post("/api/action/deposit", {"amount": 5}, "running")
+        self.assertEqual(resp.status_code, 409)
+
+    def test_expired_key(self):
+        """Test an expired key is processed again"""
+        self.app.config["IDEMPOTENCY_TTL"] = 0
+        self.post("/api/action/deposit", {"amount": 5}, "expired")
+        idempotency.clear()
+
+        self.post("/api/action/deposit", {"amount": 5}, "expired")
+        self.assertEqual(self.deposit(), 10)
+
+    def test_abandoned_claim_taken_over(self):
+        """Test a claim whose request never committed is taken over"""
+        self.post("/api/action/deposit", {"amount": 5}, "abandoned")
+        # as left by a process that died before the deposit committed
+        IdempotencyRecord.query.update(
+            {IdempotencyRecord.status: None, IdempotencyRecord.applied: False}
+        )
+        db.session.commit()
+        idempotency.clear()
+
+        resp = self.post("/api/action/deposit", {"amount": 5}, "abandoned")
+        self.assertEqual(resp.status_code, 409)
+
+        self.app.config["IDEMPOTENCY_CLAIM_TIMEOUT"] = 0
+        resp = self.post("/api/action/deposit", {"amount": 5}, "abandoned")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.deposit(), 10)
+        self.assertEqual(IdempotencyRecord.query.one().status, 201)
+
+    def test_applied_claim_not_taken_over(self):
+        """Test a claim whose request committed is never processed again"""
+        self.app.config["IDEMPOTENCY_CLAIM_TIMEOUT"] = 0
+        self.post("/api/action/deposit", {"amount": 5}, "applied")
+        # the deposit committed, the process died before storing the response
+        IdempotencyRecord.query.update({IdempotencyRecord.status: None})
+        db.session.commit()
+        idempotency.clear()
+
+        self.assertEqual(IdempotencyRecord.query.one().applied, True)
+        resp = self.post("/api/action/deposit", {"amount": 5}, "applied")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(self.deposit(), 5)
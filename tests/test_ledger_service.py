@@ -0,0 +1,195 @@
+"""Deposit ledger tests"""
+import os
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import func
+
+from apps import create_app
+from apps.api.models import LedgerEntry, LedgerKind, User
+from apps.api.services import (buy_product, buy_products, compact_ledger,
+                               deposit_amount, reset_deposit, user_balance)
+from apps.api.services.ledger_service import credit, debit
+from apps.extensions import db
+from tests.utils.base import BaseTestCase
+
+
+class TestLedgerService(BaseTestCase):
+    """Tests for the deposit ledger"""
+
+    def setUp(self):
+        """Enable the ledger"""
+        super().setUp()
+        self.app.config["DEPOSIT_LEDGER_ENABLED"] = True
+        self.user = db.session.get(User, 100)
+
+    def entries(self):
+        """Ledger movements of the buyer"""
+        return [
+            (entry.kind, entry.amount)
+            for entry in LedgerEntry.query.filter_by(userId=100).order_by(
+                LedgerEntry.id
+            )
+        ]
+
+    def test_movements_are_appended(self):
+        """Test deposits, purchases and resets insert entries only"""
+        deposit_amount({"amount": 100}, self.user)
+        deposit_amount({"amount": 20}, self.user)
+        change, spent, product = buy_product(
+            {"product_id": 200, "quantity": 2}, self.user
+        )
+        self.assertEqual(change, {100: 1})
+        self.assertEqual(user_balance(self.user), 100)
+
+        self.assertEqual(reset_deposit(self.user), True)
+        self.assertEqual(user_balance(self.user), 0)
+        self.assertEqual(
+            self.entries(),
+            [
+                (LedgerKind.DEPOSIT, 100),
+                (LedgerKind.DEPOSIT, 20),
+                (LedgerKind.PURCHASE, -20),
+                (LedgerKind.RESET, -100),
+            ],
+        )
+        self.assertEqual(db.session.get(User, 100).deposit, 0)
+
+    def test_debit_needs_balance(self):
+        """Test a purchase above the balance writes nothing"""
+        deposit_amount({"amount": 5}, self.user)
+
+        change, spent, product = buy_product(
+            {"product_id": 200, "quantity": 1}, self.user
+        )
+        self.assertEqual(product, False)
+
+        change, spent, lines = buy_products(
+            [{"product_id": 201, "quantity": 2}], self.user
+        )
+        self.assertEqual(lines[0]["error"], "Not enough money")
+        self.assertEqual(self.entries(), [(LedgerKind.DEPOSIT, 5)])
+        self.assertEqual(db.session.get(User, 100).deposit, 0)
+
+    def test_compaction(self):
+        """Test compaction moves the snapshot and keeps the balance"""
+        deposit_amount({"amount": 50}, self.user)
+        deposit_amount({"amount": 50}, self.user)
+        buy_product({"product_id": 201, "quantity": 3}, self.user)
+
+        self.assertEqual(compact_ledger(min_age=3600), 0)
+        self.assertEqual(compact_ledger(min_age=0), 1)
+        self.assertEqual(compact_ledger(min_age=0), 0)
+
+        user = db.session.get(User, 100)
+        self.assertEqual(user.deposit, 85)
+        self.assertEqual(user.ledgerEntryId, LedgerEntry.query.count())
+        self.assertEqual(user_balance(user), 85)
+        self.assertEqual(len(self.entries()), 3)
+
+        deposit_amount({"amount": 10}, user)
+        self.assertEqual(user_balance(user), 95)
+
+
+class TestLedgerConcurrency(unittest.TestCase):
+    """Concurrency tests for the ledger - run against a file based SQLite database"""
+
+    THREADS = 30
+
+    def setUp(self):
+        """Set up a database shared by all threads"""
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{self.db_path}"
+        self.app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+        self.app.config["DEPOSIT_LEDGER_ENABLED"] = True
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(
+                User(id=100, username="buyer@gmail.com", password="-", role="BUYER")
+            )
+            db.session.commit()
+            credit(db.session.get(User, 100), 50)
+            db.session.commit()
+
+    def tearDown(self):
+        """Remove the shared database"""
+        with self.app.app_context():
+            db.session.remove()
+            db.get_engine(self.app).dispose()
+        os.remove(self.db_path)
+
+    def _concurrently(self, operation):
+        """
+        Run an operation from every thread at the same time
+
+        :param callable operation: Called with the user in an app context
+        :return: Operation results
+        :rtype: list
+        """
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        errors = []
+
+        def worker(index):
+            with self.app.app_context():
+                try:
+                    user = db.session.get(User, 100)
+                    barrier.wait()
+                    results.append(operation(index, user))
+                except Exception as exc:  # pylint: disable=broad-except
+                    db.session.rollback()
+                    errors.append(exc)
+                finally:
+                    db.session.remove()
+
+        threads = [
+            threading.Thread(target=worker, args=(index,))
+            for index in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return results
+
+    def test_debit_no_overdraw(self):
+        """Test concurrent debits never spend more than the balance"""
+
+        def spend(index, user):
+            debited = debit(user, 10)
+            db.session.commit()
+            return debited
+
+        results = self._concurrently(spend)
+
+        self.assertEqual(results.count(True), 5)
+        with self.app.app_context():
+            self.assertEqual(user_balance(db.session.get(User, 100)), 0)
+
+    def test_compaction_during_writes(self):
+        """Test compactions running with debits and credits lose no entry"""
+
+        def write(index, user):
+            if index % 3 == 0:
+                return compact_ledger(min_age=0)
+            if index % 3 == 1:
+                credit(user, 5)
+            else:
+                debit(user, 5)
+            db.session.commit()
+            return None
+
+        self._concurrently(write)
+        with self.app.app_context():
+            compact_ledger(min_age=0)
+            user = db.session.get(User, 100)
+            total = db.session.query(func.sum(LedgerEntry.amount)).scalar()
+            self.assertEqual(user.deposit, total)
+            self.assertEqual(user_balance(user), total)
+            self.assertGreaterEqual(total, 0)
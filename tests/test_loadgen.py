@@ -0,0 +1,44 @@
+"""Load generator tests"""
+import unittest
+
+from benchmarks import load_collection, parse_mix, run_load
+
+
+class TestLoadgen(unittest.TestCase):
+    """Tests for the Postman collection load generator"""
+
+    def test_load_collection(self):
+        """Test collection requests become named templates"""
+        templates = load_collection()
+
+        self.assertEqual(templates["ACTION/BUY"]["method"], "POST")
+        self.assertEqual(templates["ACTION/BUY"]["path"], "/api/action/buy")
+        self.assertEqual(templates["ACTION/DEPOSIT"]["body"], {"amount": 20})
+        self.assertEqual(templates["PRODUCT/LIST"]["body"], None)
+
+    def test_parse_mix(self):
+        """Test scenario weights are parsed"""
+        self.assertEqual(
+            parse_mix(["PRODUCT/LIST=80", "ACTION/BUY=20"]),
+            {"PRODUCT/LIST": 80.0, "ACTION/BUY": 20.0},
+        )
+
+    def test_unknown_scenario(self):
+        """Test a mix naming a missing request is rejected"""
+        with self.assertRaises(ValueError):
+            run_load(mix={"ACTION/REFUND": 1})
+
+    def test_run_load(self):
+        """Test a short run against a local server"""
+        report = run_load(
+            users=2,
+            duration=0.5,
+            products=3,
+            deposits=1,
+            server_config={"BCRYPT_LOG_ROUNDS": 4},
+        )
+
+        self.assertGreater(report["total"]["requests"], 0)
+        self.assertEqual(report["total"]["errors"], 0)
+        for result in report["results"].values():
+            self.assertLessEqual(result["p50_ms"], result["max_ms"])
@@ -0,0 +1,134 @@
+"""Metrics tests"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+from apps import create_app
+from apps.extensions import metrics
+from apps.extensions.metrics import Counter, Histogram
+from tests.utils.base import BaseTestCase
+
+
+class TestMetrics(BaseTestCase):
+    """Tests for the Prometheus metrics"""
+
+    def test_request_and_business_metrics(self):
+        """Test requests, deposits, purchases and change are exposed"""
+        self.login("user0_buyer@gmail.com")
+        self.client.post(
+            "/api/action/deposit",
+            content_type="application/json",
+            data=json.dumps({"amount": 50}),
+        )
+        self.client.post(
+            "/api/action/buy",
+            content_type="application/json",
+            data=json.dumps({"product_id": 201, "quantity": 2}),
+        )
+
+        resp = self.client.get("/metrics")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith("text/plain; version=0.0.4"))
+        body = resp.get_data(as_text=True)
+        self.assertIn(
+            'http_requests_total{namespace="user",route="/api/user/login",'
+            'method="POST",status="200"} 1',
+            body,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{namespace="action",'
+            'route="/api/action/buy",method="POST"} 1',
+            body,
+        )
+        self.assertIn("http_requests_in_flight 1", body)
+        self.assertIn('vending_deposits_total{coin="50"} 1', body)
+        self.assertIn('vending_purchases_total{kind="single"} 1', body)
+        self.assertIn("vending_items_sold_total 2", body)
+        self.assertIn('vending_coins_returned_total{coin="20"} 2', body)
+        self.assertIn("db_pool_info{pool=", body)
+
+    def test_metrics_endpoint_disabled(self):
+        """Test /metrics is not served when metrics are off"""
+        app = create_app(
+            "testing",
+            config={"SQLALCHEMY_DATABASE_URI": "sqlite://", "METRICS_ENABLED": False},
+        )
+
+        resp = app.test_client().get("/metrics")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_histogram_buckets(self):
+        """Test observations land in cumulative buckets"""
+        histogram = Histogram("latency", "Latency.", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        lines = histogram.expose(histogram.snapshot())
+
+        self.assertIn('latency_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_bucket{le="1"} 2', lines)
+        self.assertIn('latency_bucket{le="+Inf"} 3', lines)
+        self.assertIn("latency_count 3", lines)
+        self.assertIn("latency_sum 5.55", lines)
+
+    def test_multiprocess_values_are_summed(self):
+        """Test values written by other processes are added up"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "metrics_1.json"), "w") as handle:
+            json.dump({"vending_items_sold_total": [[[], 5]]}, handle)
+
+        metrics.multiproc_dir = directory
+        self.addCleanup(setattr, metrics, "multiproc_dir", None)
+        metrics.items_sold.inc(3)
+
+        body = metrics.expose()
+
+        self.assertIn("vending_items_sold_total 8", body)
+        self.assertEqual(
+            len(glob.glob(os.path.join(directory, f"metrics_{os.getpid()}_*.json"))),
+            1,
+        )
+
+    def test_multiprocess_exited_process_is_retired(self):
+        """Test an exited process keeps its counters and loses its file"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name, sold in (("metrics_1_a.json", 5), ("metrics_retired.json", 2)):
+            with open(os.path.join(directory, name), "w") as handle:
+                json.dump(
+                    {
+                        "vending_items_sold_total": [[[], sold]],
+                        "http_requests_in_flight": [[[], 1]],
+                    },
+                    handle,
+                )
+
+        metrics.multiproc_dir = directory
+        self.addCleanup(setattr, metrics, "multiproc_dir", None)
+        metrics.retire(1)
+
+        self.assertFalse(os.path.exists(os.path.join(directory, "metrics_1_a.json")))
+        body = metrics.expose()
+        self.assertIn("vending_items_sold_total 7", body)
+        self.assertNotIn("http_requests_in_flight 1", body)
+
+        metrics.items_sold.inc(3)
+        metrics.retire()
+        self.assertEqual(
+            sorted(os.listdir(directory)), ["metrics.lock", "metrics_retired.json"]
+        )
+        self.assertIn("vending_items_sold_total 10", metrics.expose())
+
+    def test_label_values_are_escaped(self):
+        """Test quotes and newlines in label values are escaped"""
+        counter = Counter("errors_total", "Errors.", ("reason",))
+        counter.inc(reason='bad "value"\n')
+
+        lines = counter.expose(counter.snapshot())
+
+        self.assertIn('errors_total{reason="bad \\"value\\"\\n"} 1', lines)
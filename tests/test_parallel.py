@@ -0,0 +1,30 @@
+"""Parallel test runner tests"""
+import unittest
+
+from config import worker_database_uri
+from tests.utils.parallel import shard
+
+
+class TestParallel(unittest.TestCase):
+    """Tests for the parallel test runner"""
+
+    def test_shard_is_balanced(self):
+        """Test every test id goes to exactly one worker"""
+        node_ids = [f"tests/test_a.py::test_{index}" for index in range(7)]
+
+        shards = shard(node_ids, 3)
+
+        self.assertEqual([len(ids) for ids in shards], [3, 2, 2])
+        self.assertEqual(sorted(sum(shards, [])), sorted(node_ids))
+
+    def test_worker_database_uri(self):
+        """Test each worker gets its own database"""
+        self.assertEqual(
+            worker_database_uri("mysql+pymysql://user:secret@db:3306/vending_test", 2),
+            "mysql+pymysql://user:secret@db:3306/vending_test_w2",
+        )
+        self.assertEqual(
+            worker_database_uri("sqlite:////tmp/tests.db", 3),
+            "sqlite:////tmp/tests_w3.db",
+        )
+        self.assertEqual(worker_database_uri("sqlite://", 4), "sqlite://")
@@ -0,0 +1,241 @@
+"""Product controller tests"""
+import json
+
+from apps.api.models import CatalogVersion, Product
+from apps.api.services.product_service import (bump_catalog_version,
+                                               encode_cursor)
+from apps.extensions import db
+from tests.utils.base import BaseTestCase
+
+
+class TestProductController(BaseTestCase):
+    """Tests for product controller"""
+
+    def test_product_list_pagination(self):
+        """Test listing products one page at a time"""
+        self.login("user0_buyer@gmail.com")
+
+        resp = self.client.get("/api/product/?limit=1")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertEqual([product["id"] for product in body["response"]], [200])
+        self.assertEqual(body["pagination"]["page_size"], 1)
+        self.assertEqual(body["pagination"]["has_more"], True)
+
+        cursor = body["pagination"]["next_cursor"]
+        resp = self.client.get(f"/api/product/?limit=1&cursor={cursor}")
+        body = resp.get_json()
+        self.assertEqual([product["id"] for product in body["response"]], [201])
+        self.assertEqual(body["pagination"]["has_more"], False)
+        self.assertEqual(body["pagination"]["next_cursor"], None)
+
+    def test_product_list_invalid_cursor(self):
+        """Test listing products with a malformed cursor"""
+        self.login("user0_buyer@gmail.com")
+
+        resp = self.client.get("/api/product/?cursor=abc")
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()["response"], "Invalid cursor")
+
+        cursor = encode_cursor([1, 2], 1)
+        resp = self.client.get(f"/api/product/?cursor={cursor}&sort=cost")
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()["response"], "Invalid cursor")
+
+    def test_product_list_stream(self):
+        """Test streaming every product with the standard envelope"""
+        self.login("user0_buyer@gmail.com")
+
+        resp = self.client.get("/api/product/?stream=true")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.is_streamed)
+        body = resp.get_json()
+        self.assertEqual(body["code"], "success")
+        self.assertEqual([product["id"] for product in body["response"]], [200, 201])
+        self.assertEqual(
+            body["response"][0],
+            {
+                "id": 200,
+                "amountAvailable": 20,
+                "cost": 10,
+                "productName": "Diet Coke",
+                "sellerId": 101,
+            },
+        )
+
+    def test_product_list_not_modified(self):
+        """Test a matching If-None-Match gets a 304 until the catalog changes"""
+        self.login("user1_seller@gmail.com")
+
+        resp = self.client.get("/api/product/")
+        etag = resp.headers["ETag"]
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.get("/api/product/", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.get_data(), b"")
+        self.assertEqual(resp.headers["ETag"], etag)
+        self.assertEqual(resp.headers["Access-Control-Allow-Origin"], "*")
+        self.assertEqual(resp.headers["server"], "FlaskRestAPI")
+
+        # another page has another tag
+        resp = self.client.get("/api/product/?limit=1", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.post(
+            "/api/product/",
+            content_type="application/json",
+            data=json.dumps({"amountAvailable": 1, "cost": 5, "productName": "Tea"}),
+        )
+        self.assertEqual(resp.status_code, 201)
+
+        resp = self.client.get("/api/product/", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+
+    def test_product_list_written_by_another_process(self):
+        """Test a write that skips this process cache still changes the page"""
+        self.login("user1_seller@gmail.com")
+
+        resp = self.client.get("/api/product/?limit=1")
+        etag = resp.headers["ETag"]
+        self.assertEqual(resp.get_json()["response"][0]["cost"], 10)
+
+        # as another process would, the local catalog cache is not told
+        Product.query.filter(Product.id == 200).update(
+            {Product.cost: 20}, synchronize_session=False
+        )
+        bump_catalog_version()
+        db.session.commit()
+
+        resp = self.client.get("/api/product/?limit=1", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        self.assertEqual(resp.get_json()["response"][0]["cost"], 20)
+
+    def test_product_list_without_version_row(self):
+        """Test listings are untagged until a write inserts the version row"""
+        self.login("user1_seller@gmail.com")
+        CatalogVersion.query.delete()
+        db.session.commit()
+
+        resp = self.client.get("/api/product/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("ETag", resp.headers)
+
+        resp = self.client.post(
+            "/api/product/",
+            content_type="application/json",
+            data=json.dumps({"amountAvailable": 1, "cost": 5, "productName": "Tea"}),
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(CatalogVersion.query.one().version, 1)
+
+        resp = self.client.get("/api/product/")
+        self.assertEqual(len(resp.get_json()["response"]), 3)
+        self.assertIn("ETag", resp.headers)
+
+    def test_product_item_not_modified(self):
+        """Test conditional GET of a single product"""
+        self.login("user0_buyer@gmail.com")
+
+        resp = self.client.get("/api/product/200")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["response"]["productName"], "Diet Coke")
+
+        etag = resp.headers["ETag"]
+        resp = self.client.get("/api/product/200", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get("/api/product/201", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.get("/api/product/4000")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_product_fields(self):
+        """Test the fields parameter restricts the product responses"""
+        self.login("user0_buyer@gmail.com")
+
+        resp = self.client.get("/api/product/?fields=id,productName&sort=-cost")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            resp.get_json()["response"],
+            [
+                {"id": 200, "productName": "Diet Coke"},
+                {"id": 201, "productName": "Sprite"},
+            ],
+        )
+
+        resp = self.client.get("/api/product/?fields=cost&stream=true")
+        self.assertEqual(
+            [set(item) for item in resp.get_json()["response"]], [{"cost"}] * 2
+        )
+
+        full = self.client.get("/api/product/200")
+        resp = self.client.get("/api/product/200?fields=cost,%20id")
+        self.assertEqual(resp.get_json()["response"], {"id": 200, "cost": 10})
+        self.assertNotEqual(resp.headers["ETag"], full.headers["ETag"])
+
+    def test_product_fields_invalid(self):
+        """Test unknown fields are rejected"""
+        self.login("user0_buyer@gmail.com")
+
+        for query in ("fields=id,password", "fields=", "fields=,"):
+            resp = self.client.get(f"/api/product/?{query}")
+            self.assertEqual(resp.status_code, 422)
+            self.assertEqual(resp.get_json()["code"], "invalidField")
+
+        resp = self.client.get("/api/product/200?fields=secret")
+        self.assertEqual(resp.status_code, 422)
+
+    def test_product_bulk_ndjson(self):
+        """Test creating products from a newline delimited JSON body"""
+        self.login("user1_seller@gmail.com")
+        body = "\n".join(
+            [
+                json.dumps({"amountAvailable": 1, "cost": 5, "productName": "Water"}),
+                "{not json",
+                json.dumps({"amountAvailable": 2, "cost": 5, "productName": "Tea"}),
+                "",
+            ]
+        )
+
+        resp = self.client.post(
+            "/api/product/bulk", content_type="application/x-ndjson", data=body
+        )
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.get_json()["response"], {"created": 2})
+        self.assertEqual(
+            resp.get_json()["errors"], [{"index": 1, "error": "Invalid item"}]
+        )
+
+    def test_product_bulk_json_array(self):
+        """Test deleting products from a JSON array body"""
+        self.login("user1_seller@gmail.com")
+
+        resp = self.client.delete(
+            "/api/product/bulk",
+            content_type="application/json",
+            data=json.dumps([{"product_id": 200}]),
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["response"], {"deleted": 1})
+
+        resp = self.client.delete(
+            "/api/product/bulk",
+            content_type="application/json",
+            data=json.dumps([{"product_id": 201}]),
+        )
+        self.assertEqual(resp.status_code, 422)
+
+        resp = self.client.delete(
+            "/api/product/bulk",
+            content_type="application/json",
+            data=json.dumps({"product_id": 201}),
+        )
+        self.assertEqual(resp.status_code, 400)
@@ -1,7 +1,14 @@
 """Products tests"""
-from apps.api.models import Product, User
-from apps.api.services import (create_product, delete_product, list_products,
+from sqlalchemy import event
+
+from apps.api.models import CatalogVersion, Product, User
+from apps.api.services import (bulk_create_products, bulk_delete_products,
+                               bulk_update_products, buy_product,
+                               catalog_version, create_product, delete_product,
+                               get_product, list_products, paginate_products,
                                update_product)
+from apps.api.services.product_service import encode_cursor
+from apps.extensions import db
 from tests.utils.base import BaseTestCase
 
 
@@ -18,6 +25,100 @@ class TestProductService(BaseTestCase):
 
         self.assertEqual(len(products_list), len(products))
 
+    def test_product_paginate_walks_all_products(self):
+        """Test following cursors returns every product exactly once"""
+        user = User.query.filter_by(id=101).first()
+        for cost in [15, 5, 25, 10]:
+            create_product(
+                dict(amountAvailable=1, cost=cost, productName="Water"), user
+            )
+
+        seen = []
+        cursor = None
+        while True:
+            products, pagination = paginate_products(cursor=cursor, limit=2)
+            self.assertLessEqual(len(products), 2)
+            seen.extend(product.id for product in products)
+            if not pagination["has_more"]:
+                self.assertEqual(pagination["next_cursor"], None)
+                break
+            cursor = pagination["next_cursor"]
+
+        self.assertEqual(seen, sorted(product.id for product in Product.query.all()))
+
+    def test_product_paginate_sort_descending(self):
+        """Test paginating sorted by cost in descending order"""
+        user = User.query.filter_by(id=101).first()
+        for cost in [10, 10, 30]:
+            create_product(
+                dict(amountAvailable=1, cost=cost, productName="Water"), user
+            )
+
+        first, pagination = paginate_products(limit=3, sort="-cost")
+        second, _ = paginate_products(
+            cursor=pagination["next_cursor"], limit=3, sort="-cost"
+        )
+        keys = [(product.cost, product.id) for product in first + second]
+
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_product_paginate_filters(self):
+        """Test filtering products by seller, cost range and stock"""
+        products, _ = paginate_products(filters={"sellerId": 102})
+        self.assertEqual([product.id for product in products], [201])
+
+        products, _ = paginate_products(filters={"minCost": 6, "maxCost": 10})
+        self.assertEqual([product.id for product in products], [200])
+
+        products, _ = paginate_products(filters={"inStock": False})
+        self.assertEqual(products, [])
+
+    def test_product_paginate_columns(self):
+        """Test only the requested columns and the cursor ones are selected"""
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            products, pagination = paginate_products(
+                limit=1, sort="-cost", columns=("productName",)
+            )
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+        select = statements[-1].split("FROM")[0]
+        self.assertIn("product.cost", select)
+        self.assertNotIn("sellerId", select)
+        self.assertEqual(products[0].productName, "Diet Coke")
+        self.assertEqual(products[0].sellerId, None)
+
+        products, _ = paginate_products(
+            cursor=pagination["next_cursor"], limit=1, sort="-cost"
+        )
+        self.assertEqual(products[0].sellerId, 102)
+
+    def test_product_paginate_invalid_cursor(self):
+        """Test an invalid cursor or sort key is rejected"""
+        self.assertEqual(paginate_products(cursor="not a cursor"), (None, None))
+        self.assertEqual(paginate_products(sort="password"), (None, None))
+
+        for sort, value in [
+            ("cost", [1, 2]),
+            ("cost", {"a": 1}),
+            ("cost", "10"),
+            ("id", True),
+            ("productName", 10),
+            ("-amountAvailable", None),
+        ]:
+            cursor = encode_cursor(value, 1)
+            self.assertEqual(paginate_products(cursor, sort=sort), (None, None))
+        self.assertEqual(
+            paginate_products(encode_cursor(10, 1.5), sort="cost"), (None, None)
+        )
+
     #######################################################
     # POST
     #######################################################
@@ -195,3 +296,158 @@ class TestProductService(BaseTestCase):
         )
         updated = update_product(user2_payload, user2)
         self.assertEqual(updated, None)
+
+    #######################################################
+    # BULK
+    #######################################################
+    def test_product_bulk_create(self):
+        """Test creating products in chunks with per item errors"""
+        self.app.config["BULK_CHUNK_SIZE"] = 2
+        user = User.query.filter_by(id=101).first()
+
+        items = [
+            dict(amountAvailable=1, cost=5, productName="Water"),
+            dict(amountAvailable=2, cost=10, productName="Juice"),
+            dict(amountAvailable=-1, cost=10, productName="Broken"),
+            dict(amountAvailable=3, cost=15, productName="Tea"),
+            "not a product",
+        ]
+        report = bulk_create_products(items, user)
+
+        self.assertEqual(report["created"], 3)
+        self.assertEqual(
+            report["errors"],
+            [
+                {"index": 2, "error": "Invalid amountAvailable"},
+                {"index": 4, "error": "Invalid item"},
+            ],
+        )
+        created = Product.query.filter_by(sellerId=101).all()
+        self.assertEqual(
+            sorted(product.productName for product in created),
+            ["Diet Coke", "Juice", "Tea", "Water"],
+        )
+
+    def test_product_bulk_create_wrong_user_type(self):
+        """Test buyers cannot create products in bulk"""
+        user = User.query.filter_by(id=100).first()
+        items = [dict(amountAvailable=1, cost=5, productName="Water")]
+
+        self.assertEqual(bulk_create_products(items, user), None)
+
+    def test_product_bulk_update(self):
+        """Test updating owned products only"""
+        user = User.query.filter_by(id=101).first()
+        water = create_product(
+            dict(amountAvailable=1, cost=5, productName="Water"), user
+        )
+
+        items = [
+            {"product_id": 200, "cost": 15},
+            {"product_id": water.id, "amountAvailable": 9, "productName": "Still"},
+            {"product_id": 201, "cost": 1},
+            {"product_id": 200},
+        ]
+        report = bulk_update_products(items, user)
+
+        self.assertEqual(report["updated"], 2)
+        self.assertEqual([error["index"] for error in report["errors"]], [2, 3])
+        self.assertEqual(Product.query.filter_by(id=200).first().cost, 15)
+        self.assertEqual(Product.query.filter_by(id=201).first().cost, 5)
+        water = Product.query.filter_by(id=water.id).first()
+        self.assertEqual((water.productName, water.amountAvailable), ("Still", 9))
+
+    def test_product_bulk_update_duplicate(self):
+        """Test a product repeated in a chunk is only updated once"""
+        user = User.query.filter_by(id=101).first()
+
+        items = [{"product_id": 200, "cost": 15}, {"product_id": 200, "cost": 20}]
+        report = bulk_update_products(items, user)
+
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(
+            report["errors"], [{"index": 1, "error": "Duplicate product_id"}]
+        )
+        self.assertEqual(Product.query.filter_by(id=200).first().cost, 15)
+
+    def test_product_bulk_update_invalidates_each_chunk(self):
+        """Test committed chunks are not served from the cache after a failure"""
+        self.app.config["BULK_CHUNK_SIZE"] = 1
+        user = User.query.filter_by(id=101).first()
+        self.assertEqual(get_product(200).cost, 10)
+
+        def items():
+            yield {"product_id": 200, "cost": 15}
+            raise RuntimeError("client went away")
+
+        with self.assertRaises(RuntimeError):
+            bulk_update_products(items(), user)
+
+        self.assertEqual(get_product(200).cost, 15)
+
+    def test_product_bulk_delete(self):
+        """Test deleting owned products only"""
+        user = User.query.filter_by(id=102).first()
+
+        report = bulk_delete_products(
+            [{"product_id": 201}, {"product_id": 200}, {"product_id": 201}], user
+        )
+
+        self.assertEqual(report["deleted"], 1)
+        self.assertEqual([error["index"] for error in report["errors"]], [1, 2])
+        self.assertEqual([product.id for product in Product.query.all()], [200])
+
+    #######################################################
+    # VERSION
+    #######################################################
+    def test_catalog_version_bumped_by_writes(self):
+        """Test every product write bumps the catalog version once"""
+        seller = User.query.filter_by(id=101).first()
+        buyer = User.query.filter_by(id=100).first()
+        version = catalog_version()
+
+        product = create_product(
+            dict(amountAvailable=5, cost=5, productName="Water"), seller
+        )
+        self.assertEqual(catalog_version(), version + 1)
+
+        update_product(
+            dict(product_id=product.id, amountAvailable=5, cost=10, productName="Tea"),
+            seller,
+        )
+        self.assertEqual(catalog_version(), version + 2)
+
+        bulk_update_products([{"product_id": product.id, "cost": 5}], seller)
+        self.assertEqual(catalog_version(), version + 3)
+
+        buyer.deposit = 5
+        db.session.commit()
+        buy_product(dict(product_id=product.id, quantity=1), buyer)
+        self.assertEqual(catalog_version(), version + 4)
+
+        delete_product(dict(product_id=product.id), seller)
+        self.assertEqual(catalog_version(), version + 5)
+
+    def test_catalog_version_row_inserted_by_writes(self):
+        """Test a write inserts the catalog version row when it is missing"""
+        seller = User.query.filter_by(id=101).first()
+        CatalogVersion.query.delete()
+        db.session.commit()
+        self.assertEqual(catalog_version(), None)
+        self.assertEqual(len(list_products()), 2)
+
+        create_product(dict(amountAvailable=5, cost=5, productName="Water"), seller)
+        self.assertEqual(catalog_version(), 1)
+        self.assertEqual(len(list_products()), 3)
+
+        delete_product(dict(product_id=200), seller)
+        self.assertEqual(catalog_version(), 2)
+
+    def test_catalog_version_kept_by_refused_writes(self):
+        """Test a refused write leaves the catalog version alone"""
+        buyer = User.query.filter_by(id=100).first()
+        version = catalog_version()
+
+        self.assertEqual(delete_product(dict(product_id=201), buyer), None)
+        buy_product(dict(product_id=201, quantity=1000), buyer)
+        self.assertEqual(catalog_version(), version)
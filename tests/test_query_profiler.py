@@ -0,0 +1,45 @@
+"""Query profiler tests"""
+from apps.extensions import catalog_cache, query_profiler
+from tests.utils.base import BaseTestCase
+
+
+class TestQueryProfiler(BaseTestCase):
+    """Tests for the per request SQL instrumentation"""
+
+    def test_server_timing_header(self):
+        """Test responses report the statements they issued"""
+        self.login("user0_buyer@gmail.com")
+        catalog_cache.clear()
+
+        resp = self.client.get("/api/product/200")
+
+        self.assertEqual(resp.status_code, 200)
+        timing = resp.headers["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_aggregates_per_endpoint(self):
+        """Test statements are aggregated by endpoint"""
+        self.login("user0_buyer@gmail.com")
+        catalog_cache.clear()
+        query_profiler.reset()
+
+        self.client.get("/api/product/200")
+        self.client.get("/api/product/200")
+
+        stats = query_profiler.stats()
+        self.assertEqual(len(stats), 1)
+        endpoint = next(iter(stats.values()))
+        self.assertEqual(endpoint["requests"], 2)
+        self.assertGreaterEqual(endpoint["max_queries"], 1)
+        self.assertIn("SELECT", endpoint["slowest_statement"])
+
+    def test_query_stats_endpoint(self):
+        """Test aggregates are exposed"""
+        self.app.config["INTERNAL_ENDPOINTS_ENABLED"] = True
+        self.login("user0_buyer@gmail.com")
+
+        resp = self.client.get("/api/internal/queries")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("requests", next(iter(resp.get_json()["response"].values())))
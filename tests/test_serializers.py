@@ -0,0 +1,138 @@
+"""Compiled marshalling and JSON encoding tests"""
+import json
+import unittest
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from flask import jsonify
+from flask_restx import Namespace, fields
+
+from apps.api.dto import ActionsDto, ProductDto, UserDto
+from apps.api.models import Product
+from apps.api.services.product_service import ProductRow
+from apps.api.utils import compile_model, json_response
+from apps.api.utils.encoding import dumps, fast_dumps, orjson
+from tests.utils.base import BaseTestCase
+
+api = ProductDto.api
+
+
+class TestCompileModel(BaseTestCase):
+    """Tests for the compiled marshalling functions"""
+
+    def test_product_model(self):
+        """Test the compiled function marshals as api.marshal"""
+        marshal_product = compile_model(ProductDto.product)
+        products = Product.query.all() + [
+            ProductRow(1, 2, 3, "Row", 4),
+            Product(productName="Draft"),
+            {"id": "7", "cost": 5, "productName": 8},
+        ]
+
+        self.assertIn("getattr", marshal_product.source)
+        self.assertEqual(
+            marshal_product(products), api.marshal(products, ProductDto.product)
+        )
+        for product in products:
+            self.assertEqual(
+                marshal_product(product), api.marshal(product, ProductDto.product)
+            )
+
+    def test_other_models(self):
+        """Test every model of the API marshals as api.marshal"""
+        rows = [ProductRow(1, 2, 3, "Row", 4), {"username": "a", "deposit": "5"}]
+        for model in (UserDto.user, ActionsDto.basket):
+            self.assertEqual(compile_model(model)(rows), api.marshal(rows, model))
+
+    def test_unsupported_fields(self):
+        """Test models the compiler does not cover use flask-restx"""
+        namespace = Namespace("test")
+        models = [
+            namespace.model("Default", {"cost": fields.Integer(default=5)}),
+            namespace.model("Dotted", {"seller": fields.String(attribute="a.b")}),
+            namespace.model("Nested", {"item": fields.Nested(ProductDto.product)}),
+            namespace.model("Date", {"at": fields.DateTime}),
+        ]
+        row = ProductRow(1, None, 3, "Row", 4)
+        for model in models:
+            self.assertNotIn("source", vars(compile_model(model)))
+            self.assertEqual(compile_model(model)(row), api.marshal(row, model))
+
+    def test_format_error(self):
+        """Test values that cannot be formatted raise as api.marshal"""
+        marshal_product = compile_model(ProductDto.product)
+        row = ProductRow("one", 2, 3, "Row", 4)
+
+        with self.assertRaises(Exception) as expected:
+            api.marshal(row, ProductDto.product)
+        with self.assertRaises(type(expected.exception)):
+            marshal_product(row)
+
+
+class TestEncoding(BaseTestCase):
+    """Tests for the JSON backends"""
+
+    values = [
+        {"response": [{"id": 1, "productName": "Water"}], "code": "success"},
+        {"b": [True, False, None], "a": {"z": 1, "y": ""}, "c": -(2**40)},
+        {"name": "Café ☕", "quote": '"\\\n\t'},
+        {"float": 0.1, "big": 1e16, "small": 1e-05, "whole": 100.0},
+        {"big_int": 2**70, "decimal": Decimal("1.50")},
+        {"at": datetime(2022, 1, 2, 3, 4, 5, tzinfo=timezone.utc)},
+        {"tuple": (1, 2), "empty": {}, "list": []},
+        [],
+    ]
+
+    def test_same_bytes_as_jsonify(self):
+        """Test both backends give the body of jsonify"""
+        for backend in ("stdlib", "auto"):
+            self.app.config["JSON_BACKEND"] = backend
+            for value in self.values:
+                self.assertEqual(
+                    json_response(value).get_data(), jsonify(value).get_data()
+                )
+                self.assertEqual(json_response(value).mimetype, "application/json")
+
+    def test_jsonify_settings(self):
+        """Test the jsonify settings are followed"""
+        self.app.config["JSON_SORT_KEYS"] = False
+        self.app.config["JSON_AS_ASCII"] = False
+        for value in self.values:
+            self.assertEqual(json_response(value).get_data(), jsonify(value).get_data())
+
+        self.app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
+        value = self.values[0]
+        self.assertEqual(json_response(value).get_data(), jsonify(value).get_data())
+
+    def test_dumps(self):
+        """Test dumps gives the compact sorted encoding of the standard library"""
+        for value in self.values[:4] + self.values[6:]:
+            expected = json.dumps(value, separators=(",", ":"), sort_keys=True)
+            self.assertEqual(dumps(value), (expected + "\n").encode())
+            self.assertEqual(dumps(value, "stdlib"), (expected + "\n").encode())
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_used(self):
+        """Test orjson only encodes the bodies it gives the same bytes for"""
+        self.assertIsNotNone(fast_dumps(self.values[0]))
+        self.assertIsNotNone(fast_dumps(self.values[2], ensure_ascii=False))
+        for value in self.values[2:6]:
+            self.assertIsNone(fast_dumps(value))
+
+    def test_non_finite_floats(self):
+        """Test NaN and infinity are encoded as jsonify encodes them"""
+        values = [
+            {"cost": float("nan")},
+            {"costs": [1, None, float("inf")]},
+            [{"cost": -float("inf")}],
+        ]
+        for backend in ("stdlib", "auto"):
+            self.app.config["JSON_BACKEND"] = backend
+            for value in values:
+                self.assertEqual(
+                    json_response(value).get_data(), jsonify(value).get_data()
+                )
+        if orjson is not None:
+            for value in values:
+                self.assertIsNone(fast_dumps(value))
+            self.assertIsNotNone(fast_dumps({"cost": None}))
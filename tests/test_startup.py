@@ -0,0 +1,55 @@
+"""Cold start tests"""
+import json
+import os
+import unittest
+
+from benchmarks.startup import measure_startup, parse_importtime
+
+# Generous for slow CI hosts, the import checks catch smaller regressions
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 2500))
+
+CLI_ONLY_MODULES = (
+    "pytest",
+    "flask_migrate",
+    "alembic",
+    "email_validator",
+    "benchmarks",
+)
+
+
+class TestStartup(unittest.TestCase):
+    """Tests for the application start time"""
+
+    def test_startup_budget(self):
+        """Test importing the application stays within the budget"""
+        wall_ms, _ = measure_startup()
+        self.assertLess(wall_ms, STARTUP_BUDGET_MS)
+
+    def test_cli_only_modules_not_imported(self):
+        """Test CLI and registration only dependencies are imported lazily"""
+        _, output = measure_startup(
+            "import sys, json, app; "
+            f"print(json.dumps([m for m in {CLI_ONLY_MODULES!r} if m in sys.modules]),"
+            " file=sys.stderr)"
+        )
+        self.assertEqual(json.loads(output.splitlines()[-1]), [])
+
+    def test_parse_importtime(self):
+        """Test -X importtime lines are parsed"""
+        modules = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   config\n"
+            "import time:      2000 |       2120 | app\n"
+        )
+        self.assertEqual(
+            modules,
+            [
+                {
+                    "module": "config",
+                    "depth": 1,
+                    "self_ms": 0.12,
+                    "cumulative_ms": 0.12,
+                },
+                {"module": "app", "depth": 0, "self_ms": 2.0, "cumulative_ms": 2.12},
+            ],
+        )
@@ -1,11 +1,14 @@
 """Actions tests"""
 import json
+import re
 
 import pytest
+from sqlalchemy import event
 
 from apps.api.models import Product, User
 from apps.api.services import buy_product, deposit_amount, reset_deposit
-from apps.extensions import bcrypt
+from apps.extensions import bcrypt, db, hasher
+from apps.extensions.hashing import calibrate_log_rounds, hash_log_rounds
 from tests.utils.base import BaseTestCase
 
 
@@ -184,3 +187,77 @@ class TestUserController(BaseTestCase):
             resp.get_json()["message"],
             "The server could not verify that you are authorized to access the URL requested. You either supplied the wrong credentials (e.g. a bad password), or your browser doesn't understand how to supply the credentials required.",
         )
+
+    def test_user_identity_resolved_once_per_request(self):
+        """Test an authenticated request looks up the current user only once"""
+        user = User.query.filter_by(id=100).first()
+        user_dict = {"username": user.username, "password": "Test1234"}
+
+        resp = self.client.post(
+            "/api/user/login",
+            content_type="application/json",
+            data=json.dumps(user_dict),
+        )
+        self.assertEqual(resp.status_code, 200)
+
+        # start from an empty identity map so every lookup hits the database
+        db.session.expunge_all()
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            # a fresh app context behaves like a new request in production
+            with self.app.app_context():
+                resp = self.client.post("/api/action/reset")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+        self.assertEqual(resp.status_code, 201)
+        user_selects = [
+            statement
+            for statement in statements
+            if re.search(r"^\s*SELECT\s.*\sFROM\s+\W?user\b", statement, re.S | re.I)
+        ]
+        self.assertEqual(len(user_selects), 1)
+
+    def test_user_login_rejected_when_hashing_saturated(self):
+        """Test login fails fast with 503 when every hashing slot is taken"""
+        # pylint: disable=protected-access
+        slots = []
+        while hasher._slots.acquire(blocking=False):
+            slots.append(True)
+        try:
+            resp = self.login("user0_buyer@gmail.com")
+        finally:
+            for _ in slots:
+                hasher._slots.release()
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.get_json()["code"], "serviceUnavailable")
+        self.assertEqual(resp.headers["Retry-After"], "1")
+
+        resp = self.login("user0_buyer@gmail.com")
+        self.assertEqual(resp.status_code, 200)
+
+    def test_user_login_rehashes_password_with_other_cost(self):
+        """Test a password stored with another cost is rehashed at login"""
+        user = User.query.filter_by(id=100).first()
+        user.password = bcrypt.generate_password_hash("Test1234", 5)
+        db.session.commit()
+
+        resp = self.login("user0_buyer@gmail.com")
+        self.assertEqual(resp.status_code, 200)
+
+        user = User.query.filter_by(id=100).first()
+        self.assertEqual(hash_log_rounds(user.password), hasher.log_rounds)
+        self.assertTrue(bcrypt.check_password_hash(user.password, "Test1234"))
+
+    def test_calibrate_log_rounds(self):
+        """Test calibration stops at the first cost over the target"""
+        rounds, timings = calibrate_log_rounds(0, min_rounds=4, max_rounds=6)
+
+        self.assertEqual(rounds, 4)
+        self.assertEqual(list(timings), [4])
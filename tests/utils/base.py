@@ -1,31 +1,125 @@
 """Base class for testing"""
+import json
 import unittest
 
-import pytest
+import email_validator
+from sqlalchemy import event
 
 from app import create_app, db
 from apps.api import blueprint, models
-from apps.extensions import bcrypt
+from apps.extensions import (catalog_cache, compression, hasher, idempotency,
+                             metrics, query_profiler)
+
+# Fixture emails are checked for syntax only, no DNS lookups
+email_validator.CHECK_DELIVERABILITY = False
+
+# "Test1234" hashed with the TestConfig bcrypt cost
+PASSWORD_HASH = "$2b$04$ijBGVR0CDo1l5MMR1cMpzO8NLCYUzG/08rGZiKzsjJ/.OQHBj9Wvm"
+
+_shared_app = None
+
+
+def _enable_sqlite_savepoints(engine):
+    """
+    Let SQLAlchemy handle SQLite transactions
+    pysqlite opens transactions on its own, which breaks SAVEPOINT.
+
+    :param Engine engine: SQLite engine
+    """
+
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+def shared_app():
+    """
+    Application used by every test
+    The schema is created and the fixtures are seeded once per session.
+    """
+    global _shared_app  # pylint: disable=global-statement
+
+    if _shared_app is None:
+        app = create_app("testing")
+        app.register_blueprint(blueprint)
+        with app.app_context():
+            if db.engine.dialect.name == "sqlite":
+                _enable_sqlite_savepoints(db.engine)
+            db.drop_all()
+            db.create_all()
+            BaseTestCase.generic_setup()
+            db.session.remove()
+        _shared_app = app
+    return _shared_app
 
 
 class BaseTestCase(unittest.TestCase):
-    """Base test class"""
+    """
+    Base test class
+    Each test runs in a transaction rolled back on tear down, commits of
+    the code under test only release a SAVEPOINT.
+    """
 
     def setUp(self):
         """Set up the test environment"""
-        self.app = create_app("testing")
-        self.app.register_blueprint(blueprint)
+        self.app = shared_app()
+        self._config = self.app.config.copy()
         self.app_context = self.app.app_context()
         self.app_context.push()
         self.client = self.app.test_client()
-        db.create_all()
-        self.generic_setup()
+
+        # extensions keep state between apps
+        hasher.init_app(self.app)
+        catalog_cache.init_app(self.app)
+        idempotency.init_app(self.app)
+        compression.clear()
+        metrics.reset()
+        query_profiler.reset()
+
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self.savepoint = self.connection.begin_nested()
+        self._session = db.session
+        db.session = db.create_scoped_session({"bind": self.connection, "binds": {}})
+        event.listen(
+            db.session.session_factory, "after_transaction_end", self._restart_savepoint
+        )
+
+    def _restart_savepoint(self, session, transaction):
+        """
+        Start a new SAVEPOINT when the session transaction ends
+        Committed changes are released so a later rollback keeps them.
+        """
+        if transaction.parent is not None:
+            return
+        if self.savepoint.is_active:
+            self.savepoint.commit()
+        self.savepoint = self.connection.begin_nested()
 
     def tearDown(self):
         """Tear down the test environment"""
         db.session.remove()
-        db.drop_all()
+        event.remove(
+            db.session.session_factory, "after_transaction_end", self._restart_savepoint
+        )
+        self.transaction.rollback()
+        self.connection.close()
+        db.session = self._session
         self.app_context.pop()
+        self.app.config.clear()
+        self.app.config.update(self._config)
+
+    def login(self, username, password="Test1234"):
+        """Log in the test client as the given user"""
+        return self.client.post(
+            "/api/user/login",
+            content_type="application/json",
+            data=json.dumps({"username": username, "password": password}),
+        )
 
     @staticmethod
     def generic_setup():
@@ -41,62 +135,49 @@ class BaseTestCase(unittest.TestCase):
         -   user_id=101;
         -   user_id=102;
         """
-        # Saving password in hash format
-        hash_pass = bcrypt.generate_password_hash("Test1234")
-
-        # Save user 0 - BUYER
-        user_dict = dict(
-            id=100,
-            username="user0_buyer@gmail.com",
-            password=hash_pass,
-            role="BUYER",
+        db.session.execute(
+            models.User.__table__.insert(),
+            [
+                dict(
+                    id=100,
+                    username="user0_buyer@gmail.com",
+                    password=PASSWORD_HASH,
+                    role="BUYER",
+                    deposit=0,
+                ),
+                dict(
+                    id=101,
+                    username="user1_seller@gmail.com",
+                    password=PASSWORD_HASH,
+                    role="SELLER",
+                    deposit=0,
+                ),
+                dict(
+                    id=102,
+                    username="user2_seller@gmail.com",
+                    password=PASSWORD_HASH,
+                    role="SELLER",
+                    deposit=0,
+                ),
+            ],
         )
-        user = models.User(**user_dict)
-        db.session.add(user)
-        db.session.commit()
-
-        # Save user 1 - SELLER
-        user_dict = dict(
-            id=101,
-            username="user1_seller@gmail.com",
-            password=hash_pass,
-            role="SELLER",
-        )
-        user = models.User(**user_dict)
-        db.session.add(user)
-        db.session.commit()
-
-        # Save user 2 - SELLER
-        user_dict = dict(
-            id=102,
-            username="user2_seller@gmail.com",
-            password=hash_pass,
-            role="SELLER",
-        )
-        user = models.User(**user_dict)
-        db.session.add(user)
-        db.session.commit()
-
-        # Save product 1 - Diet Coke
-        prod_dict = dict(
-            id=200,
-            amountAvailable=20,
-            cost=10,
-            productName="Diet Coke",
-            sellerId=101,
-        )
-        product = models.Product(**prod_dict)
-        db.session.add(product)
-        db.session.commit()
-
-        # Save product 2 - Sprite
-        prod_dict = dict(
-            id=201,
-            amountAvailable=40,
-            cost=5,
-            productName="Sprite",
-            sellerId=102,
+        db.session.execute(
+            models.Product.__table__.insert(),
+            [
+                dict(
+                    id=200,
+                    amountAvailable=20,
+                    cost=10,
+                    productName="Diet Coke",
+                    sellerId=101,
+                ),
+                dict(
+                    id=201,
+                    amountAvailable=40,
+                    cost=5,
+                    productName="Sprite",
+                    sellerId=102,
+                ),
+            ],
         )
-        product = models.Product(**prod_dict)
-        db.session.add(product)
         db.session.commit()
@@ -0,0 +1,115 @@
+"""
+Parallel test runner
+
+Collects the test ids, splits them across worker processes and runs one
+pytest per worker. Each worker gets TEST_WORKER_ID in its environment and
+with it its own test database.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from config import TestConfig, worker_database_uri
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def collect(paths):
+    """
+    Collect the test ids under paths
+
+    :param list paths: Test files or directories
+    """
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "--collect-only", "-q", *paths],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stdout + result.stderr)
+    return [line for line in result.stdout.splitlines() if "::" in line]
+
+
+def shard(node_ids, workers):
+    """
+    Split test ids across workers, round robin keeps shards balanced
+
+    :param list node_ids: Test ids
+    :param int workers: Number of workers
+    """
+    return [node_ids[index::workers] for index in range(workers)]
+
+
+def provision_database(uri):
+    """
+    Create a worker database when the server needs it
+    SQLite files and in-memory databases are created on connect.
+
+    :param str uri: Worker database URI
+    """
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" or not url.database:
+        return
+
+    engine = create_engine(url.set(database=None))
+    try:
+        with engine.connect() as connection:
+            connection.execute(text(f"CREATE DATABASE IF NOT EXISTS `{url.database}`"))
+    finally:
+        engine.dispose()
+
+
+def run_parallel(workers, paths=("tests",), pytest_args=(), echo=print):
+    """
+    Run the tests in worker processes
+    Returns the highest pytest exit code of the workers.
+
+    :param int workers: Number of worker processes
+    :param list paths: Test files or directories
+    :param list pytest_args: Extra pytest arguments
+    :param callable echo: Output function
+    """
+    shards = [ids for ids in shard(collect(paths), workers) if ids]
+    if not shards:
+        echo("No tests collected")
+        return 5
+
+    processes = []
+    for worker_id, node_ids in enumerate(shards, start=1):
+        provision_database(
+            worker_database_uri(TestConfig.SQLALCHEMY_DATABASE_URI, worker_id)
+        )
+        output = tempfile.TemporaryFile(mode="w+")
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "pytest",
+                "-q",
+                "-p",
+                "no:cacheprovider",
+                *pytest_args,
+                *node_ids,
+            ],
+            cwd=ROOT,
+            env=dict(os.environ, TEST_WORKER_ID=str(worker_id)),
+            stdout=output,
+            stderr=subprocess.STDOUT,
+        )
+        processes.append((worker_id, len(node_ids), process, output))
+
+    exit_code = 0
+    for worker_id, count, process, output in processes:
+        process.wait()
+        output.seek(0)
+        echo(f"===== worker {worker_id}: {count} tests =====")
+        echo(output.read().rstrip())
+        output.close()
+        exit_code = max(exit_code, process.returncode)
+    return exit_code